@@ -15,3 +15,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eagro.settings')
 
 application = get_asgi_application()
 
+# Optionally load the prediction models before the first request
+from eagroapp.registry import warm_up  # noqa: E402
+
+warm_up()
+
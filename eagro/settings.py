@@ -3,6 +3,7 @@ Django settings for eagro project.
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,13 +40,19 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request and per-stage latency histograms, served in Prometheus format at
+# /metrics. Off by default; when off the middleware is not installed at all.
+METRICS = os.environ.get('EAGRO_METRICS', '0') == '1'
+if METRICS:
+    # Outermost, so the whole middleware stack is inside the timing
+    MIDDLEWARE.insert(0, 'eagroapp.metrics.MetricsMiddleware')
+
 ROOT_URLCONF = 'eagro.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -53,6 +60,13 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process (APP_DIRS is implied)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -63,12 +77,61 @@ WSGI_APPLICATION = 'eagro.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# EAGRO_DB_ENGINE selects SQLite (default, single host) or PostgreSQL.
+# Connections are kept open between requests for EAGRO_DB_CONN_MAX_AGE
+# seconds and checked before reuse.
+DB_ENGINE = os.environ.get('EAGRO_DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('EAGRO_DB_CONN_MAX_AGE', '60'))
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('EAGRO_DB_NAME', 'eagro'),
+            'USER': os.environ.get('EAGRO_DB_USER', 'eagro'),
+            'PASSWORD': os.environ.get('EAGRO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('EAGRO_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('EAGRO_DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('EAGRO_DB_POOL', '1') == '1':
+        # psycopg 3 connection pool (pip install "psycopg[binary,pool]") shared
+        # by the threads of each worker. Django requires CONN_MAX_AGE = 0 with it.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('EAGRO_DB_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.environ.get('EAGRO_DB_POOL_MAX_SIZE', '10')),
+                'timeout': float(os.environ.get('EAGRO_DB_POOL_TIMEOUT', '10')),
+            },
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('EAGRO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Seconds a writer waits for the lock before "database is locked"
+                'timeout': float(os.environ.get('EAGRO_SQLITE_TIMEOUT', '20')),
+                # Take the write lock when a transaction begins, so writers queue
+                # on the timeout instead of failing on a read-to-write upgrade
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets readers run alongside the writer; NORMAL sync is
+                # durable across application crashes in WAL mode
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-16000;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -117,3 +180,179 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'eagroapp.User'
 
+
+# Plant disease model micro-batching
+# Concurrent uploads are grouped into one forward pass of up to
+# DISEASE_BATCH_MAX_SIZE images, waiting at most DISEASE_BATCH_MAX_WAIT_MS.
+DISEASE_BATCHING = os.environ.get('EAGRO_DISEASE_BATCHING', '1') == '1'
+DISEASE_BATCH_MAX_SIZE = int(os.environ.get('EAGRO_DISEASE_BATCH_MAX_SIZE', '16'))
+DISEASE_BATCH_MAX_WAIT_MS = float(os.environ.get('EAGRO_DISEASE_BATCH_MAX_WAIT_MS', '10'))
+
+# PyTorch intra-op threads per worker process. 0 divides the available
+# cores by WEB_CONCURRENCY (the gunicorn worker count).
+TORCH_NUM_THREADS = int(os.environ.get('EAGRO_TORCH_THREADS', '0'))
+
+# Bulk crop recommendation: rows scored per block and forest n_jobs
+CROP_BULK_CHUNK_SIZE = int(os.environ.get('EAGRO_CROP_BULK_CHUNK_SIZE', '10000'))
+CROP_BULK_N_JOBS = int(os.environ.get('EAGRO_CROP_BULK_N_JOBS', '-1'))
+# Cells (rows scored in one predict_proba call) of the largest what-if sweep
+CROP_SWEEP_MAX_CELLS = int(os.environ.get('EAGRO_CROP_SWEEP_MAX_CELLS', '2500'))
+
+# OpenWeatherMap. Results are cached per city in the 'weather' cache (see
+# CACHES; WEATHER_CACHE_SIZE entries on the local backends) for
+# WEATHER_CACHE_TTL seconds and served stale for up to WEATHER_CACHE_STALE_TTL
+# more if the API fails.
+WEATHER_API_URL = os.environ.get('EAGRO_WEATHER_API_URL', 'http://api.openweathermap.org/data/2.5/weather')
+# No key ships with the code: without OPENWEATHER_API_KEY every lookup
+# fails and crop predictions use the default temperature and humidity.
+WEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', '')
+WEATHER_CACHE_SIZE = int(os.environ.get('EAGRO_WEATHER_CACHE_SIZE', '1024'))
+WEATHER_CACHE_TTL = float(os.environ.get('EAGRO_WEATHER_CACHE_TTL', '600'))
+WEATHER_CACHE_STALE_TTL = float(os.environ.get('EAGRO_WEATHER_CACHE_STALE_TTL', '3600'))
+# Split connect/read timeouts, retries on transient errors, keep-alive pool
+# size, and a circuit breaker that skips the API for WEATHER_BREAKER_RESET
+# seconds after WEATHER_BREAKER_THRESHOLD consecutive failures.
+WEATHER_CONNECT_TIMEOUT = float(os.environ.get('EAGRO_WEATHER_CONNECT_TIMEOUT', '3.05'))
+WEATHER_READ_TIMEOUT = float(os.environ.get('EAGRO_WEATHER_READ_TIMEOUT', '5'))
+WEATHER_RETRIES = int(os.environ.get('EAGRO_WEATHER_RETRIES', '2'))
+WEATHER_POOL_SIZE = int(os.environ.get('EAGRO_WEATHER_POOL_SIZE', '10'))
+WEATHER_BREAKER_THRESHOLD = int(os.environ.get('EAGRO_WEATHER_BREAKER_THRESHOLD', '5'))
+WEATHER_BREAKER_RESET = float(os.environ.get('EAGRO_WEATHER_BREAKER_RESET', '30'))
+# Connection limit of the async (ASGI) weather client
+WEATHER_ASYNC_POOL_SIZE = int(os.environ.get('EAGRO_WEATHER_ASYNC_POOL_SIZE', '100'))
+
+# Route /crop-recommendation/ to the async view. Enable when serving through
+# eagro.asgi (e.g. uvicorn); under WSGI each async view needs its own event loop.
+ASYNC_VIEWS = os.environ.get('EAGRO_ASYNC_VIEWS', '0') == '1'
+
+# Prediction model files. They are loaded on first use; set EAGRO_WARM_UP=1
+# to load them when the WSGI/ASGI application starts instead.
+CROP_MODEL_PATH = os.environ.get('EAGRO_CROP_MODEL_PATH', str(BASE_DIR / 'models' / 'RandomForest.pkl'))
+DISEASE_MODEL_PATH = os.environ.get('EAGRO_DISEASE_MODEL_PATH', str(BASE_DIR / 'models' / 'plant_disease_model.pth'))
+WARM_UP_MODELS = os.environ.get('EAGRO_WARM_UP', '0') == '1'
+
+# The crop RandomForest is copied into flat NumPy arrays when it is loaded
+# (checked against sklearn). On one CPU a single-row prediction takes about
+# 0.15 ms with the 100-tree forest in models/ instead of 13 ms, and under
+# 0.1 ms with forests of about 20 trees. Set EAGRO_CROP_MODEL_FLAT=0 to use
+# sklearn.
+CROP_MODEL_FLAT = os.environ.get('EAGRO_CROP_MODEL_FLAT', '1') == '1'
+
+# Memory-map the disease model weights (torch.load(mmap=True)) so every worker
+# process shares one copy through the page cache.
+DISEASE_MODEL_MMAP = os.environ.get('EAGRO_DISEASE_MODEL_MMAP', '1') == '1'
+
+# Disease model variant on CPU: 'fp32', 'channels_last' (BatchNorm folded into
+# the convolutions, NHWC layout) or 'int8' (statically quantized TorchScript
+# written by `manage.py quantize_disease_model`). Only the fp32 weights are
+# memory-mapped; the other variants hold a private copy in each process.
+DISEASE_PRECISION = os.environ.get('EAGRO_DISEASE_PRECISION', 'fp32')
+DISEASE_INT8_MODEL_PATH = os.environ.get('EAGRO_DISEASE_INT8_MODEL_PATH', str(BASE_DIR / 'models' / 'plant_disease_model.int8.pt'))
+
+# Disease inference backend: 'eager' (PyTorch, honours DISEASE_PRECISION),
+# 'torchscript' (frozen graph) or 'onnx' (ONNX Runtime CPU provider, workers
+# never import torch). Export the files with `manage.py export_disease_model`.
+DISEASE_BACKEND = os.environ.get('EAGRO_DISEASE_BACKEND', 'eager')
+DISEASE_TORCHSCRIPT_MODEL_PATH = os.environ.get('EAGRO_DISEASE_TORCHSCRIPT_MODEL_PATH', str(BASE_DIR / 'models' / 'plant_disease_model.torchscript.pt'))
+DISEASE_ONNX_MODEL_PATH = os.environ.get('EAGRO_DISEASE_ONNX_MODEL_PATH', str(BASE_DIR / 'models' / 'plant_disease_model.onnx'))
+
+# Decode large JPEG uploads directly at 1/2, 1/4 or 1/8 scale before resizing
+# to 256 px. Off by default: the model input then differs slightly from the
+# training-time Resize(256), so check top-1 agreement before turning it on.
+FAST_IMAGE_DECODE = os.environ.get('EAGRO_FAST_IMAGE_DECODE', '0') == '1'
+
+# Disease image uploads. Files over EAGRO_MAX_UPLOAD_BYTES, images over
+# EAGRO_MAX_IMAGE_PIXELS (read from the header) and non-images are rejected
+# while the upload streams in. Uploads above FILE_UPLOAD_MAX_MEMORY_SIZE are
+# spooled to a temporary file, and at most EAGRO_MAX_CONCURRENT_DECODES images
+# are decoded at once, which bounds the decode memory of each worker.
+MAX_UPLOAD_BYTES = int(os.environ.get('EAGRO_MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get('EAGRO_MAX_IMAGE_PIXELS', '40000000'))
+MAX_CONCURRENT_DECODES = int(os.environ.get('EAGRO_MAX_CONCURRENT_DECODES', '2'))
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('EAGRO_UPLOAD_MEMORY_BYTES', str(1024 * 1024)))
+
+# Weather results, disease predictions and rendered result fragments live in
+# Django caches. EAGRO_CACHE_BACKEND selects where: 'locmem' (each process),
+# 'file' (a directory shared by the processes of one host), or 'memcached' /
+# 'redis' (one server shared by every app server behind the load balancer;
+# pip install pymemcache or redis). EAGRO_CACHE_LOCATION is the directory or
+# the comma-separated server addresses; with redis the first one is the
+# primary and the others are read replicas. A cache server that is down or
+# slower than EAGRO_CACHE_SOCKET_TIMEOUT seconds counts as a cache miss.
+CACHE_BACKEND = os.environ.get('EAGRO_CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = [address.strip() for address in os.environ.get('EAGRO_CACHE_LOCATION', '').split(',')
+                  if address.strip()]
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ValueError(f"EAGRO_CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}, not {CACHE_BACKEND!r}")
+CACHE_SOCKET_TIMEOUT = float(os.environ.get('EAGRO_CACHE_SOCKET_TIMEOUT', '0.25'))
+
+# Disease predictions are cached by image content in the 'predictions' cache:
+# up to EAGRO_PREDICTION_CACHE_SIZE entries (local backends) for
+# EAGRO_PREDICTION_CACHE_TTL seconds, under a key version derived from the
+# model file, so a new model never answers with the old one's predictions.
+# EAGRO_PREDICTION_CACHE_PERCEPTUAL=1 also keys them by a perceptual hash, so
+# resized or re-encoded copies of a photo hit the cache too.
+PREDICTION_CACHE = os.environ.get('EAGRO_PREDICTION_CACHE', '1') == '1'
+PREDICTION_CACHE_ALIAS = 'predictions'
+PREDICTION_CACHE_PERCEPTUAL = os.environ.get('EAGRO_PREDICTION_CACHE_PERCEPTUAL', '0') == '1'
+WEATHER_CACHE_ALIAS = 'weather'
+FRAGMENT_CACHE_ALIAS = 'fragments'
+
+# alias -> (default timeout, entry limit of the local backends)
+_cache_sizes = {
+    'default': (300, 300),
+    PREDICTION_CACHE_ALIAS: (int(os.environ.get('EAGRO_PREDICTION_CACHE_TTL', str(7 * 24 * 3600))),
+                             int(os.environ.get('EAGRO_PREDICTION_CACHE_SIZE', '10000'))),
+    # Entries outlive WEATHER_CACHE_TTL so they can be served stale
+    WEATHER_CACHE_ALIAS: (int(WEATHER_CACHE_TTL + WEATHER_CACHE_STALE_TTL), WEATHER_CACHE_SIZE),
+    # Fragments only change with a release, which changes their key version
+    FRAGMENT_CACHE_ALIAS: (None, 1000),
+}
+CACHES = {}
+for _alias, (_timeout, _max_entries) in _cache_sizes.items():
+    CACHES[_alias] = {'BACKEND': CACHE_BACKENDS[CACHE_BACKEND], 'TIMEOUT': _timeout}
+    if CACHE_BACKEND == 'locmem':
+        CACHES[_alias]['LOCATION'] = f'eagro-{_alias}'
+        CACHES[_alias]['OPTIONS'] = {'MAX_ENTRIES': _max_entries}
+    elif CACHE_BACKEND == 'file':
+        # One directory per alias, so clearing one cache leaves the others
+        _root = CACHE_LOCATION[0] if CACHE_LOCATION else os.path.join(tempfile.gettempdir(), 'eagro-cache')
+        CACHES[_alias]['LOCATION'] = os.path.join(_root, _alias)
+        CACHES[_alias]['OPTIONS'] = {'MAX_ENTRIES': _max_entries}
+    else:
+        CACHES[_alias]['LOCATION'] = CACHE_LOCATION or (
+            ['127.0.0.1:11211'] if CACHE_BACKEND == 'memcached' else ['redis://127.0.0.1:6379'])
+        # The aliases share the server; their keys are kept apart by prefix
+        CACHES[_alias]['KEY_PREFIX'] = f'eagro-{_alias}'
+        if CACHE_BACKEND == 'memcached':
+            CACHES[_alias]['OPTIONS'] = {'connect_timeout': CACHE_SOCKET_TIMEOUT, 'timeout': CACHE_SOCKET_TIMEOUT}
+        else:
+            CACHES[_alias]['OPTIONS'] = {'socket_connect_timeout': CACHE_SOCKET_TIMEOUT,
+                                         'socket_timeout': CACHE_SOCKET_TIMEOUT}
+
+# Disease and fertilizer result pages are rendered once per class and served
+# with a strong ETag; browsers and proxies may reuse them for this many seconds
+RESULT_PAGE_MAX_AGE = int(os.environ.get('EAGRO_RESULT_PAGE_MAX_AGE', str(24 * 3600)))
+
+# Every prediction is logged to the Prediction table for audits and retraining.
+# Rows are buffered in memory and inserted in batches of
+# EAGRO_PREDICTION_HISTORY_BATCH_SIZE, or every ..._FLUSH_INTERVAL seconds, by a
+# background thread; beyond ..._MAX_PENDING buffered rows new ones are dropped.
+PREDICTION_HISTORY = os.environ.get('EAGRO_PREDICTION_HISTORY', '1') == '1'
+PREDICTION_HISTORY_BATCH_SIZE = int(os.environ.get('EAGRO_PREDICTION_HISTORY_BATCH_SIZE', '100'))
+PREDICTION_HISTORY_FLUSH_INTERVAL = float(os.environ.get('EAGRO_PREDICTION_HISTORY_FLUSH_INTERVAL', '2'))
+PREDICTION_HISTORY_MAX_PENDING = int(os.environ.get('EAGRO_PREDICTION_HISTORY_MAX_PENDING', '10000'))
+
+# Disease inference in separate processes: EAGRO_DISEASE_PROCESS_POOL_SIZE
+# processes per web worker (0 runs it in the worker), each with
+# ..._THREADS torch threads. A prediction taking longer than ..._TIMEOUT
+# seconds fails and its process is replaced.
+DISEASE_PROCESS_POOL_SIZE = int(os.environ.get('EAGRO_DISEASE_PROCESS_POOL_SIZE', '0'))
+DISEASE_PROCESS_POOL_THREADS = int(os.environ.get('EAGRO_DISEASE_PROCESS_POOL_THREADS', '1'))
+DISEASE_PROCESS_POOL_TIMEOUT = float(os.environ.get('EAGRO_DISEASE_PROCESS_POOL_TIMEOUT', '30'))
@@ -0,0 +1,245 @@
+"""
+JSON API (v1) for the mobile app.
+
+Prediction responses carry class ids, top-k probabilities and a URL for
+the advice text instead of the rendered advice. Clients fetch the advice
+once per class and cache it, as it only changes with a new release; the
+advice responses carry ETags for revalidation.
+"""
+import json
+import time
+
+import numpy as np
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import etag, require_GET, require_POST
+
+from . import config, sweep, views
+from .bulk import CROP_FEATURES
+from .disease import disease_classes, disease_dic
+from .fertilizer import fertilizer_dic
+from .fertilizer_table import recommendation_key
+from .fragments import result_pages
+from .metrics import stage
+from .registry import registry
+from .uploads import bounded_image_uploads, upload_error
+
+# Probabilities returned when the request does not ask for a k
+DEFAULT_TOP_K = 3
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def request_data(request):
+    """
+    Fields of a JSON or form-encoded request body
+    :params: request
+    :return: dict
+    """
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        return data
+    return request.POST
+
+
+def top_k(probabilities, labels, k):
+    """
+    The k most likely classes
+    :params: probabilities (numpy array), labels, k
+    :return: list of dicts with id, label and probability
+    """
+    k = max(1, min(k, len(probabilities)))
+    best = np.argpartition(probabilities, -k)[-k:]
+    best = best[np.argsort(probabilities[best])[::-1]]
+    return [{'id': int(i), 'label': str(labels[i]), 'probability': round(float(probabilities[i]), 6)}
+            for i in best]
+
+
+def requested_k(request):
+    try:
+        return int(request.GET.get('k', DEFAULT_TOP_K))
+    except ValueError:
+        return DEFAULT_TOP_K
+
+
+def finite_float(data, name):
+    """
+    :params: data (request_data), name
+    :return: the field as a float
+    :raises: ValueError for NaN, infinities and non-numbers, KeyError when missing
+    """
+    value = float(data[name])
+    if not np.isfinite(value):
+        raise ValueError(f'{name} must be a finite number')
+    return value
+
+
+def crop_features(data):
+    """
+    The seven crop model inputs of a request. Temperature and humidity come
+    from the request, else from the weather of the city if one is given,
+    else defaults.
+    :params: data (request_data)
+    :return: (dict of feature values, weather source)
+    :raises: ValueError, KeyError, TypeError for missing or invalid fields
+    """
+    features = {name: finite_float(data, name) for name in ('N', 'P', 'K', 'ph', 'rainfall')}
+    if 'temperature' in data and 'humidity' in data:
+        features['temperature'] = finite_float(data, 'temperature')
+        features['humidity'] = finite_float(data, 'humidity')
+        return features, 'request'
+    city = str(data.get('city') or '').strip()
+    # Without a city there is nothing to look up
+    weather_data = views.weather_fetch(city) if city else None
+    if weather_data is not None:
+        features['temperature'], features['humidity'] = weather_data
+        return features, 'weather_api'
+    # Same defaults as the HTML view
+    features['temperature'], features['humidity'] = 25.0, 60.0
+    return features, 'default'
+
+
+@csrf_exempt
+@require_POST
+def crop(request):
+    """
+    Crop recommendation. Fields: N, P, K, ph, rainfall and either city or
+    temperature and humidity.
+    """
+    started = time.perf_counter()
+    with stage('model_lookup'):
+        model = registry.get('crop')
+    if model is None:
+        return error('Crop recommendation model is not available.', 503)
+    try:
+        data = request_data(request)
+        features, source = crop_features(data)
+    except (ValueError, KeyError, TypeError) as e:
+        return error(f'Invalid input: {e}')
+
+    row = np.array([[features[name] for name in CROP_FEATURES]])
+    with stage('predict'):
+        probabilities = model.predict_proba(row)[0]
+    ranked = top_k(probabilities, model.classes_, requested_k(request))
+    views.log_prediction(request, 'crop', views.crop_inputs(row, data.get('city')), ranked[0]['label'], started)
+    return JsonResponse({
+        'crop': ranked[0]['label'],
+        'top_k': ranked,
+        'weather': {'temperature': features['temperature'], 'humidity': features['humidity'], 'source': source},
+    })
+
+
+@csrf_exempt
+@require_POST
+def crop_sweep(request):
+    """
+    What-if grid of crop recommendations. JSON body: the crop fields as
+    base values, plus "axes": one or two of {"feature": "N", "start": 40,
+    "stop": 140, "steps": 11}, {"feature": "rainfall", "percent": [-30, 30],
+    "steps": 7} or {"feature": "ph", "values": [5.5, 6.5, 7.5]}.
+    """
+    with stage('model_lookup'):
+        model = registry.get('crop')
+    if model is None:
+        return error('Crop recommendation model is not available.', 503)
+    try:
+        data = request_data(request)
+        features, source = crop_features(data)
+        axes = data.get('axes')
+        if isinstance(axes, str):
+            # Form-encoded requests carry the axes as a JSON string
+            axes = json.loads(axes)
+        with stage('predict'):
+            result = sweep.sweep(model, features, axes, config.CROP_SWEEP_MAX_CELLS)
+    except sweep.SweepError as e:
+        return error(str(e))
+    except (ValueError, KeyError, TypeError) as e:
+        return error(f'Invalid input: {e}')
+
+    result['base'] = features
+    result['weather_source'] = source
+    return JsonResponse(result)
+
+
+@require_POST
+@bounded_image_uploads(csrf=False)
+def disease(request):
+    """Plant disease detection. Multipart field: file."""
+    started = time.perf_counter()
+    if not views.disease_model_available():
+        return error('Disease detection model is not available.', 503)
+    if upload_error(request):
+        return error(upload_error(request))
+    if 'file' not in request.FILES:
+        return error('No file was uploaded.')
+    try:
+        probabilities = views.disease_probabilities(request.FILES['file'])
+    except Exception as e:
+        return error(f'Could not process image: {e}')
+    if probabilities is None:
+        return error('Model prediction failed.', 503)
+
+    ranked = top_k(probabilities, disease_classes, requested_k(request))
+    label = ranked[0]['label']
+    views.log_prediction(request, 'disease', views.image_inputs(request.FILES['file']), label, started)
+    return JsonResponse({
+        'class_id': ranked[0]['id'],
+        'label': label,
+        'top_k': ranked,
+        'advice': reverse('api_disease_advice', args=[label]) if label in disease_dic else None,
+    })
+
+
+@csrf_exempt
+@require_POST
+def fertilizer(request):
+    """Fertilizer recommendation. Fields: crop, N, P, K."""
+    started = time.perf_counter()
+    if not views.fertilizer_table.available:
+        return error('Fertilizer data is not available.', 503)
+    try:
+        data = request_data(request)
+        crop_name = str(data['crop'])
+        N, P, K = (int(data[name]) for name in ('N', 'P', 'K'))
+    except (ValueError, KeyError, TypeError) as e:
+        return error(f'Invalid input: {e}')
+
+    with stage('csv_lookup'):
+        recommended = views.fertilizer_table.get(crop_name)
+    if recommended is None:
+        return error(f'No fertilizer data for crop "{crop_name}".', 404)
+    key = recommendation_key(recommended, N, P, K)
+    views.log_prediction(request, 'fertilizer', {'crop': crop_name, 'N': N, 'P': P, 'K': K}, key, started)
+    return JsonResponse({
+        'crop': crop_name,
+        'key': key,
+        'advice': reverse('api_fertilizer_advice', args=[key]),
+    })
+
+
+@require_GET
+@cache_control(public=True, max_age=config.RESULT_PAGE_MAX_AGE)
+def disease_classes_list(request):
+    return JsonResponse({'classes': list(disease_classes)})
+
+
+@require_GET
+@etag(lambda request, label: result_pages.etag('disease', label, 'json'))
+def disease_advice(request, label):
+    if label not in disease_dic:
+        return error('Unknown disease class.', 404)
+    return result_pages.response('disease', label, 'json')
+
+
+@require_GET
+@etag(lambda request, key: result_pages.etag('fertilizer', key, 'json'))
+def fertilizer_advice(request, key):
+    if key not in fertilizer_dic:
+        return error('Unknown fertilizer recommendation.', 404)
+    return result_pages.response('fertilizer', key, 'json')
@@ -0,0 +1,90 @@
+"""
+Alternative inference backends for the plant disease model.
+
+- torchscript: a traced and frozen graph of ResNet9, still run by torch
+  but without Python-level module dispatch.
+- onnx: the exported graph run by ONNX Runtime's CPU provider. Inputs and
+  outputs are NumPy arrays, so workers using it never import torch.
+"""
+import warnings
+
+import numpy as np
+
+from . import inference
+
+# Optional ONNX Runtime import
+try:
+    import onnxruntime
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+    onnxruntime = None
+
+
+class OnnxModel:
+    """
+    Callable ONNX Runtime session taking and returning NumPy batches
+    :params: path, num_threads (None splits the cores across WEB_CONCURRENCY workers)
+    """
+    numpy_io = True
+
+    def __init__(self, path, num_threads=None):
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = inference.default_threads(num_threads)
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+def _example_input():
+    import torch
+    return torch.rand(1, 3, inference.INPUT_SIZE, inference.INPUT_SIZE)
+
+
+def export_torchscript(model, path):
+    """Traces, freezes and saves a model as TorchScript"""
+    import torch
+    with warnings.catch_warnings():
+        # torch.jit is deprecated in favour of torch.export in recent releases
+        warnings.simplefilter('ignore')
+        with torch.inference_mode():
+            scripted = torch.jit.freeze(torch.jit.trace(model.eval(), _example_input()).eval())
+        torch.jit.save(scripted, path)
+
+
+def load_torchscript(path):
+    import torch
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return torch.jit.load(path, map_location='cpu').eval()
+
+
+def export_onnx(model, path, opset=17):
+    """
+    Exports a model to ONNX with dynamic batch size and image dimensions
+    :params: model, path, opset
+    """
+    import torch
+    kwargs = dict(
+        input_names=['input'],
+        output_names=['scores'],
+        dynamic_axes={'input': {0: 'batch', 2: 'height', 3: 'width'}, 'scores': {0: 'batch'}},
+        opset_version=opset,
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            # Keep the TorchScript-based exporter; the dynamo one needs onnxscript
+            torch.onnx.export(model.eval(), (_example_input(),), path, dynamo=False, **kwargs)
+        except TypeError:
+            # torch < 2.5 has no dynamo argument
+            torch.onnx.export(model.eval(), (_example_input(),), path, **kwargs)
+
+
+def load_onnx(path, num_threads=None):
+    return OnnxModel(path, num_threads)
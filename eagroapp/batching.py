@@ -0,0 +1,170 @@
+"""
+Micro-batching front end for the plant disease model.
+
+Concurrent requests hand their preprocessed image tensors to a single
+background thread, which groups them into one batched forward pass of
+up to ``max_batch_size`` images, waiting at most ``max_wait_ms`` for a
+batch to fill up.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from . import inference
+
+
+class BatchingPredictor:
+    """
+    Collects single-image requests into batched forward passes
+    :params: model, max_batch_size, max_wait_ms
+    """
+
+    def __init__(self, model, max_batch_size=16, max_wait_ms=10):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self._started = time.perf_counter()
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._largest_batch = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._total_forward = 0.0
+
+    def _ensure_worker(self):
+        # The worker is started lazily so a forked process gets its own thread
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name='disease-batcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, tensor):
+        """
+        Queues one preprocessed image (C x H x W) for prediction
+        :params: tensor
+        :return: Future resolving to the model output row for that image
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('BatchingPredictor is closed')
+            self._ensure_worker()
+        self._queue.put((tensor, future, time.perf_counter()))
+        return future
+
+    def predict(self, tensor, timeout=None):
+        """
+        Blocking helper around submit()
+        :params: tensor, timeout
+        :return: model output row (1-D tensor of class scores)
+        """
+        return self.submit(tensor).result(timeout=timeout)
+
+    def close(self):
+        """Stops the worker once the queued requests are served"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        """
+        Throughput and latency counters since start (or last reset)
+        :return: dict
+        """
+        with self._lock:
+            elapsed = time.perf_counter() - self._started
+            requests = self._requests
+            batches = self._batches
+            return {
+                'requests': requests,
+                'batches': batches,
+                'errors': self._errors,
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'largest_batch': self._largest_batch,
+                'avg_batch_size': requests / batches if batches else 0.0,
+                'avg_latency_ms': self._total_latency / requests * 1000.0 if requests else 0.0,
+                'max_latency_ms': self._max_latency * 1000.0,
+                'avg_forward_ms': self._total_forward / batches * 1000.0 if batches else 0.0,
+                'throughput_per_s': requests / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._reset_counters()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the shutdown marker so the run loop sees it
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            self._process(self._collect(first))
+
+    def _process(self, batch):
+        # Images are resized on the short edge only, so group by shape and
+        # run one forward pass per distinct input size.
+        groups = {}
+        for item in batch:
+            groups.setdefault(tuple(item[0].shape), []).append(item)
+
+        for items in groups.values():
+            pending = [item for item in items if item[1].set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            started = time.perf_counter()
+            try:
+                inputs = inference.stack([item[0] for item in pending])
+                outputs = inference.forward(self.model, inputs)
+            except Exception as e:
+                with self._lock:
+                    self._errors += len(pending)
+                for item in pending:
+                    item[1].set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            with self._lock:
+                self._batches += 1
+                self._requests += len(pending)
+                self._largest_batch = max(self._largest_batch, len(pending))
+                self._total_forward += finished - started
+                for item in pending:
+                    latency = finished - item[2]
+                    self._total_latency += latency
+                    self._max_latency = max(self._max_latency, latency)
+
+            for item, output in zip(pending, outputs):
+                item[1].set_result(output)
@@ -0,0 +1,68 @@
+"""
+Deterministic inputs and timing summaries for the benchmark suite
+(eagroapp.benchmarks), the benchmark management commands and the tests.
+"""
+import io
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_jpeg(width=256, height=256, seed=0, quality=90):
+    """
+    Deterministic leaf-coloured noise encoded as JPEG
+    :params: width, height, seed, quality
+    :return: bytes
+    """
+    rng = np.random.default_rng(seed)
+    base = np.array([60, 140, 50], dtype=np.float32)
+    pixels = base + rng.normal(0, 40, size=(height, width, 3))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), 'RGB')
+    buf = io.BytesIO()
+    image.save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+
+def time_calls(func, iterations, warmup=1):
+    """
+    Calls func repeatedly and summarises the wall time per call
+    :params: func, iterations, warmup
+    :return: dict of milliseconds
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return percentiles(samples)
+
+
+def format_timing(label, timing):
+    return (f"{label:<24} mean {timing['mean_ms']:8.2f} ms  "
+            f"p50 {timing['p50_ms']:8.2f} ms  p99 {timing['p99_ms']:8.2f} ms")
+
+
+def soil_rows(count, seed=0):
+    """
+    Deterministic N, P, K, temperature, humidity, ph, rainfall rows
+    :params: count, seed
+    :return: count x 7 float array
+    """
+    rng = np.random.default_rng(seed)
+    low = np.array([0, 5, 5, 8, 14, 3.5, 20])
+    high = np.array([140, 145, 205, 44, 100, 10, 300])
+    return rng.uniform(low, high, size=(count, 7)).round(2)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': statistics.fmean(samples),
+        'p50_ms': samples[len(samples) // 2],
+        'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        'min_ms': samples[0],
+    }
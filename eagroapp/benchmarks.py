@@ -0,0 +1,266 @@
+"""
+Reproducible benchmarks of the prediction endpoints.
+
+Inputs are generated from fixed seeds: soil-test rows, leaf-coloured JPEGs
+at phone-camera sizes, and crop names from Data/fertilizer.csv. The crop,
+disease and fertilizer predictions are timed both as plain function calls
+and as requests through the Django test client. The weather API is served
+by a local stub, and small stand-in models with fixed weights replace the
+trained ones (unless real models are requested), so results only depend
+on the code and the machine.
+
+Results are plain JSON. compare() checks them against a stored baseline
+and reports every benchmark that got slower than the threshold allows.
+"""
+import contextlib
+import io
+import os
+import platform
+import time
+
+import numpy as np
+from django.conf import settings
+from django.test import Client, override_settings
+
+from . import config, views
+from .fertilizer_table import recommendation_key
+from .benchdata import percentiles, soil_rows, synthetic_jpeg
+from .registry import flat_crop_model, registry
+from .testing import StubWeatherServer
+
+# Small, medium and 12 MP phone photos
+IMAGE_SIZES = ((256, 256), (1600, 1200), (4032, 3024))
+
+# Statistics compare() can check
+METRICS = ('mean_ms', 'p50_ms', 'p99_ms', 'min_ms')
+
+# Models and caches swapped out while the suite runs
+_REGISTRY_NAMES = ('crop', 'disease', 'disease_batcher', 'disease_pool')
+
+
+def crop_names():
+    """Crops of Data/fertilizer.csv, in file order"""
+    return views.fertilizer_table.crops()
+
+
+def standin_crop_model(seed=0):
+    """
+    Small RandomForest fitted on synthetic soil rows, labelled with the
+    crops of the fertilizer table
+    :params: seed
+    :return: model
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(seed)
+    features = soil_rows(1000, seed=seed)
+    crops = np.array(crop_names() or ['Rice', 'Maize'])
+    labels = crops[rng.integers(0, len(crops), len(features))]
+    model = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=seed)
+    return model.fit(features, labels)
+
+
+def standin_disease_model(seed=0):
+    """
+    Pooling plus one linear layer with fixed random weights. It keeps the
+    model's input and output shapes but costs almost nothing, so the
+    timings show the request path; bench_disease times the real network.
+    :params: seed
+    :return: torch module
+    """
+    import torch
+    import torch.nn as nn
+    from .disease import disease_classes
+    torch.manual_seed(seed)
+    model = nn.Sequential(
+        nn.AdaptiveAvgPool2d(8),
+        nn.Flatten(),
+        nn.Linear(3 * 8 * 8, len(disease_classes)))
+    return model.eval()
+
+
+def local_caches():
+    """
+    Process-local stand-ins for every configured cache alias, for use with
+    override_settings(CACHES=...), so that clearing a cache between runs
+    never flushes a shared memcached or Redis server
+    :return: CACHES setting
+    """
+    return {alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': f'eagro-benchmark-{alias}'} for alias in settings.CACHES}
+
+
+@contextlib.contextmanager
+def standin_environment(real_models=False):
+    """
+    Stand-in models, a local weather stub, process-local caches, and no
+    prediction cache, history or batching, restored on exit
+    :params: real_models (keep the trained models when they load)
+    """
+    saved_models = {name: registry.get(name) for name in _REGISTRY_NAMES if registry.loaded(name)}
+    saved_config = (config.PREDICTION_CACHE, config.PREDICTION_HISTORY)
+    saved_url = views.weather_client.url
+    crop_model = registry.get('crop') if real_models else None
+    disease_model = registry.get('disease') if real_models else None
+    if crop_model is None:
+        crop_model = standin_crop_model()
+        if config.CROP_MODEL_FLAT:
+            crop_model = flat_crop_model(crop_model)
+    registry.set('crop', crop_model)
+    registry.set('disease', disease_model if disease_model is not None else standin_disease_model())
+    # Every request runs its own forward pass in this process
+    registry.set('disease_batcher', None)
+    registry.set('disease_pool', None)
+    # Every disease request runs the model, and nothing is written to the database
+    config.PREDICTION_CACHE = False
+    config.PREDICTION_HISTORY = False
+    try:
+        with StubWeatherServer() as server, \
+                override_settings(ALLOWED_HOSTS=['testserver'], CACHES=local_caches()):
+            views.weather_client.url = server.url
+            views.weather_cache.clear()
+            yield
+    finally:
+        views.weather_client.url = saved_url
+        config.PREDICTION_CACHE, config.PREDICTION_HISTORY = saved_config
+        for name in _REGISTRY_NAMES:
+            if name in saved_models:
+                registry.set(name, saved_models[name])
+            else:
+                registry.unload(name)
+
+
+def _cycle(items):
+    state = {'i': -1}
+
+    def next_item():
+        state['i'] = (state['i'] + 1) % len(items)
+        return items[state['i']]
+    return next_item
+
+
+def build_suite(image_sizes=IMAGE_SIZES):
+    """
+    The benchmarks, as (name, function) pairs. Call inside
+    standin_environment().
+    :params: image_sizes ((width, height) of the disease images)
+    :return: list
+    """
+    rows = soil_rows(64, seed=1)
+    crops = crop_names()
+    next_row = _cycle(rows)
+    next_city = _cycle([f'city-{i}' for i in range(64)])
+    next_fertilizer = _cycle([(crop, int(n), int(p), int(k)) for crop, (n, p, k) in zip(
+        [crops[i % len(crops)] for i in range(64)],
+        soil_rows(64, seed=2)[:, :3])])
+    images = {f'{w}x{h}': synthetic_jpeg(w, h, seed=3) for w, h in image_sizes}
+    crop_model = registry.get('crop')
+    disease_model = registry.get('disease')
+    client = Client()
+
+    def weather_fetch():
+        # Each lookup reaches the stub instead of the weather cache
+        views.weather_cache.clear()
+        return views.weather_fetch(next_city())
+
+    def crop_model_predict():
+        return crop_model.predict(next_row()[np.newaxis])
+
+    def fertilizer_lookup():
+        crop, N, P, K = next_fertilizer()
+        return recommendation_key(views.fertilizer_table.get(crop), N, P, K)
+
+    def crop_request():
+        views.weather_cache.clear()
+        N, P, K, _, _, ph, rainfall = next_row()
+        return client.post('/crop-recommendation/', {
+            'nitrogen': int(N), 'phosphorous': int(P), 'pottasium': int(K),
+            'ph': ph, 'rainfall': rainfall, 'city': next_city()})
+
+    def fertilizer_request():
+        crop, N, P, K = next_fertilizer()
+        return client.post('/fertilizer-recommendation/', {
+            'cropname': crop, 'nitrogen': N, 'phosphorous': P, 'pottasium': K})
+
+    def disease_function(image):
+        return lambda: views.predict_image(image, disease_model)
+
+    def disease_request(image):
+        def request():
+            upload = io.BytesIO(image)
+            upload.name = 'leaf.jpg'
+            return client.post('/Crop-disease-prediction/', {'file': upload})
+        return request
+
+    suite = [
+        ('function.weather_fetch', weather_fetch),
+        ('function.crop_model', crop_model_predict),
+        ('function.fertilizer_lookup', fertilizer_lookup),
+    ]
+    suite += [(f'function.predict_image.{size}', disease_function(image)) for size, image in images.items()]
+    suite += [
+        ('client.crop_prediction', crop_request),
+        ('client.fert_recommend', fertilizer_request),
+    ]
+    suite += [(f'client.disease_prediction.{size}', disease_request(image)) for size, image in images.items()]
+    return suite
+
+
+def run_suite(suite, iterations=20, warmup=2, progress=None):
+    """
+    Times every benchmark of the suite
+    :params: suite, iterations, warmup, progress (called with name and
+             result after each benchmark)
+    :return: dict of name -> timing (milliseconds)
+    """
+    results = {}
+    for name, func in suite:
+        for _ in range(warmup):
+            func()
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000.0)
+        results[name] = dict(percentiles(samples), iterations=iterations)
+        if progress is not None:
+            progress(name, results[name])
+    return results
+
+
+def environment(real_models=False):
+    """Versions and hardware the results were measured on"""
+    import django
+    info = {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'models': 'real' if real_models else 'stand-in',
+    }
+    if views.TORCH_AVAILABLE:
+        import torch
+        info['torch'] = torch.__version__
+        info['torch_threads'] = torch.get_num_threads()
+    return info
+
+
+def compare(results, baseline, threshold=0.25, metric='p50_ms', min_delta_ms=0.5):
+    """
+    Benchmarks that got slower than the baseline by more than threshold
+    :params: results, baseline (both name -> timing), threshold (0.25 =
+             25% slower), metric (one of METRICS), min_delta_ms (smaller
+             slowdowns are timer noise, whatever their ratio)
+    :return: list of (name, baseline value, current value, ratio), worst first
+    """
+    regressions = []
+    for name, timing in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name][metric], timing[metric]
+        if after - before < min_delta_ms:
+            continue
+        ratio = after / before if before > 0 else float('inf')
+        if ratio > 1.0 + threshold:
+            regressions.append((name, before, after, ratio))
+    return sorted(regressions, key=lambda item: item[3], reverse=True)
@@ -0,0 +1,136 @@
+"""
+Chunked, vectorised crop recommendation for soil-test CSV files.
+
+Rows are read in blocks, each block is scored with a single
+predict_proba call on the RandomForest, and results are written out as
+soon as the block is done so memory stays bounded by the chunk size.
+Rows with a missing, non-numeric or infinite feature are passed through
+unscored with the reason in the error column, so one bad line does not
+stop a large file.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Feature order the crop recommendation model was trained on
+CROP_FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+
+def parallel_model(model, n_jobs):
+    """
+    Shallow copy of a fitted forest that predicts with n_jobs workers.
+    The trees are shared, only the n_jobs parameter differs.
+    :params: model, n_jobs
+    :return: model
+    """
+    # Blocks are large enough for sklearn's own traversal (see forest.py)
+    model = getattr(model, 'forest', model)
+    if n_jobs is None or not hasattr(model, 'n_jobs'):
+        return model
+    model = copy.copy(model)
+    model.n_jobs = n_jobs
+    return model
+
+
+def _feature_columns(columns):
+    lookup = {str(column).strip().lower(): column for column in columns}
+    missing = [name for name in CROP_FEATURES if name.lower() not in lookup]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+    return [lookup[name.lower()] for name in CROP_FEATURES]
+
+
+def iter_blocks(source, chunk_size=10000):
+    """
+    Reads a soil-test CSV lazily
+    :params: source (path or file object), chunk_size
+    :return: iterator of DataFrames of at most chunk_size rows
+    """
+    return pd.read_csv(source, chunksize=chunk_size)
+
+
+def invalid_rows(features):
+    """
+    :params: features (n_rows x 7 float array, NaN where a value was not a number)
+    :return: (boolean mask of rows that cannot be scored, their error messages)
+    """
+    bad = ~np.isfinite(features)
+    invalid = bad.any(axis=1)
+    errors = [f"invalid {', '.join(name for name, flag in zip(CROP_FEATURES, row) if flag)}"
+              for row in bad[invalid]]
+    return invalid, errors
+
+
+def score_block(model, frame, proba=False):
+    """
+    Scores one block of soil-test rows with a single predict_proba call
+    :params: model, frame, proba (add one column per crop probability)
+    :return: frame with prediction, confidence and error columns appended
+             (invalid rows get no prediction and an error message)
+    :raises: ValueError when a feature column is missing
+    """
+    columns = _feature_columns(frame.columns)
+    features = frame[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    invalid, errors = invalid_rows(features)
+    if invalid.any():
+        probabilities = np.full((len(frame), len(model.classes_)), np.nan)
+        if not invalid.all():
+            probabilities[~invalid] = model.predict_proba(features[~invalid])
+    else:
+        probabilities = model.predict_proba(features)
+    best = probabilities.argmax(axis=1)
+
+    result = frame.copy()
+    result['prediction'] = np.where(invalid, '', model.classes_[best])
+    result['confidence'] = probabilities[np.arange(len(best)), best].round(4)
+    if proba:
+        for index, crop in enumerate(model.classes_):
+            result[f'proba_{crop}'] = probabilities[:, index].round(4)
+    result['error'] = ''
+    result.loc[invalid, 'error'] = errors
+    return result
+
+
+def iter_scored_csv(model, source, chunk_size=10000, n_jobs=None, proba=False):
+    """
+    Streams scored rows back as CSV text, one chunk at a time
+    :params: model, source, chunk_size, n_jobs, proba
+    :return: iterator of CSV strings (the first one carries the header).
+             When a later block cannot be read, the last string is a row
+             holding only the error, as the response has already started.
+    :raises: ValueError when the first block cannot be read
+    """
+    model = parallel_model(model, n_jobs)
+    columns = None
+    blocks = iter_blocks(source, chunk_size)
+    while True:
+        try:
+            frame = next(blocks, None)
+            if frame is None:
+                return
+            result = score_block(model, frame, proba)
+        except ValueError as e:
+            if columns is None:
+                raise
+            trailer = pd.DataFrame([{'error': f'Could not read the rest of the file: {str(e).strip()}'}], columns=columns)
+            yield trailer.to_csv(index=False, header=False)
+            return
+        yield result.to_csv(index=False, header=columns is None)
+        columns = result.columns
+
+
+def score_csv(model, source, out, chunk_size=10000, n_jobs=None, proba=False):
+    """
+    Scores a soil-test CSV into a writable text stream
+    :params: model, source, out, chunk_size, n_jobs, proba
+    :return: number of rows written
+    """
+    rows = 0
+    model = parallel_model(model, n_jobs)
+    header = True
+    for frame in iter_blocks(source, chunk_size):
+        score_block(model, frame, proba).to_csv(out, index=False, header=header)
+        header = False
+        rows += len(frame)
+    return rows
@@ -0,0 +1,217 @@
+"""
+Offline disease classification of image folders.
+
+Images are decoded by the worker processes of a torch DataLoader, which
+also stack them into batches, while the main process runs the disease
+model on one batch after another. Results are appended to a CSV or JSONL
+file as each batch finishes. Images already listed in the output are
+skipped, so an interrupted run continues where it stopped.
+"""
+import csv
+import json
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from . import inference
+from .disease import disease_classes
+
+FIELDS = ['path', 'class', 'confidence', 'error']
+
+
+class ImageFolder(Dataset):
+    """
+    Preprocessed images, read by path
+    :params: root, paths (relative to root)
+    """
+
+    def __init__(self, root, paths):
+        self.root = root
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        path = self.paths[index]
+        try:
+            with open(os.path.join(self.root, path), 'rb') as f:
+                return path, inference.preprocess_array(f), None
+        except Exception as e:
+            # A corrupt photo is reported in the output, not fatal
+            return path, None, f'{type(e).__name__}: {e}'
+
+
+def collate(items):
+    """
+    Stacks the decoded images of a batch, in the worker process. Images
+    are resized on the short edge only, so portrait, landscape and other
+    aspect ratios are stacked separately, as in the micro-batcher.
+    :params: items (path, array or None, error or None)
+    :return: ([(paths, N x 3 x H x W tensor)] one per image shape, [(path, error)])
+    """
+    groups = {}
+    for path, array, _ in items:
+        if array is not None:
+            groups.setdefault(array.shape, []).append((path, array))
+    failed = [(path, error) for path, array, error in items if array is None]
+    # Tensors travel back to the main process through shared memory
+    return [([path for path, _ in group], torch.from_numpy(np.stack([a for _, a in group])))
+            for group in groups.values()], failed
+
+
+def relative_paths(root, extensions):
+    """
+    Image files below root, sorted so runs are reproducible
+    :params: root, extensions (lower-case suffixes)
+    :return: list of paths relative to root, with '/' separators
+    """
+    paths = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.lower().endswith(extensions):
+                path = os.path.relpath(os.path.join(directory, name), root)
+                paths.append(path.replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def output_format(path, format=None):
+    if format:
+        return format
+    return 'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv'
+
+
+def finished_paths(path, format):
+    """
+    Images already recorded in an earlier run's output (open the
+    ResultWriter first, so a half-written last line is dropped)
+    :params: path, format ('csv' or 'jsonl')
+    :return: set of relative paths
+    """
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, newline='') as f:
+        if format == 'jsonl':
+            for line in f:
+                try:
+                    done.add(json.loads(line)['path'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+        else:
+            for row in csv.DictReader(f):
+                if row.get('path'):
+                    done.add(row['path'])
+    return done
+
+
+def trim_partial_line(path):
+    """Cuts off the unterminated last line an interrupted run may leave"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        position = end
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            block = f.read(step)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != end:
+            f.truncate(position)
+
+
+class ResultWriter:
+    """
+    Appends result rows to a CSV or JSONL file, flushing after each batch
+    :params: path, format ('csv' or 'jsonl')
+    """
+
+    def __init__(self, path, format):
+        self.format = format
+        trim_partial_line(path)
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='')
+        self._csv = None
+        if format == 'csv':
+            self._csv = csv.DictWriter(self._file, FIELDS)
+            if new:
+                self._csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self._csv is not None:
+                self._csv.writerow(row)
+            else:
+                self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def classify_batch(model, paths, batch):
+    """
+    :params: model, paths, batch (N x 3 x H x W tensor)
+    :return: result rows
+    """
+    if getattr(model, 'numpy_io', False):
+        batch = batch.numpy()
+    scores = np.asarray(inference.forward(model, batch), dtype=np.float32)
+    exp = np.exp(scores - scores.max(axis=1, keepdims=True))
+    probabilities = exp / exp.sum(axis=1, keepdims=True)
+    best = probabilities.argmax(axis=1)
+    return [{'path': path, 'class': disease_classes[i],
+             'confidence': round(float(probabilities[n, i]), 4), 'error': ''}
+            for n, (path, i) in enumerate(zip(paths, best))]
+
+
+def error_rows(paths, error):
+    return [{'path': path, 'class': '', 'confidence': '', 'error': error} for path in paths]
+
+
+def classify_folder(model, root, paths, writer, batch_size=32, num_workers=None, progress=None):
+    """
+    Classifies images with a multi-process DataLoader. Images that cannot
+    be decoded, and every image of a shape group whose forward pass fails,
+    get a row with the error instead of ending the run.
+    :params: model, root, paths (relative to root), writer (ResultWriter),
+             batch_size, num_workers (decoding processes, default one per
+             core), progress (called with the number of images done)
+    :return: (classified, failed)
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    loader = DataLoader(
+        ImageFolder(root, paths),
+        batch_size=batch_size,
+        num_workers=num_workers,
+        collate_fn=collate,
+        prefetch_factor=4 if num_workers else None,
+        persistent_workers=False)
+    classified = failed = 0
+    for groups, errors in loader:
+        rows = []
+        for batch_paths, batch in groups:
+            try:
+                rows += classify_batch(model, batch_paths, batch)
+                classified += len(batch_paths)
+            except Exception as e:
+                # e.g. an image shape the model cannot take; the other
+                # groups of the batch are still classified
+                rows += error_rows(batch_paths, f'{type(e).__name__}: {e}')
+                failed += len(batch_paths)
+        for path, error in errors:
+            rows += error_rows([path], error)
+        writer.write(rows)
+        failed += len(errors)
+        if progress is not None:
+            progress(classified + failed)
+    return classified, failed
@@ -0,0 +1,68 @@
+"""
+Calls to the Django caches that survive a failing cache server.
+
+The caches only hold what can be fetched or computed again, so when a
+shared memcached or Redis server is down or times out, a read counts as a
+miss and a write is dropped instead of failing the request. Every failure
+is counted for /metrics, but a warning is printed at most once per
+WARNING_INTERVAL for each cache method, so an outage does not print a line
+per request.
+"""
+import threading
+import time
+
+# Seconds between two warnings about the same failing cache method
+WARNING_INTERVAL = 60.0
+
+_lock = threading.Lock()
+# method name -> failures since the process started
+_failures = {}
+# method name -> (time.monotonic() of the last warning, failures not printed since)
+_warned = {}
+
+
+def _failed(method, error):
+    name = method.__name__
+    now = time.monotonic()
+    with _lock:
+        _failures[name] = _failures.get(name, 0) + 1
+        last, suppressed = _warned.get(name, (None, 0))
+        if last is not None and now - last < WARNING_INTERVAL:
+            _warned[name] = (last, suppressed + 1)
+            return
+        _warned[name] = (now, 0)
+    more = f" ({suppressed} more failures since the last warning)" if suppressed else ""
+    print(f"Warning: cache {name} failed: {error}{more}")
+
+
+def failures():
+    """
+    :return: dict of cache method name -> failed calls
+    """
+    with _lock:
+        return dict(_failures)
+
+
+def cache_call(method, *args, default=None, **kwargs):
+    """
+    Calls a cache method, e.g. cache_call(cache.get, key, version=1)
+    :params: method (bound cache method), args and kwargs for it,
+             default (returned when the call fails)
+    :return: result of the call, or default
+    """
+    try:
+        return method(*args, **kwargs)
+    except Exception as e:
+        _failed(method, e)
+        return default
+
+
+async def acache_call(method, *args, default=None, **kwargs):
+    """
+    Async variant of cache_call(), e.g. await acache_call(cache.aget, key)
+    """
+    try:
+        return await method(*args, **kwargs)
+    except Exception as e:
+        _failed(method, e)
+        return default
@@ -1 +1,100 @@
-weather_api_key = "9d7cde1f6d07ec55650544be1631307e"
\ No newline at end of file
+"""
+Tunables for the eagroapp prediction paths.
+
+Every value can be overridden from the project settings module.
+"""
+from django.conf import settings
+
+# Micro-batching of plant disease predictions
+DISEASE_BATCHING = getattr(settings, 'DISEASE_BATCHING', True)
+DISEASE_BATCH_MAX_SIZE = getattr(settings, 'DISEASE_BATCH_MAX_SIZE', 16)
+DISEASE_BATCH_MAX_WAIT_MS = getattr(settings, 'DISEASE_BATCH_MAX_WAIT_MS', 10)
+
+# Intra-op threads per worker process (0 = cores / WEB_CONCURRENCY)
+TORCH_NUM_THREADS = getattr(settings, 'TORCH_NUM_THREADS', 0)
+
+# Bulk crop recommendation (CSV endpoint and score_crops command)
+CROP_BULK_CHUNK_SIZE = getattr(settings, 'CROP_BULK_CHUNK_SIZE', 10000)
+CROP_BULK_N_JOBS = getattr(settings, 'CROP_BULK_N_JOBS', -1)
+# Largest what-if grid scored by the crop sweep API
+CROP_SWEEP_MAX_CELLS = getattr(settings, 'CROP_SWEEP_MAX_CELLS', 2500)
+
+# OpenWeatherMap client and per-city cache
+WEATHER_API_URL = getattr(settings, 'WEATHER_API_URL', 'http://api.openweathermap.org/data/2.5/weather')
+WEATHER_API_KEY = getattr(settings, 'WEATHER_API_KEY', '')
+# Name this module exported before the settings-based configuration
+weather_api_key = WEATHER_API_KEY
+WEATHER_CACHE_ALIAS = getattr(settings, 'WEATHER_CACHE_ALIAS', 'weather')
+WEATHER_CACHE_TTL = getattr(settings, 'WEATHER_CACHE_TTL', 600)
+WEATHER_CACHE_STALE_TTL = getattr(settings, 'WEATHER_CACHE_STALE_TTL', 3600)
+WEATHER_CONNECT_TIMEOUT = getattr(settings, 'WEATHER_CONNECT_TIMEOUT', 3.05)
+WEATHER_READ_TIMEOUT = getattr(settings, 'WEATHER_READ_TIMEOUT', 5)
+WEATHER_RETRIES = getattr(settings, 'WEATHER_RETRIES', 2)
+WEATHER_POOL_SIZE = getattr(settings, 'WEATHER_POOL_SIZE', 10)
+WEATHER_BREAKER_THRESHOLD = getattr(settings, 'WEATHER_BREAKER_THRESHOLD', 5)
+WEATHER_BREAKER_RESET = getattr(settings, 'WEATHER_BREAKER_RESET', 30)
+WEATHER_ASYNC_POOL_SIZE = getattr(settings, 'WEATHER_ASYNC_POOL_SIZE', 100)
+
+# Serve crop predictions from the async view (enable when running under ASGI)
+ASYNC_VIEWS = getattr(settings, 'ASYNC_VIEWS', False)
+
+# Model files, loaded lazily by eagroapp.registry
+CROP_MODEL_PATH = str(getattr(settings, 'CROP_MODEL_PATH', settings.BASE_DIR / 'models' / 'RandomForest.pkl'))
+DISEASE_MODEL_PATH = str(getattr(settings, 'DISEASE_MODEL_PATH', settings.BASE_DIR / 'models' / 'plant_disease_model.pth'))
+
+# Compile the crop RandomForest into flat arrays at load time (eagroapp.forest)
+CROP_MODEL_FLAT = getattr(settings, 'CROP_MODEL_FLAT', True)
+
+# Load every model when a web worker starts instead of on first request
+WARM_UP_MODELS = getattr(settings, 'WARM_UP_MODELS', False)
+
+# Memory-map the disease model weights so worker processes share them
+DISEASE_MODEL_MMAP = getattr(settings, 'DISEASE_MODEL_MMAP', True)
+
+# Disease model variant: 'fp32', 'channels_last' (BatchNorm folded, NHWC)
+# or 'int8' (static quantization, see the quantize_disease_model command)
+DISEASE_PRECISION = getattr(settings, 'DISEASE_PRECISION', 'fp32')
+DISEASE_INT8_MODEL_PATH = str(getattr(settings, 'DISEASE_INT8_MODEL_PATH', settings.BASE_DIR / 'models' / 'plant_disease_model.int8.pt'))
+
+# Disease inference backend: 'eager' (PyTorch modules), 'torchscript' or
+# 'onnx' (ONNX Runtime, no torch import); see the export_disease_model command
+DISEASE_BACKEND = getattr(settings, 'DISEASE_BACKEND', 'eager')
+DISEASE_TORCHSCRIPT_MODEL_PATH = str(getattr(settings, 'DISEASE_TORCHSCRIPT_MODEL_PATH', settings.BASE_DIR / 'models' / 'plant_disease_model.torchscript.pt'))
+DISEASE_ONNX_MODEL_PATH = str(getattr(settings, 'DISEASE_ONNX_MODEL_PATH', settings.BASE_DIR / 'models' / 'plant_disease_model.onnx'))
+
+# Decode large JPEGs at reduced scale (draft mode) before resizing. Off
+# (the default) reproduces the training-time torchvision preprocessing exactly.
+FAST_IMAGE_DECODE = getattr(settings, 'FAST_IMAGE_DECODE', False)
+
+# Disease image uploads: size limits enforced while the upload streams in,
+# and the number of images decoded at once per worker process
+MAX_UPLOAD_BYTES = getattr(settings, 'MAX_UPLOAD_BYTES', 10 * 1024 * 1024)
+MAX_IMAGE_PIXELS = getattr(settings, 'MAX_IMAGE_PIXELS', 40000000)
+MAX_CONCURRENT_DECODES = getattr(settings, 'MAX_CONCURRENT_DECODES', 2)
+
+# Cache of disease predictions keyed by the SHA-256 of the image (and, with
+# PREDICTION_CACHE_PERCEPTUAL, a dHash of it), stored in this Django cache
+PREDICTION_CACHE = getattr(settings, 'PREDICTION_CACHE', True)
+PREDICTION_CACHE_ALIAS = getattr(settings, 'PREDICTION_CACHE_ALIAS', 'predictions')
+PREDICTION_CACHE_PERCEPTUAL = getattr(settings, 'PREDICTION_CACHE_PERCEPTUAL', False)
+
+# Django cache holding the rendered result pages, shared by the app servers
+FRAGMENT_CACHE_ALIAS = getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'fragments')
+
+# Cache-Control max-age of the pre-rendered result pages and advice texts
+RESULT_PAGE_MAX_AGE = getattr(settings, 'RESULT_PAGE_MAX_AGE', 24 * 3600)
+
+# Prediction history (Prediction model), written behind the request in
+# bulk_create batches by eagroapp.history.PredictionRecorder
+PREDICTION_HISTORY = getattr(settings, 'PREDICTION_HISTORY', True)
+PREDICTION_HISTORY_BATCH_SIZE = getattr(settings, 'PREDICTION_HISTORY_BATCH_SIZE', 100)
+PREDICTION_HISTORY_FLUSH_INTERVAL = getattr(settings, 'PREDICTION_HISTORY_FLUSH_INTERVAL', 2.0)
+PREDICTION_HISTORY_MAX_PENDING = getattr(settings, 'PREDICTION_HISTORY_MAX_PENDING', 10000)
+
+# Run disease inference in a pool of spawned processes (0 = in the web worker)
+DISEASE_PROCESS_POOL_SIZE = getattr(settings, 'DISEASE_PROCESS_POOL_SIZE', 0)
+DISEASE_PROCESS_POOL_THREADS = getattr(settings, 'DISEASE_PROCESS_POOL_THREADS', 1)
+DISEASE_PROCESS_POOL_TIMEOUT = getattr(settings, 'DISEASE_PROCESS_POOL_TIMEOUT', 30)
+
+# Latency histograms (eagroapp.metrics) and the /metrics endpoint
+METRICS = getattr(settings, 'METRICS', False)
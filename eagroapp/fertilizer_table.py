@@ -0,0 +1,105 @@
+"""
+In-memory, crop-keyed view of Data/fertilizer.csv.
+
+The CSV is parsed once into a dict of crop -> (N, P, K). The file's
+mtime is re-checked at most every ``check_interval`` seconds so edits
+are picked up without restarting the workers.
+"""
+import csv
+import os
+import threading
+import time
+
+
+def _number(value):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+class FertilizerTable:
+    """
+    Crop -> recommended (N, P, K) lookup with mtime-based hot reload
+    :params: path, check_interval (seconds between mtime checks)
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._rows = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        rows = {}
+        with open(self.path, newline='') as f:
+            for row in csv.DictReader(f):
+                rows[row['Crop'].strip()] = (
+                    _number(row['N']), _number(row['P']), _number(row['K']))
+        return rows
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            if self._mtime is not None and now - self._checked < self.check_interval:
+                return
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                self._rows, self._mtime = {}, None
+                return
+            if mtime != self._mtime:
+                self._rows = self._load()
+                self._mtime = mtime
+            self._checked = now
+
+    @property
+    def available(self):
+        self._refresh()
+        return self._mtime is not None
+
+    def get(self, crop_name):
+        """
+        Recommended nutrient levels for a crop
+        :params: crop_name
+        :return: (N, P, K) or None for an unknown crop
+        """
+        self._refresh()
+        return self._rows.get(crop_name)
+
+    def crops(self):
+        self._refresh()
+        return list(self._rows)
+
+
+def recommendation_key(recommended, N, P, K):
+    """
+    Picks the fertilizer_dic entry for the nutrient that deviates most
+    from the crop's recommended level
+    :params: recommended (N, P, K), N, P, K
+    :return: key into fertilizer_dic
+    """
+    nr, pr, kr = recommended
+    n = nr - N
+    p = pr - P
+    k = kr - K
+    temp = {abs(n): "N", abs(p): "P", abs(k): "K"}
+    max_value = temp[max(temp.keys())]
+    if max_value == "N":
+        if n < 0:
+            key = 'NHigh'
+        else:
+            key = "Nlow"
+    elif max_value == "P":
+        if p < 0:
+            key = 'PHigh'
+        else:
+            key = "Plow"
+    else:
+        if k < 0:
+            key = 'KHigh'
+        else:
+            key = "Klow"
+    return key
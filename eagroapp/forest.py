@@ -0,0 +1,266 @@
+"""
+Flat, array-based evaluator for the crop recommendation RandomForest.
+
+sklearn's predict() validates its input and dispatches every tree through
+joblib, which costs far more than the 1 x 7 row of a crop prediction. At
+load time the fitted forest is copied into a few contiguous arrays that
+hold the nodes of every tree: split feature, threshold, child indices and
+normalised leaf class frequencies. Leaves point back at themselves, so all
+trees can be walked in lock step for max_depth steps without checking
+which of them have finished.
+
+The nodes are numbered by split feature and then threshold, so the
+splits that send a single row right are one run of nodes per feature,
+found with a binary search. Walking all trees is then two gathers per
+level, and stops once every tree has reached its leaf. For a few rows,
+every split of the forest is evaluated with one comparison, which gives
+each node its successor. Larger batches compare only the node each tree
+has reached, level by level, and large ones are handed to sklearn itself.
+
+Probabilities are summed tree by tree in estimator order, as sklearn does,
+and inputs are rounded to float32 before comparing them with the float64
+thresholds, as sklearn's trees do. The outputs are therefore identical,
+not merely close. Inputs sklearn rejects (infinities, values beyond the
+float32 range, and NaN for forests without missing-value support) raise
+the same ValueError.
+"""
+import numpy as np
+import sklearn
+
+# sklearn < 1.4 stores class counts in the leaves and normalises them in
+# predict_proba; later versions store the fractions and return them as is
+NORMALIZE_LEAVES = tuple(int(part) for part in sklearn.__version__.split('.')[:2]) < (1, 4)
+
+# Largest rows x nodes product for which every split is evaluated up front
+DENSE_LIMIT = 1 << 16
+# Levels walked by a single row between checks that all trees are done
+LEAF_CHECK_INTERVAL = 8
+# Larger batches go to sklearn, whose compiled traversal wins once its
+# per-call overhead is spread over enough rows
+SKLEARN_MIN_ROWS = 512
+
+
+def allows_nan(estimator):
+    """Whether sklearn lets NaN through to the estimator's trees"""
+    try:
+        return estimator.__sklearn_tags__().input_tags.allow_nan
+    except AttributeError:
+        # sklearn < 1.6
+        return bool(getattr(estimator, '_get_tags', dict)().get('allow_nan', False))
+
+
+class FlatForest:
+    """
+    Drop-in replacement for a fitted RandomForestClassifier's predict and
+    predict_proba
+    :params: forest (fitted sklearn forest of decision tree classifiers)
+    """
+
+    def __init__(self, forest):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError('Only single-output forests can be flattened')
+        self.forest = forest
+        self.classes_ = forest.classes_
+        self.n_features_in_ = forest.n_features_in_
+        self.n_estimators = len(trees)
+        self.max_depth = max(tree.max_depth for tree in trees)
+        self.allow_nan = allows_nan(forest.estimators_[0])
+
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        n_nodes = offsets[-1]
+        feature = np.zeros(n_nodes, dtype=np.intp)
+        threshold = np.zeros(n_nodes, dtype=np.float64)
+        children = np.empty((n_nodes, 2), dtype=np.intp)
+        missing_left = np.zeros(n_nodes, dtype=bool)
+        leaf = np.zeros(n_nodes, dtype=bool)
+        value = np.zeros((n_nodes, len(self.classes_)), dtype=np.float64)
+        for tree, start in zip(trees, offsets[:-1]):
+            nodes = slice(start, start + tree.node_count)
+            own = np.arange(start, start + tree.node_count)
+            leaf[nodes] = tree.children_left == -1
+            feature[nodes] = np.where(leaf[nodes], 0, tree.feature)
+            threshold[nodes] = np.where(leaf[nodes], 0.0, tree.threshold)
+            children[nodes, 0] = np.where(leaf[nodes], own, tree.children_left + start)
+            children[nodes, 1] = np.where(leaf[nodes], own, tree.children_right + start)
+            if hasattr(tree, 'missing_go_to_left'):
+                missing_left[nodes] = tree.missing_go_to_left.astype(bool)
+            leaf_value = tree.value[:, 0, :len(self.classes_)]
+            if NORMALIZE_LEAVES:
+                # Same normalisation as DecisionTreeClassifier.predict_proba
+                normalizer = leaf_value.sum(axis=1)
+                normalizer[normalizer == 0.0] = 1.0
+                leaf_value = leaf_value / normalizer[:, np.newaxis]
+            value[nodes] = leaf_value
+
+        # Renumber the nodes of the whole forest by split feature, then
+        # threshold, with the leaves last. The splits a row sends right are
+        # then one run of nodes per feature, starting at the run's first node.
+        run_feature = np.where(leaf, self.n_features_in_, feature)
+        order = np.lexsort((threshold, run_feature))
+        renumbered = np.empty(n_nodes, dtype=np.intp)
+        renumbered[order] = np.arange(n_nodes)
+        feature, threshold, missing_left, value = feature[order], threshold[order], missing_left[order], value[order]
+        children = renumbered.take(children[order])
+        roots = renumbered.take(offsets[:-1])
+        self._runs = np.searchsorted(run_feature[order], np.arange(self.n_features_in_ + 1)).tolist()
+        self._run_thresholds = [threshold[start:end] for start, end in zip(self._runs, self._runs[1:])]
+
+        # Per node, for evaluating every split of a few rows at once
+        self._node_feature = feature
+        self._node_threshold = threshold
+        self._node_missing_left = missing_left
+        self._node_children = children.ravel()
+        self._even = 2 * np.arange(n_nodes)
+        self._node_roots = roots
+        # Per slot (node n at 2n), for walking the trees level by level:
+        # children[2n + (x > threshold)] is the slot of the next node
+        self._feature = np.repeat(feature, 2)
+        self._threshold = np.repeat(threshold, 2)
+        self._missing_left = np.repeat(missing_left, 2)
+        self._children = 2 * children.ravel()
+        self._roots = 2 * roots
+        self._value = value
+        self.n_nodes = int(n_nodes)
+
+    def _rows(self, X):
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'Expected rows of {self.n_features_in_} features, got shape {X.shape}')
+        # sklearn's trees compare float32 inputs with float64 thresholds
+        with np.errstate(over='ignore'):
+            X = X.astype(np.float32)
+        if np.isinf(X).any():
+            raise ValueError("Input X contains infinity or a value too large for dtype('float32').")
+        if not self.allow_nan and np.isnan(X).any():
+            raise ValueError('Input X contains NaN.')
+        return X.astype(np.float64)
+
+    def _leaves(self, X):
+        """
+        :params: X (n_rows x n_features)
+        :return: n_trees x n_rows array of leaf node indices
+        """
+        X = self._rows(X)
+        if X.shape[0] == 1:
+            return self._leaves_single(X[0])
+        if X.shape[0] * self.n_nodes <= DENSE_LIMIT:
+            return self._leaves_dense(X)
+        return self._leaves_by_level(X)
+
+    def _leaves_single(self, x):
+        # One bit per slot: whether the node sends x right. For each
+        # feature that is the run of nodes whose threshold is below x.
+        right = np.zeros(2 * self.n_nodes, dtype=bool)
+        for j, value in enumerate(x.tolist()):
+            start, end = 2 * self._runs[j], 2 * self._runs[j + 1]
+            if value != value:
+                right[start:end] = ~self._missing_left[start:end]
+            else:
+                right[start:start + 2 * int(self._run_thresholds[j].searchsorted(value))] = True
+        # Each tree moves down one level per step, with two gathers
+        slots = self._roots + right.take(self._roots)
+        for level in range(1, self.max_depth + 1):
+            previous = slots
+            slots = self._children.take(slots)
+            slots += right.take(slots)
+            if level % LEAF_CHECK_INTERVAL == 0 and not (slots != previous).any():
+                # Every tree has reached its leaf
+                break
+        return (slots >> 1)[:, np.newaxis]
+
+    def _leaves_dense(self, X):
+        n_rows = X.shape[0]
+        x = X[:, self._node_feature]
+        right = x > self._node_threshold
+        if np.isnan(x).any():
+            right = np.where(np.isnan(x), ~self._node_missing_left, right)
+        # Successor of every node for these rows, offset so each row walks
+        # its own copy of the forest
+        successor = self._node_children.take(self._even + right)
+        if n_rows > 1:
+            offsets = np.arange(n_rows) * self.n_nodes
+            successor += offsets[:, np.newaxis]
+            nodes = self._node_roots[:, np.newaxis] + offsets
+        else:
+            nodes = self._node_roots[:, np.newaxis]
+        successor = successor.ravel()
+        for _ in range(self.max_depth):
+            nodes = successor.take(nodes)
+        return nodes - offsets if n_rows > 1 else nodes
+
+    def _leaves_by_level(self, X):
+        flat = X.ravel()
+        n_rows = X.shape[0]
+        slots = np.broadcast_to(self._roots, (n_rows, self.n_estimators)).T.copy()
+        base = np.arange(n_rows) * self.n_features_in_
+        feature, threshold, children = self._feature, self._threshold, self._children
+        missing = np.isnan(flat).any()
+        for _ in range(self.max_depth):
+            x = flat.take(feature.take(slots) + base)
+            right = x > threshold.take(slots)
+            if missing:
+                right = np.where(np.isnan(x), ~self._missing_left.take(slots), right)
+            slots = children.take(slots + right)
+        return slots >> 1
+
+    def predict_proba(self, X):
+        """
+        :params: X (n_rows x n_features)
+        :return: n_rows x n_classes probabilities, equal to sklearn's
+        """
+        if len(X) >= SKLEARN_MIN_ROWS:
+            return self.forest.predict_proba(X)
+        leaves = self._value.take(self._leaves(X), axis=0)
+        # Reducing over the leading axis adds the trees one after another,
+        # in the order sklearn accumulates them
+        proba = leaves.sum(axis=0)
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        """
+        :params: X (n_rows x n_features)
+        :return: predicted class labels
+        """
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+
+
+def sample_rows(forest, count=256, seed=0):
+    """
+    Deterministic rows spread over the range of every split threshold
+    :params: forest, count, seed
+    :return: count x n_features array
+    """
+    rng = np.random.default_rng(seed)
+    low = np.full(forest.n_features_in_, np.inf)
+    high = np.full(forest.n_features_in_, -np.inf)
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        split = (tree.children_left != -1) & np.isfinite(tree.threshold)
+        np.minimum.at(low, tree.feature[split], tree.threshold[split])
+        np.maximum.at(high, tree.feature[split], tree.threshold[split])
+    unused = low > high
+    low[unused], high[unused] = 0.0, 0.0
+    return rng.uniform(low - 1.0, high + 1.0, size=(count, forest.n_features_in_))
+
+
+def flatten(forest, check=True):
+    """
+    Flattens a fitted forest and checks it against sklearn
+    :params: forest, check (compare outputs on sample_rows(), as a batch
+             and row by row)
+    :return: FlatForest
+    :raises: ValueError when the forest cannot be flattened or its outputs differ
+    """
+    if not hasattr(forest, 'estimators_') or not hasattr(forest, 'predict_proba'):
+        raise ValueError(f'{type(forest).__name__} is not a fitted forest classifier')
+    flat = FlatForest(forest)
+    if check:
+        rows = sample_rows(forest)
+        expected = forest.predict_proba(rows)
+        same = np.array_equal(flat.predict_proba(rows), expected) and all(
+            np.array_equal(flat.predict_proba(rows[i:i + 1]), expected[i:i + 1]) for i in range(8))
+        if not same:
+            raise ValueError('Flattened forest does not reproduce the sklearn probabilities')
+    return flat
@@ -0,0 +1,144 @@
+"""
+Pre-rendered disease and fertilizer result pages.
+
+The result pages only depend on the predicted class (38 disease classes,
+6 fertilizer recommendations), so each one is rendered once and then
+served as stored bytes. Rendered pages are kept in a Django cache that the
+app servers share, under a key version hashed from the templates and
+advice texts, and in the memory of each process once read. Every page
+also gets a strong ETag. The advice texts of the JSON API are kept the
+same way. Repeated views are then answered with 304 Not Modified from the
+ETag alone.
+"""
+import hashlib
+import json
+import threading
+from collections import namedtuple
+
+from django.core.cache import caches
+from django.http import Http404, HttpResponse
+from django.template.loader import get_template, render_to_string
+from django.utils.cache import patch_cache_control
+from markupsafe import Markup
+
+from . import config
+from .caching import cache_call
+from .disease import disease_dic
+from .fertilizer import fertilizer_dic
+from .metrics import stage
+
+Fragment = namedtuple('Fragment', 'content content_type etag')
+
+# kind -> (advice texts, result template, template variable)
+KINDS = {
+    'disease': (disease_dic, 'disease-result.html', 'prediction'),
+    'fertilizer': (fertilizer_dic, 'fertilizer-result.html', 'recommendation'),
+}
+
+
+def make_fragment(content, content_type):
+    content = content.encode()
+    return Fragment(content, content_type, f'"{hashlib.sha256(content).hexdigest()[:32]}"')
+
+
+class ResultPages:
+    """
+    Rendered result pages ('html') and JSON advice texts ('json'), built
+    once per class
+    :params: alias (Django cache shared with the other app servers)
+    """
+
+    def __init__(self, alias='fragments'):
+        self.alias = alias
+        self._fragments = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version(self):
+        """
+        Key version of the cached fragments, hashed from the result
+        templates and advice texts, so a release that changes them never
+        serves pages rendered by an older one
+        :return: int
+        """
+        if self._version is None:
+            digest = hashlib.sha256()
+            for kind, (texts, template, variable) in sorted(KINDS.items()):
+                digest.update(get_template(template).template.source.encode())
+                for key in sorted(texts):
+                    digest.update(f'{kind}\0{key}\0{texts[key]}\0'.encode())
+            self._version = int(digest.hexdigest()[:12], 16)
+        return self._version
+
+    def key(self, kind, key, format):
+        # Disease labels hold spaces and brackets, which memcached keys cannot
+        return f'fragment:{kind}:{format}:{hashlib.sha256(key.encode()).hexdigest()[:32]}'
+
+    def get(self, kind, key, format='html'):
+        """
+        :params: kind ('disease' or 'fertilizer'), key (class label or
+                 fertilizer key), format ('html' or 'json')
+        :return: Fragment, or None for an unknown key
+        """
+        try:
+            return self._fragments[kind, key, format]
+        except KeyError:
+            pass
+        texts, template, variable = KINDS[kind]
+        if key not in texts:
+            return None
+        with self._lock:
+            if (kind, key, format) not in self._fragments:
+                cache_key, version = self.key(kind, key, format), self.version()
+                fragment = cache_call(self.cache.get, cache_key, version=version)
+                if fragment is None:
+                    with stage('render'):
+                        fragment = self._render(kind, key, format)
+                    cache_call(self.cache.set, cache_key, fragment, version=version)
+                self._fragments[kind, key, format] = fragment
+            return self._fragments[kind, key, format]
+
+    def _render(self, kind, key, format):
+        texts, template, variable = KINDS[kind]
+        if format == 'json':
+            name = 'label' if kind == 'disease' else 'key'
+            return make_fragment(json.dumps({name: key, 'html': str(texts[key])}), 'application/json')
+        html = render_to_string(template, {variable: Markup(str(texts[key]))})
+        return make_fragment(html, 'text/html; charset=utf-8')
+
+    def render_all(self):
+        """Builds every fragment up front, e.g. before forking workers"""
+        for kind, (texts, template, variable) in KINDS.items():
+            for key in texts:
+                for format in ('html', 'json'):
+                    self.get(kind, key, format)
+
+    def etag(self, kind, key, format='html'):
+        fragment = self.get(kind, key, format)
+        return fragment.etag if fragment is not None else None
+
+    def response(self, kind, key, format='html', public=True):
+        """
+        The stored fragment as a response with ETag and Cache-Control
+        :params: kind, key, format, public (False for the answer to a POST:
+                 it reflects one user's upload or form and must not be
+                 stored by shared caches or replayed by the browser)
+        :raises: Http404 for an unknown key
+        """
+        fragment = self.get(kind, key, format)
+        if fragment is None:
+            raise Http404(f'Unknown {kind} result')
+        response = HttpResponse(fragment.content, content_type=fragment.content_type)
+        response['ETag'] = fragment.etag
+        if public:
+            patch_cache_control(response, public=True, max_age=config.RESULT_PAGE_MAX_AGE)
+        else:
+            patch_cache_control(response, private=True, no_store=True)
+        return response
+
+
+result_pages = ResultPages(config.FRAGMENT_CACHE_ALIAS)
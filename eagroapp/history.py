@@ -0,0 +1,146 @@
+"""
+Write-behind log of predictions.
+
+Views hand each prediction to PredictionRecorder.record(), which only
+appends it to an in-memory buffer. A background thread writes the buffer
+to the Prediction table with bulk_create, either when batch_size rows are
+waiting or after flush_interval seconds. A batch the database rejects is
+retried row by row, so one bad row does not lose the others. The buffer
+is bounded: when the database falls behind, new rows are dropped and
+counted rather than held in memory. Pending rows are flushed when the
+process exits.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import DatabaseError, close_old_connections
+
+
+class PredictionRecorder:
+    """
+    :params: batch_size (rows per bulk insert), flush_interval (seconds),
+             max_pending (rows buffered before new ones are dropped)
+    """
+
+    def __init__(self, batch_size=100, flush_interval=2.0, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        atexit.register(self.close)
+
+    def record(self, kind, inputs, output, latency_ms, user_id=None):
+        """
+        Queues one prediction without touching the database
+        :params: kind ('crop', 'disease' or 'fertilizer'), inputs (JSON-able
+                 dict), output, latency_ms, user_id (None when anonymous)
+        :return: False when the buffer is full and the row was dropped
+        """
+        from .models import Prediction
+        row = Prediction(kind=kind, inputs=inputs, output=str(output)[:100],
+                         latency_ms=latency_ms, user_id=user_id)
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self._stats['dropped'] += 1
+                return False
+            self._pending.append(row)
+            self._stats['recorded'] += 1
+            self._ensure_thread()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _ensure_thread(self):
+        # Threads do not survive fork, so every worker starts its own
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='prediction-recorder', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """
+        Writes every pending row now
+        :return: number of rows written
+        """
+        from .models import Prediction
+        written = 0
+        with self._flush_lock:
+            # Drop connections that timed out while the thread was idle
+            close_old_connections()
+            while True:
+                with self._cond:
+                    batch = [self._pending.popleft()
+                             for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    break
+                try:
+                    Prediction.objects.bulk_create(batch)
+                    saved = len(batch)
+                except DatabaseError:
+                    saved = self._write_each(batch)
+                written += saved
+                with self._cond:
+                    self._stats['written'] += saved
+                    self._stats['failed'] += len(batch) - saved
+                    self._stats['batches'] += 1
+                if not saved:
+                    # Nothing goes through, e.g. the database is down
+                    break
+        return written
+
+    def _write_each(self, batch):
+        """
+        Inserts the rows of a rejected batch one at a time
+        :return: number of rows written
+        """
+        from .models import Prediction
+        saved, error = 0, None
+        for row in batch:
+            try:
+                Prediction.objects.bulk_create([row])
+                saved += 1
+            except DatabaseError as e:
+                error = e
+        if error is not None:
+            print(f"Warning: Could not write {len(batch) - saved} of {len(batch)} prediction log rows: {error}")
+        return saved
+
+    def close(self):
+        """Stops the background thread and flushes what is left"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=10)
+        self.flush()
+
+    def pending(self):
+        return len(self._pending)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending))
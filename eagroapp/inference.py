@@ -0,0 +1,231 @@
+"""
+Preprocessing and forward-pass helpers for the plant disease model.
+
+Images are resized and scaled with PIL and NumPy, reproducing
+torchvision's Resize(256) + ToTensor() without importing torch, so the
+ONNX Runtime backend can serve predictions from torch-free workers.
+Large JPEGs are decoded directly at a reduced scale and the float input
+is produced in a single pass over the pixels.
+PyTorch models run under torch.inference_mode(), and 256x256 inputs are
+copied into reusable per-thread buffers instead of allocating a new
+batch per call.
+"""
+import io
+import os
+import threading
+import warnings
+
+import numpy as np
+from PIL import Image
+
+from . import config
+from .metrics import stage
+from .models import TORCH_AVAILABLE
+
+# Side of the square images the ResNet9 model was trained on
+INPUT_SIZE = 256
+
+# File suffixes of the images read from folders (calibration, bulk runs)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+_buffers = threading.local()
+
+# Decodes running at once in this process; each one holds at most one
+# decoded image of up to MAX_IMAGE_PIXELS
+_decode_slots = threading.BoundedSemaphore(config.MAX_CONCURRENT_DECODES)
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def configure_threads(num_threads=None):
+    """
+    Caps the intra-op thread pool of this process
+    :params: num_threads (None splits the cores across WEB_CONCURRENCY workers)
+    :return: the thread count in use, or None without PyTorch
+    """
+    if not TORCH_AVAILABLE:
+        return None
+    import torch
+    torch.set_num_threads(default_threads(num_threads))
+    return torch.get_num_threads()
+
+
+def default_threads(num_threads=None):
+    if num_threads:
+        return int(num_threads)
+    workers = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def target_size(size, short_side=INPUT_SIZE):
+    """
+    Output size of torchvision's Resize(short_side): the shorter side is
+    scaled to short_side and the longer one keeps the aspect ratio
+    :params: size (width, height), short_side
+    :return: (width, height)
+    """
+    w, h = size
+    short, long = (w, h) if w <= h else (h, w)
+    if short == short_side:
+        return size
+    new_short, new_long = short_side, int(short_side * long / short)
+    return (new_short, new_long) if w <= h else (new_long, new_short)
+
+
+def open_image(img):
+    """
+    Opens an image without decoding its pixels
+    :params: img (bytes or binary file object, e.g. an uploaded file)
+    :return: PIL image
+    """
+    if isinstance(img, (bytes, bytearray, memoryview)):
+        img = io.BytesIO(img)
+    with warnings.catch_warnings():
+        # MAX_IMAGE_PIXELS below is the limit that applies
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        image = Image.open(img)
+    if image.width * image.height > config.MAX_IMAGE_PIXELS:
+        # Checked from the header, before any pixel is decoded
+        raise ImageTooLarge(f'{image.width}x{image.height} image exceeds '
+                            f'the {config.MAX_IMAGE_PIXELS} pixel limit')
+    return image
+
+
+def load_image(img, fast=None):
+    """
+    Decodes an image into an RGB image whose shorter side is 256
+    :params: img (bytes or binary file object), fast (decode-time
+             downscaling, default from the FAST_IMAGE_DECODE setting)
+    :return: PIL image
+    """
+    if fast is None:
+        fast = config.FAST_IMAGE_DECODE
+    image = open_image(img)
+    new_size = target_size(image.size)
+    if fast and image.format == 'JPEG' and new_size != image.size:
+        # Let libjpeg decode straight at 1/2, 1/4 or 1/8 scale, never below
+        # the target size, instead of materialising every pixel of a
+        # 12 MP phone photo.
+        image.draft('RGB', new_size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != new_size:
+        # reducing_gap lets PIL shrink by an integer factor first (PNG and
+        # other formats without draft support)
+        image = image.resize(new_size, Image.BILINEAR, reducing_gap=3.0 if fast else None)
+    return image
+
+
+def preprocess_array(img, fast=None):
+    """
+    Decodes an image into a C x H x W float32 array scaled to [0, 1]
+    :params: img (bytes or binary file object), fast
+    :return: numpy array
+    """
+    with _decode_slots, stage('decode'):
+        pixels = np.asarray(load_image(img, fast))
+    with stage('transform'):
+        # One pass: read the H x W x C bytes through a transposed view and
+        # write the scaled floats straight into the C x H x W result.
+        return np.divide(pixels.transpose(2, 0, 1), 255, dtype=np.float32)
+
+
+def load_thumbnail(img, size):
+    """
+    Decodes a small grayscale copy of an image, e.g. for perceptual hashing
+    :params: img (bytes or binary file object), size (width, height)
+    :return: PIL image
+    """
+    with _decode_slots:
+        image = open_image(img)
+        if image.format == 'JPEG':
+            image.draft('L', (size[0] * 8, size[1] * 8))
+        return image.convert('L').resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+
+def preprocess(img, fast=None):
+    """
+    Decodes an image into a C x H x W float tensor
+    :params: img (bytes or binary file object), fast
+    :return: tensor sharing memory with the preprocessed array
+    """
+    import torch
+    return torch.from_numpy(preprocess_array(img, fast))
+
+
+def prepare(img, model):
+    """
+    Preprocesses an image into the input type the model consumes
+    :params: img (bytes or binary file object), model (torch module or
+             NumPy backend)
+    :return: tensor or numpy array
+    """
+    if getattr(model, 'numpy_io', False):
+        return preprocess_array(img)
+    return preprocess(img)
+
+
+def input_buffer(batch_size, numpy=False):
+    """
+    Reusable N x 3 x 256 x 256 input batch for the calling thread
+    :params: batch_size, numpy (array instead of tensor)
+    :return: view of exactly batch_size rows
+    """
+    name = 'array' if numpy else 'tensor'
+    buf = getattr(_buffers, name, None)
+    if buf is None or buf.shape[0] < batch_size:
+        shape = (batch_size, 3, INPUT_SIZE, INPUT_SIZE)
+        if numpy:
+            buf = np.empty(shape, dtype=np.float32)
+        else:
+            import torch
+            with torch.inference_mode():
+                buf = torch.empty(shape)
+        setattr(_buffers, name, buf)
+    return buf[:batch_size]
+
+
+def stack(items):
+    """
+    Stacks C x H x W tensors (or arrays) into one batch, reusing the
+    thread's preallocated buffer when they have the standard input shape
+    :params: items
+    :return: tensor or numpy array
+    """
+    standard = tuple(items[0].shape) == (3, INPUT_SIZE, INPUT_SIZE)
+    if isinstance(items[0], np.ndarray):
+        if standard:
+            return np.stack(items, out=input_buffer(len(items), numpy=True))
+        return np.stack(items)
+
+    import torch
+    with torch.inference_mode():
+        if standard:
+            return torch.stack(items, out=input_buffer(len(items)))
+        return torch.stack(items)
+
+
+def forward(model, batch):
+    """
+    Runs the model without autograd bookkeeping
+    :params: model, batch (N x C x H x W tensor or array)
+    :return: N x num_classes scores of the same type
+    """
+    if isinstance(batch, np.ndarray):
+        return model(batch)
+    import torch
+    with torch.inference_mode():
+        return model(batch)
+
+
+def softmax(scores):
+    """
+    Class probabilities from one row of model scores
+    :params: scores (tensor or array)
+    :return: float32 numpy array
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    exp = np.exp(scores - scores.max())
+    return exp / exp.sum()
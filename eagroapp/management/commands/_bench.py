@@ -0,0 +1,42 @@
+"""
+Shared helpers for the benchmark management commands.
+"""
+import numpy as np
+
+from eagroapp.benchdata import soil_rows
+
+
+def disease_model_or_random():
+    """
+    The trained disease model when present, otherwise a randomly
+    initialised ResNet9 with the same shape
+    :return: (model, is_trained)
+    """
+    from eagroapp.disease import disease_classes
+    from eagroapp.models import ResNet9
+    from eagroapp.registry import registry
+    model = registry.get('disease')
+    if model is not None:
+        return model, True
+    model = ResNet9(3, len(disease_classes))
+    model.eval()
+    return model, False
+
+
+def crop_model_or_standin():
+    """
+    The trained crop recommendation model when present, otherwise a small
+    RandomForest fitted on deterministic synthetic soil rows
+    :return: (model, is_trained)
+    """
+    from eagroapp.registry import registry
+    model = registry.get('crop')
+    if model is not None:
+        return model, True
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(0)
+    features = soil_rows(2000, seed=0)
+    crops = np.array(['rice', 'maize', 'chickpea', 'cotton', 'jute', 'coffee'])
+    labels = crops[rng.integers(0, len(crops), len(features))]
+    model = RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0)
+    return model.fit(features, labels), False
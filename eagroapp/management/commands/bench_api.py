@@ -0,0 +1,88 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from eagroapp import views
+from eagroapp.benchdata import format_timing, percentiles, synthetic_jpeg
+from eagroapp.benchmarks import local_caches
+from eagroapp.registry import registry
+from eagroapp.testing import StubWeatherServer
+from ._bench import crop_model_or_standin, disease_model_or_random
+
+
+class Command(BaseCommand):
+    help = 'Compares throughput and response size of the HTML views and the JSON API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--images', type=int, default=8,
+                            help='distinct leaf images cycled through by the disease requests')
+
+    def endpoints(self, images):
+        crop_form = {'nitrogen': '90', 'phosphorous': '42', 'pottasium': '43',
+                     'ph': '6.5', 'rainfall': '202.9', 'city': 'Pune'}
+        crop_json = {'N': 90, 'P': 42, 'K': 43, 'ph': 6.5, 'rainfall': 202.9, 'city': 'Pune'}
+        fert_form = {'cropname': 'Rice', 'nitrogen': '50', 'phosphorous': '40', 'pottasium': '40'}
+        fert_json = {'crop': 'Rice', 'N': 50, 'P': 40, 'K': 40}
+
+        def upload(i):
+            f = io.BytesIO(images[i % len(images)])
+            f.name = 'leaf.jpg'
+            return {'file': f}
+
+        return [
+            ('crop', 'html', lambda c, i: c.post('/crop-recommendation/', crop_form)),
+            ('crop', 'json', lambda c, i: c.post('/api/v1/crop/', crop_json, content_type='application/json')),
+            ('fertilizer', 'html', lambda c, i: c.post('/fertilizer-recommendation/', fert_form)),
+            ('fertilizer', 'json', lambda c, i: c.post('/api/v1/fertilizer/', fert_json, content_type='application/json')),
+            ('disease', 'html', lambda c, i: c.post('/Crop-disease-prediction/', upload(i))),
+            ('disease', 'json', lambda c, i: c.post('/api/v1/disease/', upload(i))),
+        ]
+
+    def run(self, call, total, concurrency):
+        samples, sizes, codes = [], [], []
+
+        def one(i):
+            client = Client()
+            started = time.perf_counter()
+            response = call(client, i)
+            samples.append((time.perf_counter() - started) * 1000.0)
+            sizes.append(len(response.content))
+            codes.append(response.status_code)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(total)))
+        return time.perf_counter() - started, samples, sizes, codes
+
+    def handle(self, *args, **options):
+        crop_model, _ = crop_model_or_standin()
+        disease_model, trained = disease_model_or_random()
+        if not trained:
+            self.stdout.write('Disease model file not found, using random weights.')
+        saved = (registry.get('crop'), registry.get('disease'), views.weather_client.url)
+        registry.set('crop', crop_model)
+        registry.set('disease', disease_model)
+        images = [synthetic_jpeg(640, 480, seed=i) for i in range(options['images'])]
+        total, concurrency = options['requests'], options['concurrency']
+        try:
+            with StubWeatherServer() as server, \
+                    override_settings(ALLOWED_HOSTS=['testserver'], CACHES=local_caches()):
+                views.weather_client.url = server.url
+                for name, kind, call in self.endpoints(images):
+                    # Every endpoint starts from the same cold prediction cache
+                    views.prediction_cache.clear()
+                    elapsed, samples, sizes, codes = self.run(call, total, concurrency)
+                    ok = sum(code == 200 for code in codes)
+                    self.stdout.write(
+                        f'{name:<10} {kind:<4} {total / elapsed:8.1f} req/s  ok {ok}/{total}  '
+                        f'{sum(sizes) / len(sizes):8.0f} bytes/response')
+                    self.stdout.write('  ' + format_timing('latency', percentiles(samples)))
+        finally:
+            registry.set('crop', saved[0])
+            registry.set('disease', saved[1])
+            views.weather_client.url = saved[2]
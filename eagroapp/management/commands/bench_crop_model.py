@@ -0,0 +1,42 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from eagroapp import forest
+from eagroapp.benchdata import format_timing, soil_rows, time_calls
+from ._bench import crop_model_or_standin
+
+
+class Command(BaseCommand):
+    help = ('Checks that the flattened crop forest gives the same predictions as '
+            'sklearn and compares their latency for single rows and small batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='rows compared for equality')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=64)
+
+    def handle(self, *args, **options):
+        model, trained = crop_model_or_standin()
+        if not trained:
+            self.stdout.write('Crop model file not found, using a stand-in forest.')
+        # The registry may already hold the flattened model
+        sklearn_model = getattr(model, 'forest', model)
+        flat = forest.flatten(sklearn_model)
+        self.stdout.write(f'{flat.n_estimators} trees, {flat.n_nodes} nodes, max depth {flat.max_depth}')
+
+        rows = np.vstack([soil_rows(options['rows'], seed=7), forest.sample_rows(sklearn_model, 1000)])
+        expected = sklearn_model.predict_proba(rows)
+        actual = np.vstack([flat.predict_proba(rows[i:i + 256]) for i in range(0, len(rows), 256)])
+        if not np.array_equal(actual, expected):
+            raise CommandError(f'Probabilities differ: max abs diff {np.abs(actual - expected).max()}')
+        if not (flat.predict(rows[:1000]) == sklearn_model.predict(rows[:1000])).all():
+            raise CommandError('Predicted classes differ')
+        self.stdout.write(f'{len(rows)} rows: probabilities and classes identical to sklearn')
+
+        single = rows[:1]
+        batch = rows[:options['batch_size']]
+        iterations = options['iterations']
+        for label, predict in (('sklearn', sklearn_model.predict), ('flat', flat.predict)):
+            self.stdout.write(format_timing(f'{label} 1 row', time_calls(lambda: predict(single), iterations)))
+            self.stdout.write(format_timing(f'{label} {len(batch)} rows',
+                                            time_calls(lambda: predict(batch), max(1, iterations // 4))))
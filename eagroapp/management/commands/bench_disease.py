@@ -0,0 +1,52 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eagroapp import inference
+from eagroapp.benchdata import format_timing, synthetic_jpeg, time_calls
+from ._bench import disease_model_or_random
+
+
+class Command(BaseCommand):
+    help = 'Compares per-image disease prediction latency of the legacy and current inference paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=0,
+                            help='torch intra-op threads (0 keeps the configured value)')
+
+    def handle(self, *args, **options):
+        if not inference.TORCH_AVAILABLE:
+            raise CommandError('PyTorch is not installed.')
+        import torch
+        from PIL import Image
+        from torchvision import transforms
+
+        if options['threads']:
+            inference.configure_threads(options['threads'])
+        model, trained = disease_model_or_random()
+        if not trained:
+            self.stdout.write('Disease model file not found, using random weights.')
+        img = synthetic_jpeg(256, 256)
+
+        def legacy():
+            # Mirrors the original predict_image: transform rebuilt per
+            # call and autograd left enabled.
+            transform = transforms.Compose([
+                transforms.Resize(256),
+                transforms.ToTensor(),
+            ])
+            img_u = torch.unsqueeze(transform(Image.open(io.BytesIO(img))), 0)
+            return torch.max(model(img_u), dim=1)
+
+        def current():
+            batch = inference.stack([inference.preprocess(img)])
+            return torch.max(inference.forward(model, batch), dim=1)
+
+        iterations = options['iterations']
+        self.stdout.write(f'torch threads: {torch.get_num_threads()}, iterations: {iterations}')
+        before = time_calls(legacy, iterations)
+        after = time_calls(current, iterations)
+        self.stdout.write(format_timing('legacy', before))
+        self.stdout.write(format_timing('inference_mode', after))
+        self.stdout.write(f"speedup (mean): {before['mean_ms'] / after['mean_ms']:.2f}x")
@@ -0,0 +1,88 @@
+import io
+import multiprocessing
+import resource
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from eagroapp import inference
+from eagroapp.benchdata import format_timing, synthetic_jpeg, time_calls
+
+
+def current_rss_kib():
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() // 1024
+
+
+def peak_worker(func, results):
+    # Runs in a fresh fork so ru_maxrss only grows by what func allocates
+    started = current_rss_kib()
+    func()
+    results.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - started)
+
+
+def peak_memory_mib(func):
+    """
+    Peak RSS growth of one call, measured in a forked child (Linux only)
+    :params: func
+    :return: MiB
+    """
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    process = ctx.Process(target=peak_worker, args=(func, results))
+    process.start()
+    grown = results.get()
+    process.join()
+    return grown / 1024.0
+
+
+def synthetic_png(width, height, seed=0):
+    image = Image.open(io.BytesIO(synthetic_jpeg(width, height, seed)))
+    buf = io.BytesIO()
+    image.save(buf, format='PNG', compress_level=1)
+    return buf.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Compares decode + preprocess time and peak memory of disease uploads with and without decode-time downscaling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--width', type=int, default=4000)
+        parser.add_argument('--height', type=int, default=3000)
+
+    def handle(self, *args, **options):
+        width, height = options['width'], options['height']
+        images = {
+            f'jpeg {width}x{height}': synthetic_jpeg(width, height),
+            f'png {width}x{height}': synthetic_png(width, height),
+        }
+
+        paths = {
+            'exact': lambda img: inference.preprocess_array(img, fast=False),
+            'fast': lambda img: inference.preprocess_array(img, fast=True),
+        }
+        if inference.TORCH_AVAILABLE:
+            from torchvision import transforms
+
+            def legacy(img):
+                # Mirrors the original predict_image preprocessing
+                transform = transforms.Compose([
+                    transforms.Resize(256),
+                    transforms.ToTensor(),
+                ])
+                return transform(Image.open(io.BytesIO(img)))
+
+            paths = {'legacy': legacy, **paths}
+
+        for label, img in images.items():
+            self.stdout.write(f'{label} ({len(img) / 1024 / 1024:.1f} MiB encoded)')
+            for name, func in paths.items():
+                timing = time_calls(lambda: func(img), options['iterations'])
+                peak = peak_memory_mib(lambda: func(img))
+                self.stdout.write(f"  {format_timing(name, timing)}  peak +{peak:7.1f} MiB")
+            exact, fast = paths['exact'](img), paths['fast'](img)
+            self.stdout.write(f'  fast vs exact: shape {tuple(fast.shape)}, '
+                              f'mean abs diff {np.abs(fast - exact).mean():.4f}')
@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from eagroapp import config, views
+from eagroapp.benchdata import format_timing, percentiles, synthetic_jpeg
+from eagroapp.process_pool import InferencePool
+from eagroapp.registry import registry
+
+
+class Command(BaseCommand):
+    help = ('Compares p50/p99 latency of disease predictions and of light page '
+            'requests served alongside them, with in-thread and process-pool inference')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=20.0, help='seconds per mode')
+        parser.add_argument('--disease-threads', type=int, default=4)
+        parser.add_argument('--light-threads', type=int, default=4)
+        parser.add_argument('--pool-size', type=int, default=2)
+        parser.add_argument('--pool-threads', type=int, default=1)
+
+    def run(self, duration, disease_threads, light_threads):
+        images = [synthetic_jpeg(1024, 768, seed=i) for i in range(32)]
+        disease, light, errors = [], [], []
+        stop = time.monotonic() + duration
+        counter = iter(range(10 ** 9))
+        lock = threading.Lock()
+
+        def disease_loop():
+            while time.monotonic() < stop:
+                with lock:
+                    img = images[next(counter) % len(images)]
+                started = time.perf_counter()
+                try:
+                    views.predict_image(img)
+                except Exception as e:
+                    errors.append(e)
+                disease.append((time.perf_counter() - started) * 1000.0)
+
+        def light_loop():
+            client = Client()
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                client.get('/fertilizer-recommendation/Nlow/')
+                light.append((time.perf_counter() - started) * 1000.0)
+
+        with ThreadPoolExecutor(disease_threads + light_threads) as pool:
+            jobs = [pool.submit(disease_loop) for _ in range(disease_threads)]
+            jobs += [pool.submit(light_loop) for _ in range(light_threads)]
+            for job in jobs:
+                job.result()
+        return disease, light, errors
+
+    def report(self, label, disease, light, errors, duration):
+        self.stdout.write(f'{label}: {len(disease) / duration:.1f} predictions/s, '
+                          f'{len(light) / duration:.1f} page views/s, {len(errors)} errors')
+        if disease:
+            self.stdout.write('  ' + format_timing('disease prediction', percentiles(disease)))
+        if light:
+            self.stdout.write('  ' + format_timing('page view', percentiles(light)))
+
+    def handle(self, *args, **options):
+        duration = options['duration']
+        threads = options['disease_threads'], options['light_threads']
+        saved = (config.PREDICTION_CACHE, registry.get('disease_pool'))
+        # Every request runs the model
+        config.PREDICTION_CACHE = False
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                registry.set('disease_pool', None)
+                if registry.get('disease') is None:
+                    self.stderr.write('Disease model file not found.')
+                    return
+                views.predict_image(synthetic_jpeg())
+                self.report('in-thread', *self.run(duration, *threads), duration)
+
+                pool = InferencePool(options['pool_size'], options['pool_threads'],
+                                     slot_bytes=config.MAX_UPLOAD_BYTES)
+                registry.set('disease_pool', pool)
+                # Start the processes and load the model before timing
+                for _ in range(pool.size):
+                    pool.predict(synthetic_jpeg(), timeout=120)
+                self.report(f'process pool ({pool.size} processes)', *self.run(duration, *threads), duration)
+                self.stdout.write(f'pool stats: {pool.stats()}')
+                pool.close()
+        finally:
+            config.PREDICTION_CACHE = saved[0]
+            registry.set('disease_pool', saved[1])
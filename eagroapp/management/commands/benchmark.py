@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eagroapp import benchmarks
+from eagroapp.benchdata import format_timing
+
+
+class Command(BaseCommand):
+    help = ('Times the crop, disease and fertilizer predictions as function calls and '
+            'through the test client, on deterministic inputs with stand-in models and '
+            'a stub weather server. Writes JSON results and optionally fails when they '
+            'regress against a baseline file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', default='-', help="results JSON ('-' for none)")
+        parser.add_argument('--baseline', help='earlier results JSON to compare against')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='allowed slowdown against the baseline (0.25 = 25%%)')
+        parser.add_argument('--metric', choices=benchmarks.METRICS, default='p50_ms')
+        parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                            help='ignore slowdowns smaller than this')
+        parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+        parser.add_argument('--real-models', action='store_true',
+                            help='use the trained models instead of the stand-ins')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        with benchmarks.standin_environment(options['real_models']):
+            suite = [(name, func) for name, func in benchmarks.build_suite()
+                     if options['filter'] in name]
+            if not suite:
+                raise CommandError(f"No benchmark matches {options['filter']!r}")
+            results = benchmarks.run_suite(
+                suite, options['iterations'],
+                progress=lambda name, timing: self.stdout.write(format_timing(f'{name:<36}', timing)))
+            report = {'environment': benchmarks.environment(options['real_models']), 'results': results}
+
+        if options['output'] != '-':
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is None:
+            return
+        regressions = benchmarks.compare(
+            results, baseline, options['threshold'], options['metric'], options['min_delta_ms'])
+        for name, before, after, ratio in regressions:
+            self.stdout.write(f'REGRESSION {name:<36} {before:8.2f} -> {after:8.2f} ms  ({ratio:.2f}x)')
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmark(s) slower than the baseline by more than "
+                               f"{options['threshold']:.0%} ({options['metric']})")
+        self.stdout.write(f"No regressions against {options['baseline']} "
+                          f"(threshold {options['threshold']:.0%}, {options['metric']})")
@@ -0,0 +1,71 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eagroapp import inference
+
+
+class Command(BaseCommand):
+    help = ('Classifies every leaf photo below a directory with the disease model and '
+            'appends path, class and confidence to a CSV or JSONL file. Images already '
+            'in the output are skipped, so an interrupted run can be restarted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--output', default='predictions.csv',
+                            help='.csv or .jsonl file; appended to when it exists')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='default: from the output file extension')
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='decoding processes (default: one per core)')
+        parser.add_argument('--threads', type=int, default=0,
+                            help='PyTorch threads for the forward pass (0: one per core)')
+
+    def handle(self, *args, **options):
+        if not inference.TORCH_AVAILABLE:
+            raise CommandError('PyTorch is not installed.')
+        from eagroapp import bulk_images
+        from eagroapp.registry import registry
+
+        root = options['directory']
+        if not os.path.isdir(root):
+            raise CommandError(f'{root} is not a directory')
+        inference.configure_threads(options['threads'] or os.cpu_count())
+        model = registry.get('disease')
+        if model is None:
+            raise CommandError('Disease detection model is not available.')
+
+        output = options['output']
+        format = bulk_images.output_format(output, options['format'])
+        writer = bulk_images.ResultWriter(output, format)
+        try:
+            paths = bulk_images.relative_paths(root, inference.IMAGE_EXTENSIONS)
+            done = bulk_images.finished_paths(output, format)
+            todo = [path for path in paths if path not in done]
+            self.stderr.write(f'{len(paths)} images, {len(paths) - len(todo)} already in {output}, '
+                              f'{len(todo)} to classify')
+            if not todo:
+                return
+
+            started = time.perf_counter()
+            last_report = [started]
+
+            def progress(count):
+                now = time.perf_counter()
+                if now - last_report[0] >= 10 or count == len(todo):
+                    last_report[0] = now
+                    self.stderr.write(f'  {count}/{len(todo)}  {count / (now - started):.1f} img/s')
+
+            classified, failed = bulk_images.classify_folder(
+                model, root, todo, writer,
+                batch_size=options['batch_size'],
+                num_workers=options['workers'],
+                progress=progress)
+        finally:
+            writer.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'Classified {classified} images in {elapsed:.1f}s '
+                          f'({classified / elapsed:.1f} img/s), {failed} could not be read')
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from eagroapp import config, inference
+from eagroapp.benchdata import format_timing, synthetic_jpeg, time_calls
+from eagroapp.disease import disease_classes
+
+
+class Command(BaseCommand):
+    help = ('Exports plant_disease_model.pth to TorchScript and ONNX, checks both '
+            'against the eager model and benchmarks every backend')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--torchscript', default=config.DISEASE_TORCHSCRIPT_MODEL_PATH)
+        parser.add_argument('--onnx', default=config.DISEASE_ONNX_MODEL_PATH)
+        parser.add_argument('--opset', type=int, default=17)
+        parser.add_argument('--images', type=int, default=16, help='synthetic images for the parity check')
+        parser.add_argument('--tolerance', type=float, default=1e-3,
+                            help='max allowed absolute score difference')
+        parser.add_argument('--iterations', type=int, default=20, help='benchmark iterations')
+
+    def handle(self, *args, **options):
+        if not inference.TORCH_AVAILABLE:
+            raise CommandError('PyTorch is required to export the model.')
+        from eagroapp import backends
+        from eagroapp.models import ResNet9
+        from eagroapp.registry import load_fp32_disease_model
+
+        model = load_fp32_disease_model()
+        if model is None:
+            self.stdout.write('Disease model file not found, exporting random weights.')
+            model = ResNet9(3, len(disease_classes)).eval()
+
+        variants = {'eager': model}
+        backends.export_torchscript(model, options['torchscript'])
+        self.stdout.write(f"TorchScript: {options['torchscript']} "
+                          f"({os.path.getsize(options['torchscript']) / 1e6:.1f} MB)")
+        variants['torchscript'] = backends.load_torchscript(options['torchscript'])
+
+        backends.export_onnx(model, options['onnx'], opset=options['opset'])
+        self.stdout.write(f"ONNX:        {options['onnx']} "
+                          f"({os.path.getsize(options['onnx']) / 1e6:.1f} MB)")
+        if backends.ONNXRUNTIME_AVAILABLE:
+            variants['onnx'] = backends.load_onnx(options['onnx'], config.TORCH_NUM_THREADS)
+        else:
+            self.stdout.write('onnxruntime is not installed, skipping the ONNX checks.')
+
+        # Mixed sizes exercise the dynamic height/width axes
+        images = [synthetic_jpeg(256 + 64 * (i % 3), 256, seed=i) for i in range(options['images'])]
+        failed = self.check_parity(variants, images, options['tolerance'])
+        self.benchmark(variants, images[0], options['iterations'])
+        if failed:
+            raise CommandError(f"Parity check failed for: {', '.join(failed)}")
+
+    def scores(self, model, img):
+        x = inference.stack([inference.prepare(img, model)])
+        result = inference.forward(model, x)[0]
+        return result if isinstance(result, np.ndarray) else result.numpy()
+
+    def check_parity(self, variants, images, tolerance):
+        reference = [self.scores(variants['eager'], img) for img in images]
+        failed = []
+        self.stdout.write(f'\nParity against eager on {len(images)} images:')
+        for name, model in variants.items():
+            if name == 'eager':
+                continue
+            outputs = [self.scores(model, img) for img in images]
+            diff = max(float(np.abs(a - b).max()) for a, b in zip(outputs, reference))
+            agree = sum(int(a.argmax()) == int(b.argmax()) for a, b in zip(outputs, reference))
+            ok = diff <= tolerance and agree == len(images)
+            if not ok:
+                failed.append(name)
+            self.stdout.write(f"  {name:<12} max |diff| {diff:.2e}  top-1 {agree}/{len(images)}  "
+                              f"{'OK' if ok else 'FAIL'}")
+        return failed
+
+    def benchmark(self, variants, img, iterations):
+        self.stdout.write('\nPer-image latency (preprocess + forward):')
+        for name, model in variants.items():
+            timing = time_calls(lambda: self.scores(model, img), iterations)
+            self.stdout.write('  ' + format_timing(name, timing))
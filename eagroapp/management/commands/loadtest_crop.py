@@ -0,0 +1,91 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+from eagroapp import views
+from eagroapp.benchdata import format_timing, percentiles
+from eagroapp.benchmarks import local_caches
+from eagroapp.registry import registry
+from eagroapp.testing import StubWeatherServer
+from ._bench import crop_model_or_standin
+
+
+class Command(BaseCommand):
+    help = ('Compares crop prediction throughput of the WSGI view and the ASGI '
+            'view against a local mock weather server')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='WSGI threads / in-flight ASGI requests')
+        parser.add_argument('--cities', type=int, default=400,
+                            help='distinct cities, so most lookups miss the cache')
+        parser.add_argument('--latency-ms', type=float, default=100,
+                            help='response delay of the mock weather server')
+
+    def form(self, i, cities):
+        return {'nitrogen': '90', 'phosphorous': '42', 'pottasium': '43',
+                'ph': '6.5', 'rainfall': '202.9', 'city': f'city-{i % cities}'}
+
+    def run_wsgi(self, total, concurrency, cities):
+        samples = []
+
+        def one(i):
+            started = time.perf_counter()
+            response = Client().post('/crop-recommendation/', self.form(i, cities))
+            samples.append((time.perf_counter() - started) * 1000.0)
+            return response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            codes = list(pool.map(one, range(total)))
+        return time.perf_counter() - started, samples, codes
+
+    def run_asgi(self, total, concurrency, cities):
+        samples = []
+
+        async def main():
+            client = AsyncClient()
+            gate = asyncio.Semaphore(concurrency)
+
+            async def one(i):
+                async with gate:
+                    started = time.perf_counter()
+                    response = await client.post('/crop-recommendation/async/', self.form(i, cities))
+                    samples.append((time.perf_counter() - started) * 1000.0)
+                    return response.status_code
+
+            return await asyncio.gather(*(one(i) for i in range(total)))
+
+        started = time.perf_counter()
+        codes = asyncio.run(main())
+        return time.perf_counter() - started, samples, codes
+
+    def handle(self, *args, **options):
+        model, trained = crop_model_or_standin()
+        if not trained:
+            self.stdout.write('Crop model file not found, using a stand-in forest.')
+
+        saved = (registry.get('crop'), views.weather_client.url)
+        registry.set('crop', model)
+        total, concurrency = options['requests'], options['concurrency']
+        try:
+            with StubWeatherServer(delay=options['latency_ms'] / 1000.0) as server, \
+                    override_settings(ALLOWED_HOSTS=['testserver'], CACHES=local_caches()):
+                views.weather_client.url = server.url
+                for label, runner in (('WSGI (threads)', self.run_wsgi),
+                                      ('ASGI (async view)', self.run_asgi)):
+                    views.weather_cache.clear()
+                    calls = server.calls
+                    elapsed, samples, codes = runner(total, concurrency, options['cities'])
+                    ok = sum(code == 200 for code in codes)
+                    self.stdout.write(
+                        f'{label:<18} {total / elapsed:8.1f} req/s  ok {ok}/{total}  '
+                        f'weather calls {server.calls - calls}')
+                    self.stdout.write('  ' + format_timing('latency', percentiles(samples)))
+        finally:
+            registry.set('crop', saved[0])
+            views.weather_client.url = saved[1]
@@ -0,0 +1,89 @@
+import copy
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+
+from eagroapp.benchdata import format_timing, percentiles
+
+# Fast hashing keeps the test about the database rather than PBKDF2
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class Command(BaseCommand):
+    help = ('Runs concurrent signups and logins against a throwaway copy of the '
+            'database. On SQLite it compares Django\'s defaults with the tuned '
+            'settings (WAL, busy timeout, persistent connections).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--real-hasher', action='store_true',
+                            help='hash passwords with the configured (slow) hasher')
+
+    def modes(self, settings_dict):
+        if settings_dict['ENGINE'] != 'django.db.backends.sqlite3':
+            return {'configured': {}}
+        return {
+            'sqlite defaults': {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+            'tuned': {},
+        }
+
+    def run(self, total, concurrency):
+        samples, outcomes = [], []
+
+        def one(i):
+            client = Client()
+            form = {'first_name': 'Load', 'last_name': 'Test', 'username': f'farmer{i}',
+                    'email': f'farmer{i}@example.com', 'password1': 'secret-pass', 'password2': 'secret-pass'}
+            started = time.perf_counter()
+            try:
+                response = client.post('/user-signup/', form)
+                ok = response.status_code == 302
+                if ok:
+                    response = client.post('/user-login/', {'username': form['username'], 'password': form['password1']})
+                    ok = response.status_code == 302
+                outcomes.append(ok)
+            except Exception:
+                # e.g. OperationalError: database is locked
+                outcomes.append(False)
+            samples.append((time.perf_counter() - started) * 1000.0)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(total)))
+        return time.perf_counter() - started, samples, outcomes
+
+    def handle(self, *args, **options):
+        settings_dict = connections.settings['default']
+        original = copy.deepcopy(settings_dict)
+        hashers = {} if options['real_hasher'] else {'PASSWORD_HASHERS': FAST_HASHERS}
+        total, concurrency = options['requests'], options['concurrency']
+
+        for label, overrides in self.modes(settings_dict).items():
+            with tempfile.TemporaryDirectory() as tmp:
+                settings_dict.update(copy.deepcopy(original))
+                settings_dict.update(overrides)
+                settings_dict['TEST'] = {**settings_dict.get('TEST', {}),
+                                         'NAME': os.path.join(tmp, 'signup.sqlite3')}
+                # New threads build their connections from settings_dict
+                connection = connections['default']
+                connection.settings_dict = settings_dict
+                test_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                try:
+                    with override_settings(ALLOWED_HOSTS=['testserver'], **hashers):
+                        elapsed, samples, outcomes = self.run(total, concurrency)
+                finally:
+                    connections.close_all()
+                    connection.creation.destroy_test_db(test_name, verbosity=0)
+            ok = sum(outcomes)
+            self.stdout.write(f'{label:<16} {total / elapsed:8.1f} signups/s  ok {ok}/{total}  '
+                              f'failed {total - ok}')
+            self.stdout.write('  ' + format_timing('signup + login', percentiles(samples)))
+
+        settings_dict.clear()
+        settings_dict.update(original)
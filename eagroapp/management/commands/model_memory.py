@@ -0,0 +1,103 @@
+import gc
+import multiprocessing
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from eagroapp import config
+from eagroapp.benchdata import synthetic_jpeg
+from eagroapp.registry import registry
+
+MODES = {
+    'per-worker': 'every worker loads its own copy',
+    'mmap': 'every worker loads, disease weights memory-mapped',
+    'preload': 'loaded once before fork, weights memory-mapped',
+}
+
+
+def memory_usage():
+    """
+    Memory of the calling process from /proc/self/smaps_rollup
+    :return: dict of MiB (rss, pss, private)
+    """
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024.0
+    return {
+        'rss': fields.get('Rss', 0.0),
+        'pss': fields.get('Pss', 0.0),
+        'private': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0),
+    }
+
+
+def exercise_models():
+    # One prediction per model, as a worker would do for its first requests
+    crop = registry.get('crop')
+    if crop is not None:
+        crop.predict(np.array([[90, 42, 43, 20.9, 82.0, 6.5, 202.9]]))
+    if registry.get('disease') is not None:
+        from eagroapp.views import predict_image
+        predict_image(synthetic_jpeg())
+
+
+def worker(preloaded, barrier, results):
+    if not preloaded:
+        registry.warm_up(['crop', 'disease'])
+    exercise_models()
+    # Measure once every worker holds its models, so PSS reflects sharing
+    barrier.wait()
+    results.put(memory_usage())
+    barrier.wait()
+
+
+class Command(BaseCommand):
+    help = 'Reports memory per forked worker with and without model preloading / memory-mapping (Linux only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+
+    def run_mode(self, mode, workers):
+        ctx = multiprocessing.get_context('fork')
+        config.DISEASE_MODEL_MMAP = mode != 'per-worker'
+        config.DISEASE_BATCHING = False
+        preloaded = mode == 'preload'
+        if preloaded:
+            registry.warm_up(['crop', 'disease'])
+            gc.freeze()
+
+        barrier = ctx.Barrier(workers)
+        results = ctx.Queue()
+        processes = [ctx.Process(target=worker, args=(preloaded, barrier, results))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        usage = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        if preloaded:
+            gc.unfreeze()
+        for name in ('crop', 'disease', 'disease_batcher'):
+            registry.unload(name)
+        gc.collect()
+        return usage
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        saved = (config.DISEASE_MODEL_MMAP, config.DISEASE_BATCHING)
+        self.stdout.write(f'{workers} workers, MiB per worker (mean)')
+        self.stdout.write(f"{'mode':<12} {'rss':>8} {'pss':>8} {'private':>8} {'total pss':>10}  description")
+        try:
+            for mode in options['modes']:
+                usage = self.run_mode(mode, workers)
+                mean = {key: sum(u[key] for u in usage) / len(usage) for key in usage[0]}
+                total = sum(u['pss'] for u in usage)
+                self.stdout.write(
+                    f"{mode:<12} {mean['rss']:8.1f} {mean['pss']:8.1f} {mean['private']:8.1f} "
+                    f"{total:10.1f}  {MODES[mode]}")
+        finally:
+            config.DISEASE_MODEL_MMAP, config.DISEASE_BATCHING = saved
@@ -0,0 +1,100 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eagroapp import config, inference
+from eagroapp.benchdata import format_timing, time_calls
+from eagroapp.disease import disease_classes
+
+
+class Command(BaseCommand):
+    help = ('Builds the int8 disease model from calibration images, then reports '
+            'accuracy drift against fp32 and latency of every CPU variant')
+
+    def add_arguments(self, parser):
+        parser.add_argument('calibration_dir', help='leaf images used to calibrate activation ranges')
+        parser.add_argument('--eval-dir', help='held-out images for the drift check '
+                            '(default: every 5th calibration image is held out)')
+        parser.add_argument('--output', default=config.DISEASE_INT8_MODEL_PATH)
+        parser.add_argument('--limit', type=int, default=200, help='max calibration images')
+        parser.add_argument('--iterations', type=int, default=20, help='benchmark iterations')
+        parser.add_argument('--batch-size', type=int, default=16, help='throughput batch size')
+
+    def handle(self, *args, **options):
+        if not inference.TORCH_AVAILABLE:
+            raise CommandError('PyTorch is not installed.')
+        import torch
+        from eagroapp import quantization
+        from eagroapp.models import ResNet9
+        from eagroapp.registry import load_fp32_disease_model
+
+        model = load_fp32_disease_model()
+        if model is None:
+            self.stdout.write('Disease model file not found, using random weights.')
+            model = ResNet9(3, len(disease_classes)).eval()
+
+        paths = quantization.image_paths(options['calibration_dir'])
+        if options['eval_dir']:
+            calibration = paths
+            held_out = quantization.image_paths(options['eval_dir'])
+        else:
+            calibration = [p for i, p in enumerate(paths) if i % 5]
+            held_out = paths[::5]
+        calibration = calibration[:options['limit']]
+        if not calibration:
+            raise CommandError(f"No images found in {options['calibration_dir']}")
+
+        started = time.perf_counter()
+        quantized = quantization.quantize_static(
+            model, (quantization.load_batch(p) for p in calibration))
+        quantization.save_quantized(quantized, options['output'])
+        self.stdout.write(f'Calibrated on {len(calibration)} images in '
+                          f'{time.perf_counter() - started:.1f}s, saved {options["output"]}')
+
+        variants = {
+            'fp32': model,
+            'channels_last': quantization.channels_last(model),
+            'int8': quantization.load_quantized(options['output']),
+        }
+        if held_out:
+            self.report_drift(variants, held_out)
+        self.report_speed(variants, options['iterations'], options['batch_size'])
+
+    def report_drift(self, variants, paths):
+        import torch
+        from eagroapp import quantization
+        # Class labels are taken from the parent folder name when it matches
+        labels = [os.path.basename(os.path.dirname(p)) for p in paths]
+        labelled = all(label in disease_classes for label in labels)
+        reference = None
+        self.stdout.write(f'\nDrift on {len(paths)} held-out images:')
+        with torch.inference_mode():
+            batches = [quantization.load_batch(p) for p in paths]
+            for name, model in variants.items():
+                probs = torch.cat([torch.softmax(model(b), dim=1) for b in batches])
+                top1 = probs.argmax(dim=1)
+                line = f'  {name:<14}'
+                if reference is None:
+                    reference = (probs, top1)
+                else:
+                    agree = (top1 == reference[1]).float().mean().item() * 100
+                    diff = (probs - reference[0]).abs()
+                    line += (f' top-1 agreement {agree:6.2f}%  '
+                             f'prob diff mean {diff.mean().item():.5f} max {diff.max().item():.5f}')
+                if labelled:
+                    correct = sum(disease_classes[i] == label for i, label in zip(top1.tolist(), labels))
+                    line += f'  accuracy {correct / len(labels) * 100:6.2f}%'
+                self.stdout.write(line)
+
+    def report_speed(self, variants, iterations, batch_size):
+        import torch
+        single = torch.rand(1, 3, inference.INPUT_SIZE, inference.INPUT_SIZE)
+        batch = torch.rand(batch_size, 3, inference.INPUT_SIZE, inference.INPUT_SIZE)
+        self.stdout.write(f'\nLatency (batch 1) and throughput (batch {batch_size}), '
+                          f'{torch.get_num_threads()} threads:')
+        for name, model in variants.items():
+            timing = time_calls(lambda: inference.forward(model, single), iterations)
+            throughput = time_calls(lambda: inference.forward(model, batch), max(1, iterations // 4))
+            self.stdout.write('  ' + format_timing(name, timing) +
+                              f"  {batch_size / throughput['mean_ms'] * 1000:8.1f} img/s")
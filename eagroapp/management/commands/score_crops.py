@@ -0,0 +1,41 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eagroapp import bulk, config
+from eagroapp.registry import registry
+
+
+class Command(BaseCommand):
+    help = 'Scores a soil-test CSV with the crop recommendation model, streaming it in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='CSV with N, P, K, temperature, humidity, ph, rainfall columns')
+        parser.add_argument('output', nargs='?', default='-', help="output CSV ('-' for stdout)")
+        parser.add_argument('--chunk-size', type=int, default=config.CROP_BULK_CHUNK_SIZE)
+        parser.add_argument('--n-jobs', type=int, default=config.CROP_BULK_N_JOBS)
+        parser.add_argument('--proba', action='store_true',
+                            help='add one probability column per crop')
+
+    def handle(self, *args, **options):
+        crop_recommendation_model = registry.get('crop')
+        if crop_recommendation_model is None:
+            raise CommandError('Crop recommendation model is not available.')
+
+        started = time.perf_counter()
+        out = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        try:
+            rows = bulk.score_csv(
+                crop_recommendation_model, options['input'], out,
+                chunk_size=options['chunk_size'],
+                n_jobs=options['n_jobs'],
+                proba=options['proba'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'Scored {rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)')
@@ -0,0 +1,205 @@
+"""
+Request and per-stage latency histograms in Prometheus text format.
+
+MetricsMiddleware times every request by view, method and status, and
+stage() times the expensive steps inside a view (weather lookup, model
+lookup, image decode, transform, forward pass, template render) under the
+view that is running. The histograms live in the memory of each worker
+process and are served by the /metrics view.
+
+With the METRICS setting off the middleware is not installed and stage()
+returns a shared no-op context manager, so instrumented code pays one
+attribute lookup per stage.
+"""
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import config
+
+# Upper bounds (seconds) of the histogram buckets; +Inf is implicit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# url_name of the view handling the current request (or task)
+_current_view = contextvars.ContextVar('eagro_view', default='')
+
+_disabled = contextlib.nullcontext()
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of one label set"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Histograms keyed by metric name and label values, plus collectors
+    that add the counters other components already keep
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, labels, value):
+        """
+        :params: name, labels (tuple of (label, value) pairs), value (seconds)
+        """
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        """
+        :params: collector (callable returning (name, type, help, value) tuples)
+        """
+        self._collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def render(self):
+        """
+        :return: every metric in the Prometheus text exposition format
+        """
+        with self._lock:
+            snapshot = sorted(
+                (name, labels, list(h.counts), h.sum, h.count)
+                for (name, labels), h in self._histograms.items())
+        lines = []
+        previous = None
+        for name, labels, counts, total, count in snapshot:
+            if name != previous:
+                lines.append(f'# HELP {name} {self._help.get(name, name)}')
+                lines.append(f'# TYPE {name} histogram')
+                previous = name
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (float('inf'),), counts):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total!r}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Warning: Metrics collector {collector!r} failed: {e}")
+                continue
+            for name, kind, text, value in samples:
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+metrics = Metrics()
+metrics.describe('eagro_request_duration_seconds', 'Time from request to response, by view')
+metrics.describe('eagro_stage_duration_seconds', 'Time spent in each stage of a view')
+
+
+class _Stage:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        metrics.observe('eagro_stage_duration_seconds',
+                        (('view', _current_view.get()), ('stage', self.name)),
+                        time.perf_counter() - self.started)
+        return False
+
+
+def stage(name):
+    """
+    Context manager timing one stage of the current view
+    :params: name (e.g. 'weather', 'decode', 'forward', 'render')
+    """
+    if not config.METRICS:
+        return _disabled
+    return _Stage(name)
+
+
+class MetricsMiddleware:
+    """Records the duration of every request, labelled by view and status"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _current_view.set('')
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self.observe(request, response.status_code, started)
+            return response
+        finally:
+            _current_view.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_view.set('')
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self.observe(request, response.status_code, started)
+            return response
+        finally:
+            _current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        _current_view.set(match.url_name if match and match.url_name else view_func.__name__)
+
+    def observe(self, request, status, started):
+        # Set by process_view; empty when no URL pattern matched
+        view = _current_view.get() or 'unmatched'
+        metrics.observe('eagro_request_duration_seconds',
+                        (('view', view), ('method', request.method), ('status', str(status))),
+                        time.perf_counter() - started)
@@ -1,32 +1,14 @@
+import importlib.util
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
-# PyTorch imports - optional, only needed for disease detection
-try:
-    import torch 
-    import torch.nn as nn
-    import torch.nn.functional as F
-    TORCH_AVAILABLE = True
-except ImportError:
-    TORCH_AVAILABLE = False
-    # Create dummy classes for when torch is not available
-    class nn:
-        class Module:
-            pass
-        class Sequential:
-            pass
-        class Conv2d:
-            pass
-        class BatchNorm2d:
-            pass
-        class MaxPool2d:
-            pass
-        class Linear:
-            pass
-        class ReLU:
-            pass
-    class F:
-        pass
+# PyTorch is optional, only needed for disease detection. It is imported
+# on first use of ResNet9 rather than when Django loads the app.
+TORCH_AVAILABLE = importlib.util.find_spec('torch') is not None
+
 
 class User(AbstractUser):
     is_admin = models.BooleanField(default=False)
@@ -36,39 +18,40 @@ class User(AbstractUser):
         swappable = 'AUTH_USER_MODEL'
 
 
+class Prediction(models.Model):
+    """
+    One crop, disease or fertilizer prediction, kept for audits and for
+    retraining the models. Rows are written in batches by
+    eagroapp.history.PredictionRecorder.
+    """
+    CROP = 'crop'
+    DISEASE = 'disease'
+    FERTILIZER = 'fertilizer'
+    KIND_CHOICES = [
+        (CROP, 'Crop recommendation'),
+        (DISEASE, 'Disease detection'),
+        (FERTILIZER, 'Fertilizer recommendation'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    inputs = models.JSONField(default=dict)
+    output = models.CharField(max_length=100)
+    latency_ms = models.FloatField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+                             related_name='predictions')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
 
-def ConvBlock(in_channels, out_channels, pool=False):
-    layers = [nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1),
-             nn.BatchNorm2d(out_channels),
-             nn.ReLU(inplace=True)]
-    if pool:
-        layers.append(nn.MaxPool2d(4))
-    return nn.Sequential(*layers)
+    def __str__(self):
+        return f'{self.kind}: {self.output}'
 
 
-# Model Architecture
-class ResNet9(nn.Module if TORCH_AVAILABLE else object):
-    def __init__(self, in_channels, num_diseases):
-        super().__init__()
-        
-        self.conv1 = ConvBlock(in_channels, 64)
-        self.conv2 = ConvBlock(64, 128, pool=True) # out_dim : 128 x 64 x 64 
-        self.res1 = nn.Sequential(ConvBlock(128, 128), ConvBlock(128, 128))
-        
-        self.conv3 = ConvBlock(128, 256, pool=True) # out_dim : 256 x 16 x 16
-        self.conv4 = ConvBlock(256, 512, pool=True) # out_dim : 512 x 4 x 44
-        self.res2 = nn.Sequential(ConvBlock(512, 512), ConvBlock(512, 512))
-        
-        self.classifier = nn.Sequential(nn.MaxPool2d(4),
-                                       nn.Flatten(),
-                                       nn.Linear(512, num_diseases))
-        
-    def forward(self, xb): # xb is the loaded batch
-        out = self.conv1(xb)
-        out = self.conv2(out)
-        out = self.res1(out) + out
-        out = self.conv3(out)
-        out = self.conv4(out)
-        out = self.res2(out) + out
-        out = self.classifier(out)
-        return out
\ No newline at end of file
+def __getattr__(name):
+    # ConvBlock and ResNet9 live in nets.py; resolve them lazily so that
+    # "from .models import ResNet9" keeps working without an eager torch import.
+    if name in ('ConvBlock', 'ResNet9'):
+        from . import nets
+        return getattr(nets, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,151 @@
+"""
+Content-addressed cache of plant disease predictions.
+
+Predictions are stored in a Django cache (the 'predictions' alias by
+default) under the SHA-256 of the uploaded bytes, with a key version
+derived from the model file, so a model upgrade starts from an empty
+cache even when the cache is shared with servers still running the old
+model. A re-uploaded photo is answered without decoding it or running the
+model. Optionally a 64-bit difference hash (dHash) of a small grayscale
+thumbnail is stored too. It also matches copies of the photo that were
+resized or re-encoded on the way, e.g. images forwarded through messaging
+apps.
+"""
+import hashlib
+import threading
+
+import numpy as np
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from . import config, inference
+from .caching import cache_call
+
+# Bytes hashed per read when the image is a file object
+CHUNK_SIZE = 64 * 1024
+
+# dHash compares horizontally adjacent pixels of a 9 x 8 thumbnail
+DHASH_SIZE = (9, 8)
+# The 64-bit hash is stored under four 16-bit bands. Two hashes at most
+# three bits apart always share a band, so near-duplicates are found with
+# plain key lookups.
+DHASH_BANDS = 4
+# Images remembered per band value. Unrelated photos can share a 16-bit
+# band, so each band keeps a short list, dropping the oldest entry first.
+DHASH_BAND_ENTRIES = 8
+DHASH_MAX_DISTANCE = DHASH_BANDS - 1
+
+
+def content_hash(img):
+    """
+    SHA-256 of an image's encoded bytes
+    :params: img (bytes or binary file object; files are rewound)
+    :return: hex digest
+    """
+    if isinstance(img, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(img).hexdigest()
+    digest = hashlib.sha256()
+    img.seek(0)
+    for chunk in iter(lambda: img.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    img.seek(0)
+    return digest.hexdigest()
+
+
+def dhash(img):
+    """
+    Perceptual difference hash of an image, stable across re-encoding and
+    resizing
+    :params: img (bytes or binary file object; files are rewound)
+    :return: 64-bit int
+    """
+    pixels = np.asarray(inference.load_thumbnail(img, DHASH_SIZE), dtype=np.int16)
+    if not isinstance(img, (bytes, bytearray, memoryview)):
+        img.seek(0)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+class PredictionCache:
+    """
+    Disease predictions keyed by image content
+    :params: alias (Django cache), perceptual (also key by dHash), timeout
+             (seconds, None uses the cache's default), version (callable
+             returning the key version, e.g. registry.disease_model_version;
+             None uses the cache's default)
+    """
+
+    def __init__(self, alias='predictions', perceptual=False, timeout=None, version=None):
+        self.alias = alias
+        self.perceptual = perceptual
+        self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        self.version = version
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, kind, digest):
+        # Backends and precisions can disagree on borderline images
+        return f'disease:{config.DISEASE_BACKEND}:{config.DISEASE_PRECISION}:{kind}:{digest}'
+
+    def get_or_predict(self, img, predict):
+        """
+        Cached prediction for an image, calling predict() on a miss
+        :params: img (bytes or binary file object), predict (callable
+                 returning the prediction, e.g. class probabilities, or
+                 None on failure)
+        :return: prediction or None
+        """
+        exact_key = self.key('sha256', content_hash(img))
+        version = self.version() if self.version is not None else None
+        prediction = cache_call(self.cache.get, exact_key, version=version)
+        if prediction is not None:
+            self._count('hits')
+            return prediction
+
+        entries = {}
+        if self.perceptual:
+            value = dhash(img)
+            band_keys = [self.key(f'dhashes{band}', f'{(value >> (16 * band)) & 0xffff:04x}')
+                         for band in range(DHASH_BANDS)]
+            bands = cache_call(self.cache.get_many, band_keys, version=version, default={})
+            for band in bands.values():
+                for stored, prediction in band:
+                    if bin(stored ^ value).count('1') <= DHASH_MAX_DISTANCE:
+                        self._count('perceptual_hits')
+                        cache_call(self.cache.set, exact_key, prediction, self.timeout, version=version)
+                        return prediction
+            entries = {key: bands.get(key, []) for key in band_keys}
+
+        self._count('misses')
+        prediction = predict()
+        if prediction is not None:
+            entries = {key: (band + [(value, prediction)])[-DHASH_BAND_ENTRIES:] for key, band in entries.items()}
+            entries[exact_key] = prediction
+            cache_call(self.cache.set_many, entries, self.timeout, version=version)
+        return prediction
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """
+        :return: dict of hits, perceptual_hits, misses and hit_rate
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['perceptual_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['perceptual_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'hits': 0, 'perceptual_hits': 0, 'misses': 0}
+
+    def clear(self):
+        """Empties the whole cache alias, including a shared server"""
+        self.cache.clear()
@@ -0,0 +1,252 @@
+"""
+Disease inference in separate worker processes.
+
+Decoding and the forward pass run outside the web worker, so they neither
+hold its GIL nor take it down when a malformed image crashes the decoder.
+Each pool process owns a shared-memory slot. The parent copies the
+encoded upload (or an already preprocessed float32 array) into the slot,
+and only a small control message goes through the pipe. The class
+probabilities (a few hundred bytes) come back through the pipe. A process
+that dies or exceeds the timeout is replaced with a fresh one.
+
+Processes are started with 'spawn' on first use in each web worker, so a
+gunicorn master that preloads the app does not share them across forks.
+"""
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _worker_main(conn, shm_name, num_threads):
+    # Runs in the spawned process: set up Django and load the model there
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eagro.settings')
+    django.setup()
+    from . import config, inference
+    from .registry import registry
+
+    config.TORCH_NUM_THREADS = num_threads
+    config.DISEASE_BATCHING = False
+    config.PREDICTION_CACHE = False
+    # Spawned children share the parent's resource tracker, which unlinks
+    # the block if the parent dies without closing the pool
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        model = registry.get('disease')
+        conn.send(('ready', model is not None))
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            if message is None:
+                return
+            kind, meta = message
+            try:
+                if model is None:
+                    raise RuntimeError('Disease detection model is not available')
+                if kind == 'array':
+                    # Zero-copy view of the preprocessed image in the slot
+                    array = np.ndarray(meta, dtype=np.float32, buffer=shm.buf)
+                    img_t = array if getattr(model, 'numpy_io', False) else _as_tensor(array)
+                else:
+                    img_t = inference.prepare(bytes(shm.buf[:meta]), model)
+                scores = inference.forward(model, inference.stack([img_t]))[0]
+                conn.send(('ok', inference.softmax(scores)))
+            except Exception as e:
+                conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        shm.close()
+
+
+def _as_tensor(array):
+    import torch
+    return torch.from_numpy(array)
+
+
+class _Slot:
+    """One pool process with its pipe and shared-memory block"""
+
+    def __init__(self, ctx, slot_bytes, num_threads):
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_bytes)
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, self.shm.name, num_threads),
+            name='disease-inference', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        # Reported by the process once it has tried to load the model
+        self.model_loaded = None
+
+    def wait_ready(self, timeout):
+        """
+        :return: whether the process has a disease model
+        """
+        if not self.ready:
+            if not self.conn.poll(timeout):
+                raise TimeoutError('Inference process did not start in time')
+            _, self.model_loaded = self.conn.recv()
+            self.ready = True
+        return self.model_loaded
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def stop(self, kill=False):
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class InferencePool:
+    """
+    Fixed-size pool of disease inference processes
+    :params: size (processes), num_threads (torch / ONNX Runtime threads per
+             process), timeout (seconds per prediction), slot_bytes (largest
+             encoded image or preprocessed array)
+    """
+
+    def __init__(self, size=2, num_threads=1, timeout=30.0, slot_bytes=10 * 1024 * 1024):
+        self.size = max(1, int(size))
+        self.num_threads = max(1, int(num_threads))
+        self.timeout = timeout
+        self.slot_bytes = slot_bytes
+        self._idle = queue.Queue()
+        self._slots = []
+        self._lock = threading.Lock()
+        self._pid = None
+        # None until a process has started; False when it found no model
+        self.model_loaded = None
+        self._stats = {'requests': 0, 'errors': 0, 'timeouts': 0, 'respawns': 0}
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        # Started per process: slots inherited through fork belong to the parent
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            ctx = multiprocessing.get_context('spawn')
+            self._ctx = ctx
+            self._idle = queue.Queue()
+            self._slots = [_Slot(ctx, self.slot_bytes, self.num_threads) for _ in range(self.size)]
+            for slot in self._slots:
+                self._idle.put(slot)
+            self._pid = os.getpid()
+
+    def _replace(self, slot):
+        slot.stop(kill=True)
+        fresh = _Slot(self._ctx, self.slot_bytes, self.num_threads)
+        with self._lock:
+            self._slots[self._slots.index(slot)] = fresh
+            self._stats['respawns'] += 1
+        return fresh
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def predict(self, img, timeout=None):
+        """
+        Class probabilities of one image
+        :params: img (bytes, binary file object, or a C x H x W float32
+                 array), timeout (seconds, default from the pool)
+        :return: numpy array of softmax probabilities
+        :raises: TimeoutError, WorkerCrashed, RuntimeError (prediction error,
+                 or no model in the inference processes)
+        """
+        self._ensure_started()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        try:
+            slot = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError('No inference process became free in time')
+        self._count('requests')
+        try:
+            if not slot.alive():
+                slot = self._replace(slot)
+            self.model_loaded = slot.wait_ready(max(0.0, deadline - time.monotonic()))
+            if not self.model_loaded:
+                self._count('errors')
+                raise RuntimeError('Disease detection model is not available in the inference process')
+            slot.conn.send(self._write(slot, img))
+            if not slot.conn.poll(max(0.0, deadline - time.monotonic())):
+                self._count('timeouts')
+                slot = self._replace(slot)
+                raise TimeoutError(f'Disease prediction took longer than {timeout:.0f}s')
+            status, value = slot.conn.recv()
+        except (EOFError, ConnectionError) as e:
+            self._count('errors')
+            slot = self._replace(slot)
+            raise WorkerCrashed(f'Inference process died: {e}')
+        finally:
+            self._idle.put(slot)
+        if status != 'ok':
+            self._count('errors')
+            raise RuntimeError(value)
+        return value
+
+    def _write(self, slot, img):
+        buf = slot.shm.buf
+        if isinstance(img, np.ndarray):
+            if img.nbytes > self.slot_bytes:
+                raise ValueError('Preprocessed image does not fit the shared-memory slot')
+            np.ndarray(img.shape, dtype=np.float32, buffer=buf)[...] = img
+            return ('array', img.shape)
+        if isinstance(img, (bytes, bytearray, memoryview)):
+            size = len(img)
+            if size > self.slot_bytes:
+                raise ValueError('Image does not fit the shared-memory slot')
+            buf[:size] = img
+            return ('image', size)
+        # Uploaded file: copy chunk by chunk, straight into the slot
+        img.seek(0)
+        size = 0
+        while True:
+            chunk = img.read(64 * 1024)
+            if not chunk:
+                break
+            if size + len(chunk) > self.slot_bytes:
+                raise ValueError('Image does not fit the shared-memory slot')
+            buf[size:size + len(chunk)] = chunk
+            size += len(chunk)
+        img.seek(0)
+        return ('image', size)
+
+    def stats(self):
+        with self._lock:
+            alive = sum(slot.alive() for slot in self._slots) if self._pid == os.getpid() else 0
+            return dict(self._stats, size=self.size, alive=alive)
+
+    def close(self):
+        """Stops every pool process and frees the shared memory"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            slots, self._slots, self._pid = self._slots, [], None
+        for slot in slots:
+            slot.stop()
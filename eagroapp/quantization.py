@@ -0,0 +1,123 @@
+"""
+CPU-optimised variants of the ResNet9 disease model.
+
+- channels_last: BatchNorm folded into the convolutions and NHWC memory
+  format, which the oneDNN convolution kernels prefer.
+- int8: post-training static quantization (FX graph mode) calibrated on
+  sample leaf images, saved as a frozen TorchScript module.
+"""
+import copy
+import os
+import warnings
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import fuse_modules, get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from . import backends, inference
+
+# Conv -> BatchNorm -> ReLU sequences of ResNet9 (see nets.ConvBlock)
+CONV_BLOCKS = ['conv1', 'conv2', 'res1.0', 'res1.1', 'conv3', 'conv4', 'res2.0', 'res2.1']
+
+
+class ChannelsLast(nn.Module):
+    """Runs the wrapped model on NHWC (channels_last) inputs"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+
+    def forward(self, xb):
+        return self.model(xb.contiguous(memory_format=torch.channels_last))
+
+
+def fuse_conv_bn(model, inplace=False):
+    """
+    The model with every BatchNorm folded into its convolution (and the
+    ReLU fused in)
+    :params: model (in eval mode), inplace (fuse the given model rather
+             than a copy of it)
+    :return: model
+    """
+    if not inplace:
+        model = copy.deepcopy(model)
+    return fuse_modules(model.eval(), [[f'{block}.0', f'{block}.1', f'{block}.2'] for block in CONV_BLOCKS],
+                        inplace=True)
+
+
+def channels_last(model, inplace=False):
+    """
+    Fused, NHWC variant of the fp32 model
+    :params: model, inplace (convert the given model rather than a copy)
+    :return: model
+    """
+    return ChannelsLast(fuse_conv_bn(model, inplace)).eval()
+
+
+def quantize_static(model, calibration_batches):
+    """
+    Post-training static int8 quantization. BatchNorm is folded into the
+    convolutions while preparing the graph.
+    :params: model (fp32, eval mode), calibration_batches (iterable of
+             N x 3 x H x W tensors)
+    :return: quantized GraphModule
+    """
+    model = copy.deepcopy(model).eval()
+    example = (torch.rand(1, 3, inference.INPUT_SIZE, inference.INPUT_SIZE),)
+    with warnings.catch_warnings():
+        # torch.ao.quantization is deprecated in favour of torchao
+        warnings.simplefilter('ignore')
+        prepared = prepare_fx(model, get_default_qconfig_mapping('x86'), example)
+        with torch.inference_mode():
+            for batch in calibration_batches:
+                prepared(batch)
+        return convert_fx(prepared)
+
+
+def save_quantized(model, path):
+    """Saves a quantized model as frozen TorchScript"""
+    backends.export_torchscript(model, path)
+
+
+def load_quantized(path):
+    return backends.load_torchscript(path)
+
+
+def apply_precision(model, precision, int8_path=None):
+    """
+    Converts the fp32 model to the configured inference variant
+    :params: model (converted in place for 'channels_last'), precision
+             ('fp32', 'channels_last' or 'int8'), int8_path
+    :return: model
+    """
+    if precision == 'channels_last':
+        # Folding BatchNorm writes new weights, so they are private to each
+        # process whether or not the fp32 ones were memory-mapped. Fusing in
+        # place at least drops the fp32 weights instead of copying them.
+        return channels_last(model, inplace=True)
+    if precision == 'int8':
+        if int8_path and os.path.exists(int8_path):
+            return load_quantized(int8_path)
+        print(f"Warning: Quantized disease model not found at {int8_path}. "
+              "Run 'manage.py quantize_disease_model' first; using fp32.")
+    return model
+
+
+def image_paths(directory):
+    """
+    Image files below a directory, sorted for reproducibility
+    :params: directory
+    :return: list of paths
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(inference.IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def load_batch(path):
+    with open(path, 'rb') as f:
+        return torch.unsqueeze(inference.preprocess(f.read()), 0)
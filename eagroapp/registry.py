@@ -0,0 +1,278 @@
+"""
+Lazy, thread-safe loading of the prediction models.
+
+Nothing is unpickled and PyTorch is not imported until a model is first
+requested, so management commands and pages that never predict start
+quickly. Worker processes can load everything up front with warm_up().
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from . import config
+from .disease import disease_classes
+from .models import TORCH_AVAILABLE
+
+
+class ModelRegistry:
+    """
+    Named loaders whose results are created once, on first get()
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """
+        :params: name, loader (callable returning the model, or None when
+                 it is unavailable)
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        """
+        The model registered under name, loading it on first use
+        :params: name
+        :return: model or None
+        """
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+        with self._locks[name]:
+            if name not in self._models:
+                self._models[name] = self._loaders[name]()
+            return self._models[name]
+
+    def loaded(self, name):
+        return name in self._models
+
+    def set(self, name, model):
+        """Replaces a model, e.g. with a stand-in for benchmarks"""
+        with self._locks[name]:
+            self._models[name] = model
+
+    def unload(self, name):
+        with self._locks[name]:
+            self._models.pop(name, None)
+
+    def warm_up(self, names=None):
+        """
+        Loads the given (default: all) models now instead of on the
+        first request
+        :params: names
+        :return: dict of name -> seconds spent loading
+        """
+        timings = {}
+        for name in names or list(self._loaders):
+            started = time.perf_counter()
+            self.get(name)
+            timings[name] = time.perf_counter() - started
+        return timings
+
+
+def load_crop_model():
+    path = config.CROP_MODEL_PATH
+    if not os.path.exists(path):
+        print(f"Warning: Crop recommendation model not found at {path}")
+        return None
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+    return flat_crop_model(model) if config.CROP_MODEL_FLAT else model
+
+
+def flat_crop_model(model):
+    """
+    The forest compiled into flat arrays for fast single-row predictions,
+    or the model itself when it cannot be
+    """
+    from .forest import flatten
+    try:
+        return flatten(model)
+    except (ValueError, AttributeError, TypeError) as e:
+        print(f"Warning: Using the sklearn crop model as is ({e})")
+        return model
+
+
+def load_fp32_disease_model():
+    """The ResNet9 disease model as trained, in fp32"""
+    path = config.DISEASE_MODEL_PATH
+    if not TORCH_AVAILABLE:
+        print("Warning: PyTorch is not installed. Disease detection will not work.")
+        return None
+    if not os.path.exists(path):
+        print(f"Warning: Disease detection model not found at {path}")
+        return None
+
+    import torch
+    from . import inference
+    from .nets import ResNet9
+    # Keep several workers on one host from oversubscribing the cores
+    inference.configure_threads(config.TORCH_NUM_THREADS)
+    if config.DISEASE_MODEL_MMAP:
+        try:
+            # Build the layers without allocating weights, then adopt the
+            # memory-mapped tensors: the weights stay clean file-backed pages
+            # that every worker shares through the page cache.
+            with torch.device('meta'):
+                model = ResNet9(3, len(disease_classes))
+            state = torch.load(path, map_location=torch.device('cpu'), mmap=True, weights_only=True)
+            model.load_state_dict(state, assign=True)
+            model.eval()
+            return model
+        except (TypeError, RuntimeError, pickle.UnpicklingError) as e:
+            # Older torch, a legacy (non-zip) checkpoint, or one holding
+            # more than plain tensors
+            print(f"Warning: Could not memory-map {path} ({e}), loading it into memory")
+
+    model = ResNet9(3, len(disease_classes))
+    model.load_state_dict(torch.load(path, map_location=torch.device('cpu')))
+    model.eval()
+    return model
+
+
+# path -> SHA-256 of the file, read once per process like the models
+_file_digests = {}
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    SHA-256 of a file, computed on first use
+    :params: path, chunk_size
+    :return: hex digest, or '' when the file does not exist
+    """
+    digest = _file_digests.get(path)
+    if digest is None:
+        if not os.path.exists(path):
+            return ''
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        digest = _file_digests[path] = sha.hexdigest()
+    return digest
+
+
+def disease_model_files():
+    """Files the configured disease backend and precision load"""
+    backend = config.DISEASE_BACKEND
+    if backend == 'onnx':
+        return [config.DISEASE_ONNX_MODEL_PATH]
+    if backend == 'torchscript':
+        return [config.DISEASE_TORCHSCRIPT_MODEL_PATH]
+    if config.DISEASE_PRECISION == 'int8':
+        return [config.DISEASE_MODEL_PATH, config.DISEASE_INT8_MODEL_PATH]
+    return [config.DISEASE_MODEL_PATH]
+
+
+def disease_model_version():
+    """
+    Cache key version of disease predictions. It changes with the model
+    files, so app servers running a new model never read the cached
+    predictions of the old one.
+    :return: int
+    """
+    files = ':'.join(file_digest(path) for path in disease_model_files())
+    return int(hashlib.sha256(files.encode()).hexdigest()[:12], 16)
+
+
+def load_disease_model():
+    # Hash the files as they are loaded, so the version matches the model in memory
+    disease_model_version()
+    backend = config.DISEASE_BACKEND
+    if backend == 'onnx':
+        return load_onnx_disease_model()
+    if backend == 'torchscript':
+        return load_torchscript_disease_model()
+
+    int8_path = config.DISEASE_INT8_MODEL_PATH
+    if config.DISEASE_PRECISION == 'int8' and TORCH_AVAILABLE and os.path.exists(int8_path):
+        # The quantized module holds its own weights; the fp32 ones are not needed
+        from . import inference, quantization
+        inference.configure_threads(config.TORCH_NUM_THREADS)
+        return quantization.load_quantized(int8_path)
+
+    model = load_fp32_disease_model()
+    if model is None or config.DISEASE_PRECISION == 'fp32':
+        return model
+    from . import quantization
+    return quantization.apply_precision(model, config.DISEASE_PRECISION, int8_path)
+
+
+def load_torchscript_disease_model():
+    path = config.DISEASE_TORCHSCRIPT_MODEL_PATH
+    if not TORCH_AVAILABLE:
+        print("Warning: PyTorch is not installed. Disease detection will not work.")
+        return None
+    if not os.path.exists(path):
+        print(f"Warning: TorchScript disease model not found at {path}. Run 'manage.py export_disease_model' first.")
+        return None
+    from . import backends, inference
+    inference.configure_threads(config.TORCH_NUM_THREADS)
+    return backends.load_torchscript(path)
+
+
+def load_onnx_disease_model():
+    from . import backends
+    path = config.DISEASE_ONNX_MODEL_PATH
+    if not backends.ONNXRUNTIME_AVAILABLE:
+        print("Warning: onnxruntime is not installed. Disease detection will not work.")
+        return None
+    if not os.path.exists(path):
+        print(f"Warning: ONNX disease model not found at {path}. Run 'manage.py export_disease_model' first.")
+        return None
+    return backends.load_onnx(path, config.TORCH_NUM_THREADS)
+
+
+def load_disease_batcher():
+    model = registry.get('disease')
+    if model is None or not config.DISEASE_BATCHING:
+        return None
+    from .batching import BatchingPredictor
+    # Concurrent uploads share batched forward passes of the disease model
+    return BatchingPredictor(
+        model,
+        max_batch_size=config.DISEASE_BATCH_MAX_SIZE,
+        max_wait_ms=config.DISEASE_BATCH_MAX_WAIT_MS)
+
+
+def load_disease_pool():
+    if not config.DISEASE_PROCESS_POOL_SIZE:
+        return None
+    from .process_pool import InferencePool
+    # Processes start on the first prediction of each web worker
+    return InferencePool(
+        size=config.DISEASE_PROCESS_POOL_SIZE,
+        num_threads=config.DISEASE_PROCESS_POOL_THREADS,
+        timeout=config.DISEASE_PROCESS_POOL_TIMEOUT,
+        slot_bytes=config.MAX_UPLOAD_BYTES)
+
+
+registry = ModelRegistry()
+registry.register('crop', load_crop_model)
+registry.register('disease', load_disease_model)
+registry.register('disease_batcher', load_disease_batcher)
+registry.register('disease_pool', load_disease_pool)
+
+
+def warm_up():
+    """
+    Loads every model and pre-renders the result pages when the
+    WARM_UP_MODELS setting is enabled
+    """
+    if config.WARM_UP_MODELS:
+        from .fragments import result_pages
+        result_pages.render_all()
+        if config.DISEASE_PROCESS_POOL_SIZE:
+            # The pool processes load their own disease model, so a copy in
+            # the web worker would never be used
+            return registry.warm_up(['crop', 'disease_pool'])
+        return registry.warm_up()
+    return {}
@@ -0,0 +1,108 @@
+"""
+What-if sweeps for crop recommendation.
+
+One or two of the seven soil and weather features are varied over a
+range while the others keep their base values. The whole grid is built as
+a single NumPy matrix and scored with one predict_proba call, and the
+result is returned as a grid of top crops and confidences for a heatmap.
+"""
+import numpy as np
+
+from .bulk import CROP_FEATURES
+
+# Grid points along one axis when only a range is given
+DEFAULT_STEPS = 11
+
+
+class SweepError(ValueError):
+    pass
+
+
+def axis_values(axis, base, max_steps=DEFAULT_STEPS):
+    """
+    Values of one sweep axis
+    :params: axis (dict with 'feature' and either 'values', 'start' /
+             'stop' / 'steps', or 'percent': [low, high] / 'steps' relative
+             to the base value), base (dict of base feature values),
+             max_steps
+    :return: (feature name, 1-D float array)
+    """
+    if not isinstance(axis, dict):
+        raise SweepError('Each axis must be an object')
+    feature = axis.get('feature')
+    if feature not in CROP_FEATURES:
+        raise SweepError(f"Unknown feature {feature!r}, expected one of {', '.join(CROP_FEATURES)}")
+    try:
+        if 'values' in axis:
+            values = axis['values']
+            if not isinstance(values, list) or not all(
+                    isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                raise ValueError('values must be a flat list of numbers')
+            if len(values) > max_steps:
+                raise ValueError(f'at most {max_steps} values')
+            values = np.asarray(values, dtype=np.float64)
+        else:
+            steps = int(axis.get('steps', DEFAULT_STEPS))
+            if not 1 <= steps <= max_steps:
+                raise ValueError(f'steps must be between 1 and {max_steps}')
+            if 'percent' in axis:
+                low, high = (float(p) for p in axis['percent'])
+                values = base[feature] * (1.0 + np.linspace(low, high, steps) / 100.0)
+            else:
+                values = np.linspace(float(axis['start']), float(axis['stop']), steps)
+    except (KeyError, TypeError, ValueError) as e:
+        raise SweepError(f'Invalid {feature} axis: {e}')
+    if values.ndim != 1 or not len(values) or not np.isfinite(values).all():
+        raise SweepError(f'The {feature} axis needs at least one finite value')
+    return feature, values.round(4)
+
+
+def build_grid(base, axes):
+    """
+    Every combination of the axis values, as rows of the model's features
+    :params: base (dict of the seven feature values), axes (list of
+             (feature, values), one or two)
+    :return: (len(values 1) * len(values 2)) x 7 float array, row-major over
+             the axes
+    """
+    row = np.array([base[name] for name in CROP_FEATURES], dtype=np.float64)
+    shape = [len(values) for _, values in axes]
+    grid = np.tile(row, (int(np.prod(shape)), 1))
+    # Broadcast each axis over the grid without building index arrays
+    cells = grid.reshape(shape + [len(CROP_FEATURES)])
+    for position, (feature, values) in enumerate(axes):
+        view = [np.newaxis] * len(axes)
+        view[position] = slice(None)
+        cells[..., CROP_FEATURES.index(feature)] = values[tuple(view)]
+    return grid
+
+
+def sweep(model, base, axes, max_cells=2500):
+    """
+    Scores a what-if grid with a single predict_proba call
+    :params: model, base (dict of the seven feature values), axes (list of
+             axis dicts, see axis_values), max_cells
+    :return: dict with the axes, the crops that appear, and per cell the
+             index of the top crop and its probability
+    :raises: SweepError for invalid axes or a grid above max_cells
+    """
+    if not isinstance(axes, list) or not 1 <= len(axes) <= 2:
+        raise SweepError('Give one or two axes to sweep')
+    axes = [axis_values(axis, base, max_cells) for axis in axes]
+    if len(axes) == 2 and axes[0][0] == axes[1][0]:
+        raise SweepError('The two axes must sweep different features')
+    shape = tuple(len(values) for _, values in axes)
+    if int(np.prod(shape)) > max_cells:
+        raise SweepError(f'The grid has {int(np.prod(shape))} cells, the limit is {max_cells}')
+
+    probabilities = model.predict_proba(build_grid(base, axes))
+    best = probabilities.argmax(axis=1)
+    confidence = probabilities[np.arange(len(best)), best]
+    # Only the crops that win somewhere, indexed compactly
+    used, top = np.unique(best, return_inverse=True)
+    return {
+        'axes': [{'feature': feature, 'values': values.tolist()} for feature, values in axes],
+        'crops': [str(model.classes_[i]) for i in used],
+        'top': top.reshape(shape).tolist(),
+        'confidence': confidence.round(4).reshape(shape).tolist(),
+    }
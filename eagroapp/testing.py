@@ -0,0 +1,261 @@
+"""
+Local stand-ins for external services, used by the load tests and
+benchmark commands so they never hit the real OpenWeatherMap API, and by
+tests of the shared cache so they need no memcached server.
+"""
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubWeatherServer:
+    """
+    OpenWeatherMap-compatible HTTP server on 127.0.0.1
+    :params: temperature (Celsius), humidity, delay (seconds per response),
+             fail (answer every request with HTTP 503)
+    Usage:
+        with StubWeatherServer(delay=0.05) as server:
+            WeatherClient(url=server.url).fetch('Pune')
+    """
+
+    def __init__(self, temperature=26.0, humidity=70, delay=0.0, fail=False):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/data/2.5/weather'
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle's
+            # algorithm on, the body waits ~40 ms for the client's delayed
+            # ACK of the headers on every keep-alive request
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.calls += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                city = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+                if stub.fail:
+                    status, body = 503, {'cod': 503, 'message': 'unavailable'}
+                else:
+                    status, body = 200, {
+                        'name': city,
+                        'main': {'temp': stub.temperature + 273.15, 'humidity': stub.humidity},
+                    }
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubMemcachedServer:
+    """
+    In-memory server speaking the memcached text protocol on 127.0.0.1:
+    get/gets, set/add/replace/append/prepend/cas, delete, incr/decr,
+    touch, flush_all and version, which is what Django's memcached
+    backends use
+    Usage:
+        with StubMemcachedServer() as server, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+                'LOCATION': server.location}}):
+            ...
+    """
+
+    # Relative expiration times above 30 days are absolute Unix times
+    MAX_RELATIVE_EXPIRY = 30 * 24 * 3600
+
+    def __init__(self):
+        self.commands = 0
+        self._items = {}
+        self._cas = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def location(self):
+        host, port = self._server.server_address[:2]
+        return f'{host}:{port}'
+
+    def _expires(self, exptime):
+        exptime = int(exptime)
+        if exptime == 0:
+            return None
+        if exptime < 0:
+            return 0.0
+        return float(exptime) if exptime > self.MAX_RELATIVE_EXPIRY else time.time() + exptime
+
+    def _item(self, key):
+        # Caller holds self._lock
+        item = self._items.get(key)
+        if item is not None and item[2] is not None and item[2] <= time.time():
+            del self._items[key]
+            return None
+        return item
+
+    def _store(self, command, key, flags, exptime, data, cas=None):
+        with self._lock:
+            item = self._item(key)
+            if command == 'add' and item is not None:
+                return b'NOT_STORED'
+            if command in ('replace', 'append', 'prepend') and item is None:
+                return b'NOT_STORED'
+            if command == 'cas':
+                if item is None:
+                    return b'NOT_FOUND'
+                if item[3] != cas:
+                    return b'EXISTS'
+            if command == 'append':
+                flags, data, expires = item[0], item[1] + data, item[2]
+            elif command == 'prepend':
+                flags, data, expires = item[0], data + item[1], item[2]
+            else:
+                expires = self._expires(exptime)
+            self._cas += 1
+            self._items[key] = (int(flags), data, expires, self._cas)
+            return b'STORED'
+
+    def _execute(self, parts, rfile):
+        """
+        :params: parts (command line split on spaces), rfile (for the data block)
+        :return: response bytes, or None for noreply
+        """
+        command, args = parts[0].decode(), parts[1:]
+        noreply = bool(args) and args[-1] == b'noreply'
+        if noreply:
+            args = args[:-1]
+        if command in ('get', 'gets'):
+            lines = []
+            with self._lock:
+                for key in args:
+                    item = self._item(key)
+                    if item is None:
+                        continue
+                    flags, data, _, cas = item
+                    header = b'VALUE %s %d %d' % (key, flags, len(data))
+                    if command == 'gets':
+                        header += b' %d' % cas
+                    lines += [header, data]
+            return b'\r\n'.join(lines + [b'END'])
+        if command in ('set', 'add', 'replace', 'append', 'prepend', 'cas'):
+            key, flags, exptime, size = args[0], args[1], args[2], int(args[3])
+            data = rfile.read(size + 2)[:size]
+            cas = int(args[4]) if command == 'cas' else None
+            response = self._store(command, key, flags, exptime, data, cas)
+        elif command == 'delete':
+            with self._lock:
+                found = self._item(args[0]) is not None
+                self._items.pop(args[0], None)
+            response = b'DELETED' if found else b'NOT_FOUND'
+        elif command in ('incr', 'decr'):
+            with self._lock:
+                item = self._item(args[0])
+                if item is None:
+                    response = b'NOT_FOUND'
+                else:
+                    delta = int(args[1]) if command == 'incr' else -int(args[1])
+                    value = max(int(item[1]) + delta, 0)
+                    self._cas += 1
+                    self._items[args[0]] = (item[0], str(value).encode(), item[2], self._cas)
+                    response = str(value).encode()
+        elif command == 'touch':
+            with self._lock:
+                item = self._item(args[0])
+                if item is not None:
+                    self._items[args[0]] = item[:2] + (self._expires(args[1]),) + item[3:]
+            response = b'TOUCHED' if item is not None else b'NOT_FOUND'
+        elif command == 'flush_all':
+            with self._lock:
+                self._items.clear()
+            response = b'OK'
+        elif command == 'version':
+            response = b'VERSION eagro-stub'
+        else:
+            response = b'ERROR'
+        return None if noreply else response
+
+    def _handler(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def handle(self):
+                for line in iter(self.rfile.readline, b''):
+                    parts = line.strip().split()
+                    if not parts:
+                        continue
+                    if parts[0] == b'quit':
+                        return
+                    with stub._lock:
+                        stub.commands += 1
+                    try:
+                        response = stub._execute(parts, self.rfile)
+                    except (IndexError, ValueError):
+                        response = b'CLIENT_ERROR bad command line format'
+                    if response is not None:
+                        self.wfile.write(response + b'\r\n')
+
+        return Handler
+
+    def start(self):
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
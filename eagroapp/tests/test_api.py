@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from ..api import top_k
+from ..benchdata import synthetic_jpeg
+from ..benchmarks import standin_environment
+from ..disease import disease_classes
+from ..registry import registry
+
+CROP_FIELDS = {'N': 90, 'P': 42, 'K': 43, 'ph': 6.5, 'rainfall': 200, 'temperature': 21, 'humidity': 82}
+
+
+class TopKTests(TestCase):
+
+    def test_most_likely_first(self):
+        ranked = top_k(np.array([0.1, 0.6, 0.3]), ['a', 'b', 'c'], 2)
+        self.assertEqual([(c['id'], c['label']) for c in ranked], [(1, 'b'), (2, 'c')])
+        self.assertEqual(ranked[0]['probability'], 0.6)
+
+    def test_k_is_clamped(self):
+        self.assertEqual(len(top_k(np.array([0.5, 0.5]), ['a', 'b'], 10)), 2)
+        self.assertEqual(len(top_k(np.array([0.5, 0.5]), ['a', 'b'], 0)), 1)
+
+
+class CropApiTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(standin_environment())
+
+    def test_recommends_a_crop(self):
+        response = self.client.post('/api/v1/crop/?k=5', CROP_FIELDS)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(len(result['top_k']), 5)
+        self.assertEqual(result['crop'], result['top_k'][0]['label'])
+        self.assertEqual(result['weather'], {'temperature': 21.0, 'humidity': 82.0, 'source': 'request'})
+
+    def test_accepts_json(self):
+        response = self.client.post('/api/v1/crop/', json.dumps(CROP_FIELDS), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['crop'], self.client.post('/api/v1/crop/', CROP_FIELDS).json()['crop'])
+
+    def test_weather_of_the_city(self):
+        fields = {name: value for name, value in CROP_FIELDS.items() if name not in ('temperature', 'humidity')}
+        response = self.client.post('/api/v1/crop/', dict(fields, city='Pune'))
+        self.assertEqual(response.json()['weather']['source'], 'weather_api')
+
+    def test_rejects_non_finite_input(self):
+        for name in ('N', 'temperature'):
+            for value in ('nan', 'inf', '-Infinity'):
+                response = self.client.post('/api/v1/crop/', dict(CROP_FIELDS, **{name: value}))
+                self.assertEqual(response.status_code, 400, (name, value))
+                self.assertIn(f'{name} must be a finite number', response.json()['error'])
+
+    def test_rejects_missing_and_invalid_fields(self):
+        fields = dict(CROP_FIELDS)
+        del fields['ph']
+        self.assertEqual(self.client.post('/api/v1/crop/', fields).status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/crop/', dict(CROP_FIELDS, K='lots')).status_code, 400)
+        response = self.client.post('/api/v1/crop/', '[1, 2]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_model_unavailable(self):
+        registry.set('crop', None)
+        self.assertEqual(self.client.post('/api/v1/crop/', CROP_FIELDS).status_code, 503)
+
+    def test_get_is_not_allowed(self):
+        self.assertEqual(self.client.get('/api/v1/crop/').status_code, 405)
+
+
+class DiseaseApiTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(standin_environment())
+
+    def test_detects_a_disease(self):
+        response = self.client.post('/api/v1/disease/?k=2',
+                                    {'file': SimpleUploadedFile('leaf.jpg', synthetic_jpeg(256, 256))})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(len(result['top_k']), 2)
+        self.assertEqual(disease_classes[result['class_id']], result['label'])
+        self.assertEqual(result['advice'], f"/api/v1/advice/disease/{result['label']}/")
+
+    def test_no_file(self):
+        self.assertEqual(self.client.post('/api/v1/disease/').status_code, 400)
+
+    def test_class_list(self):
+        self.assertEqual(self.client.get('/api/v1/disease/classes/').json()['classes'], list(disease_classes))
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import numpy as np
+from django.test import TestCase
+
+from .. import views
+from ..batching import BatchingPredictor
+from ..registry import registry
+
+
+class RecordingModel:
+    """Sums each image, remembering the batch shapes it was called with"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def __call__(self, batch):
+        self.batches.append(batch.shape)
+        if self.fail:
+            raise RuntimeError('forward pass failed')
+        return batch.reshape(len(batch), -1).sum(axis=1, keepdims=True)
+
+
+def image(height, width, value):
+    return np.full((3, height, width), value, dtype=np.float32)
+
+
+class BatchingPredictorTests(TestCase):
+
+    def predictor(self, model, **kwargs):
+        predictor = BatchingPredictor(model, **kwargs)
+        self.addCleanup(predictor.close)
+        return predictor
+
+    def test_groups_images_by_shape(self):
+        model = RecordingModel()
+        predictor = self.predictor(model, max_batch_size=8, max_wait_ms=200)
+        images = [image(4, 4, 1), image(4, 8, 2), image(4, 4, 3), image(4, 8, 4), image(4, 4, 5)]
+        futures = [predictor.submit(img) for img in images]
+        results = [float(future.result(timeout=5)[0]) for future in futures]
+        self.assertEqual(results, [float(img.sum()) for img in images])
+        self.assertEqual(sorted(model.batches), [(2, 3, 4, 8), (3, 3, 4, 4)])
+        stats = predictor.stats()
+        self.assertEqual((stats['requests'], stats['batches'], stats['largest_batch']), (5, 2, 3))
+
+    def test_flushes_after_max_wait(self):
+        predictor = self.predictor(RecordingModel(), max_batch_size=16, max_wait_ms=50)
+        started = time.perf_counter()
+        self.assertEqual(float(predictor.predict(image(4, 4, 1), timeout=5)[0]), 48.0)
+        waited = time.perf_counter() - started
+        self.assertGreaterEqual(waited, 0.04)
+        self.assertLess(waited, 2.0)
+        self.assertEqual(predictor.stats()['largest_batch'], 1)
+
+    def test_full_batch_does_not_wait(self):
+        predictor = self.predictor(RecordingModel(), max_batch_size=2, max_wait_ms=5000)
+        started = time.perf_counter()
+        futures = [predictor.submit(image(4, 4, value)) for value in (1, 2)]
+        for future in futures:
+            future.result(timeout=5)
+        self.assertLess(time.perf_counter() - started, 2.0)
+
+    def test_model_errors_reach_every_future_of_the_batch(self):
+        predictor = self.predictor(RecordingModel(fail=True), max_batch_size=4, max_wait_ms=100)
+        futures = [predictor.submit(image(4, 4, value)) for value in (1, 2, 3)]
+        for future in futures:
+            with self.assertRaisesRegex(RuntimeError, 'forward pass failed'):
+                future.result(timeout=5)
+        self.assertEqual(predictor.stats()['errors'], 3)
+        # The worker survives the failure
+        predictor.model = RecordingModel()
+        self.assertEqual(float(predictor.predict(image(4, 4, 1), timeout=5)[0]), 48.0)
+
+    def test_close_serves_queued_requests_and_rejects_new_ones(self):
+        predictor = self.predictor(RecordingModel(), max_batch_size=4, max_wait_ms=100)
+        future = predictor.submit(image(4, 4, 1))
+        threading.Thread(target=predictor.close).start()
+        self.assertEqual(float(future.result(timeout=5)[0]), 48.0)
+        with self.assertRaises(RuntimeError):
+            predictor.submit(image(4, 4, 1))
+
+
+class BatcherMetricsTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(registry.unload, 'disease_batcher')
+
+    def test_reported_once_loaded(self):
+        predictor = BatchingPredictor(RecordingModel(), max_batch_size=4, max_wait_ms=1)
+        self.addCleanup(predictor.close)
+        registry.set('disease_batcher', predictor)
+        predictor.predict(image(4, 4, 1), timeout=5)
+        metrics = {name: value for name, kind, text, value in views.component_metrics()}
+        self.assertEqual(metrics['eagro_disease_batch_requests_total'], 1)
+        self.assertEqual(metrics['eagro_disease_batches_total'], 1)
+        self.assertIn('eagro_disease_batch_latency_avg_seconds', metrics)
+
+    def test_not_loaded_for_metrics(self):
+        registry.unload('disease_batcher')
+        names = [name for name, *_ in views.component_metrics()]
+        self.assertNotIn('eagro_disease_batch_requests_total', names)
+        self.assertFalse(registry.loaded('disease_batcher'))
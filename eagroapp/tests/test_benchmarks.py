@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from PIL import Image
+
+from .. import benchmarks, config, views
+from ..benchdata import percentiles, soil_rows, synthetic_jpeg
+from ..registry import registry
+
+
+class BenchDataTests(TestCase):
+
+    def test_inputs_are_deterministic(self):
+        self.assertEqual(synthetic_jpeg(64, 48, seed=3), synthetic_jpeg(64, 48, seed=3))
+        self.assertNotEqual(synthetic_jpeg(64, 48, seed=3), synthetic_jpeg(64, 48, seed=4))
+        self.assertEqual(Image.open(io.BytesIO(synthetic_jpeg(64, 48))).size, (64, 48))
+        self.assertEqual(soil_rows(5, seed=1).tolist(), soil_rows(5, seed=1).tolist())
+        self.assertEqual(soil_rows(5).shape, (5, 7))
+
+    def test_percentiles(self):
+        timing = percentiles([float(ms) for ms in range(100, 0, -1)])
+        self.assertEqual((timing['min_ms'], timing['p50_ms'], timing['p99_ms']), (1.0, 51.0, 100.0))
+        self.assertAlmostEqual(timing['mean_ms'], 50.5)
+
+
+class CompareTests(TestCase):
+
+    def timing(self, p50):
+        return {'p50_ms': p50}
+
+    def test_reports_slowdowns_over_the_threshold_worst_first(self):
+        baseline = {'a': self.timing(10.0), 'b': self.timing(10.0), 'c': self.timing(10.0)}
+        results = {'a': self.timing(12.0), 'b': self.timing(20.0), 'c': self.timing(14.0), 'new': self.timing(1.0)}
+        regressions = benchmarks.compare(results, baseline, threshold=0.25)
+        self.assertEqual([name for name, *_ in regressions], ['b', 'c'])
+        self.assertEqual(regressions[0][1:], (10.0, 20.0, 2.0))
+
+    def test_ignores_slowdowns_within_timer_noise(self):
+        baseline = {'fast': self.timing(0.01)}
+        self.assertEqual(benchmarks.compare({'fast': self.timing(0.1)}, baseline, min_delta_ms=0.5), [])
+        self.assertEqual(len(benchmarks.compare({'fast': self.timing(0.1)}, baseline, min_delta_ms=0)), 1)
+
+
+class StandinEnvironmentTests(TestCase):
+
+    def test_swaps_and_restores_models_caches_and_settings(self):
+        saved = (config.PREDICTION_CACHE, config.PREDICTION_HISTORY, views.weather_client.url)
+        registry.set('crop', 'trained')
+        self.addCleanup(registry.unload, 'crop')
+        with benchmarks.standin_environment():
+            self.assertNotEqual(registry.get('crop'), 'trained')
+            self.assertFalse(config.PREDICTION_CACHE or config.PREDICTION_HISTORY)
+            self.assertIn('127.0.0.1', views.weather_client.url)
+            self.assertEqual(type(caches['weather']).__name__, 'LocMemCache')
+        self.assertEqual(registry.get('crop'), 'trained')
+        self.assertEqual((config.PREDICTION_CACHE, config.PREDICTION_HISTORY, views.weather_client.url), saved)
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def run_command(self, baseline):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            with open(path, 'w') as f:
+                json.dump({'results': baseline}, f)
+            out = io.StringIO()
+            call_command('benchmark', '--filter', 'fertilizer_lookup', '--iterations', '3',
+                         '--baseline', path, '--min-delta-ms', '0', stdout=out)
+            return out.getvalue()
+
+    def test_passes_against_a_slower_baseline(self):
+        self.assertIn('No regressions', self.run_command({'function.fertilizer_lookup': {'p50_ms': 1000.0}}))
+
+    def test_fails_on_a_regression(self):
+        with self.assertRaises(CommandError):
+            self.run_command({'function.fertilizer_lookup': {'p50_ms': 1e-9}})
+
+    def test_committed_baseline_covers_the_suite(self):
+        path = os.path.join(os.path.dirname(config.__file__), os.pardir, 'benchmarks', 'baseline.json')
+        with open(path) as f:
+            baseline = json.load(f)
+        with benchmarks.standin_environment():
+            names = {name for name, _ in benchmarks.build_suite()}
+        self.assertEqual(set(baseline['results']), names)
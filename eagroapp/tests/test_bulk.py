@@ -0,0 +1,99 @@
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..benchdata import soil_rows
+from ..benchmarks import standin_crop_model, standin_environment
+from ..bulk import CROP_FEATURES, iter_scored_csv, score_block
+
+HEADER = ','.join(CROP_FEATURES) + '\n'
+
+
+class ScoreBlockTests(TestCase):
+
+    def setUp(self):
+        self.model = standin_crop_model()
+
+    def test_matches_row_by_row_predictions(self):
+        frame = pd.DataFrame(soil_rows(50), columns=CROP_FEATURES)
+        result = score_block(self.model, frame, proba=True)
+        self.assertEqual(list(result['prediction']), list(self.model.predict(frame.to_numpy())))
+        probabilities = self.model.predict_proba(frame.to_numpy())
+        np.testing.assert_allclose(result['confidence'], probabilities.max(axis=1).round(4))
+        self.assertEqual(len([c for c in result.columns if c.startswith('proba_')]), len(self.model.classes_))
+        self.assertTrue((result['error'] == '').all())
+
+    def test_column_names_are_matched_loosely(self):
+        frame = pd.DataFrame(soil_rows(3), columns=[f' {name.upper()} ' for name in CROP_FEATURES])
+        self.assertEqual(len(score_block(self.model, frame)), 3)
+
+
+class ScoredCsvTests(TestCase):
+
+    def setUp(self):
+        self.model = standin_crop_model()
+
+    def test_bad_rows_are_reported_not_dropped(self):
+        source = io.StringIO(HEADER +
+                             '90,42,43,21,82,6.5,200\n'
+                             '90,abc,43,21,82,6.5,200\n'
+                             '90,42,43,inf,82,6.5,\n'
+                             '80,40,40,25,80,6.0,150\n')
+        lines = ''.join(iter_scored_csv(self.model, source, chunk_size=2)).splitlines()
+        self.assertEqual(lines[0].split(',')[-3:], ['prediction', 'confidence', 'error'])
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[1].split(',')[-3])
+        self.assertTrue(lines[2].endswith('invalid P'))
+        self.assertTrue(lines[3].endswith('"invalid temperature, rainfall"'))
+        self.assertTrue(lines[4].endswith(','))
+
+    def test_unreadable_later_block_ends_with_an_error_row(self):
+        source = io.StringIO(HEADER + '90,42,43,21,82,6.5,200\n' * 2 + '90,42,43,21,82,6.5,"200\n')
+        chunks = list(iter_scored_csv(self.model, source, chunk_size=2))
+        self.assertEqual(len(chunks), 2)
+        self.assertIn('Could not read the rest of the file', chunks[-1])
+
+    def test_missing_column_fails_up_front(self):
+        with self.assertRaises(ValueError):
+            list(iter_scored_csv(self.model, io.StringIO('N,P\n1,2\n')))
+
+
+class BulkEndpointTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(standin_environment())
+
+    def post(self, content):
+        return self.client.post('/crop-recommendation/bulk/', {
+            'file': SimpleUploadedFile('soil.csv', content.encode(), content_type='text/csv')})
+
+    def test_streams_scored_rows(self):
+        response = self.post(HEADER + '90,42,43,21,82,6.5,200\n' * 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+    def test_missing_column_is_a_400(self):
+        response = self.post('N,P\n1,2\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'missing column', response.content)
+
+
+class ScoreCropsCommandTests(TestCase):
+
+    def test_writes_the_scored_csv(self):
+        with standin_environment(), tempfile.TemporaryDirectory() as directory:
+            source, output = os.path.join(directory, 'in.csv'), os.path.join(directory, 'out.csv')
+            with open(source, 'w') as f:
+                f.write(HEADER + '90,42,43,21,82,6.5,200\n' * 5)
+            call_command('score_crops', source, output, '--chunk-size', '2', stderr=io.StringIO())
+            result = pd.read_csv(output)
+        self.assertEqual(len(result), 5)
+        self.assertTrue(result['prediction'].notna().all())
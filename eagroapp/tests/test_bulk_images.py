@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import tempfile
+from unittest import skipUnless
+
+from django.test import TestCase
+
+from ..benchdata import synthetic_jpeg
+from ..benchmarks import standin_disease_model
+from ..disease import disease_classes
+from ..inference import IMAGE_EXTENSIONS
+from ..registry import TORCH_AVAILABLE
+
+
+class LandscapeFails:
+    """Stand-in disease model that cannot take landscape images"""
+
+    def __init__(self):
+        self.model = standin_disease_model()
+
+    def __call__(self, batch):
+        if batch.shape[-1] > batch.shape[-2]:
+            raise RuntimeError('landscape input')
+        return self.model(batch)
+
+
+@skipUnless(TORCH_AVAILABLE, 'PyTorch is not installed')
+class ClassifyFolderTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, 'leaves')
+        os.makedirs(os.path.join(self.root, 'field'))
+        self.save('a.jpg', synthetic_jpeg(240, 320))
+        self.save('field/b.JPG', synthetic_jpeg(320, 240))
+        self.save('field/c.jpeg', synthetic_jpeg(240, 320, seed=1))
+        self.save('broken.png', b'\x89PNG\r\n\x1a\n truncated')
+        self.save('notes.txt', b'not an image')
+        self.output = os.path.join(directory.name, 'results.csv')
+
+    def save(self, path, content):
+        with open(os.path.join(self.root, path), 'wb') as f:
+            f.write(content)
+
+    def classify(self, model, output=None, format=None, **options):
+        from .. import bulk_images
+        output = output or self.output
+        format = bulk_images.output_format(output, format)
+        paths = bulk_images.relative_paths(self.root, IMAGE_EXTENSIONS)
+        done = bulk_images.finished_paths(output, format)
+        writer = bulk_images.ResultWriter(output, format)
+        try:
+            return bulk_images.classify_folder(
+                model, self.root, [p for p in paths if p not in done], writer, num_workers=0, **options)
+        finally:
+            writer.close()
+
+    def rows(self):
+        with open(self.output, newline='') as f:
+            return {row['path']: row for row in csv.DictReader(f)}
+
+    def test_lists_images_only(self):
+        from ..bulk_images import relative_paths
+        self.assertEqual(relative_paths(self.root, IMAGE_EXTENSIONS),
+                         ['a.jpg', 'broken.png', 'field/b.JPG', 'field/c.jpeg'])
+
+    def test_classifies_every_shape(self):
+        self.assertEqual(self.classify(standin_disease_model()), (3, 1))
+        rows = self.rows()
+        self.assertEqual(sorted(rows), ['a.jpg', 'broken.png', 'field/b.JPG', 'field/c.jpeg'])
+        for path in ('a.jpg', 'field/b.JPG', 'field/c.jpeg'):
+            self.assertIn(rows[path]['class'], disease_classes)
+            self.assertEqual(rows[path]['error'], '')
+        self.assertEqual(rows['broken.png']['class'], '')
+        self.assertTrue(rows['broken.png']['error'])
+
+    def test_failed_group_is_reported_per_image(self):
+        self.assertEqual(self.classify(LandscapeFails()), (2, 2))
+        rows = self.rows()
+        self.assertEqual(rows['field/b.JPG']['error'], 'RuntimeError: landscape input')
+        self.assertEqual(rows['field/b.JPG']['class'], '')
+        # The portrait images of the same DataLoader batch still get a class
+        self.assertIn(rows['a.jpg']['class'], disease_classes)
+        self.assertIn(rows['field/c.jpeg']['class'], disease_classes)
+
+    def test_resumes_after_an_interruption(self):
+        self.classify(standin_disease_model(), batch_size=2)
+        with open(self.output) as f:
+            lines = f.readlines()
+        # Interrupted after the first batch, while writing the second
+        with open(self.output, 'w') as f:
+            f.writelines(lines[:3])
+            f.write(lines[3][:5])
+        self.assertEqual(self.classify(standin_disease_model()), (2, 0))
+        self.assertEqual(len(self.rows()), 4)
+        self.assertEqual(self.classify(standin_disease_model()), (0, 0))
+
+    def test_jsonl_output(self):
+        output = self.output.replace('.csv', '.jsonl')
+        self.classify(standin_disease_model(), output=output)
+        with open(output) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(set(rows[0]), {'path', 'class', 'confidence', 'error'})
@@ -0,0 +1,144 @@
+import asyncio
+import importlib.util
+from unittest import mock, skipUnless
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from .. import caching, views
+from ..caching import acache_call, cache_call
+from ..fragments import ResultPages
+from ..prediction_cache import PredictionCache
+from ..testing import StubMemcachedServer
+from ..weather import WeatherCache
+
+
+def failing_method(name, error=ConnectionError('cache server unavailable')):
+    return mock.Mock(side_effect=error, __name__=name)
+
+
+class CacheCallTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(mock.patch.dict(caching._warned, clear=True))
+        self.print = self.enterContext(mock.patch('builtins.print'))
+        self.clock = self.enterContext(mock.patch('eagroapp.caching.time.monotonic', return_value=1000.0))
+
+    def test_result_or_default(self):
+        self.assertEqual(cache_call(mock.Mock(return_value=3, __name__='get'), 'key'), 3)
+        self.assertEqual(cache_call(failing_method('get'), 'key', default=0), 0)
+        self.assertIsNone(asyncio.run(acache_call(failing_method('aget'), 'key')))
+
+    def test_failures_are_counted(self):
+        before = caching.failures()
+        for _ in range(3):
+            cache_call(failing_method('get'), 'key')
+        asyncio.run(acache_call(failing_method('aset'), 'key', 1))
+        after = caching.failures()
+        self.assertEqual(after['get'] - before.get('get', 0), 3)
+        self.assertEqual(after['aset'] - before.get('aset', 0), 1)
+
+    def test_warns_once_per_interval_per_method(self):
+        for _ in range(5):
+            cache_call(failing_method('get'), 'key')
+        cache_call(failing_method('set'), 'key', 1)
+        self.assertEqual(self.print.call_count, 2)
+        self.clock.return_value += caching.WARNING_INTERVAL
+        cache_call(failing_method('get'), 'key')
+        self.assertEqual(self.print.call_count, 3)
+        self.assertIn('4 more failures since the last warning', self.print.call_args.args[0])
+
+    def test_errors_on_metrics(self):
+        def errors():
+            return dict((name, value) for name, _, _, value in views.component_metrics())['eagro_cache_errors_total']
+
+        before = errors()
+        cache_call(failing_method('get_many'), ['key'])
+        self.assertEqual(errors(), before + 1)
+
+
+@mock.patch('builtins.print', mock.Mock())
+class CacheFailureTests(TestCase):
+    """A failing cache server counts as a miss instead of failing the request"""
+
+    def failing(self, alias):
+        methods = {name: failing_method(name) for name in ('get', 'set', 'get_many', 'set_many')}
+        return mock.patch.multiple(caches[alias], **methods)
+
+    def test_weather_cache(self):
+        with self.failing('weather'):
+            self.assertEqual(WeatherCache('weather').get('Pune', lambda city: (20.0, 50)), (20.0, 50))
+
+    def test_prediction_cache(self):
+        prediction_cache = PredictionCache('predictions')
+        with self.failing('predictions'):
+            self.assertEqual(prediction_cache.get_or_predict(b'image', lambda: [0.1, 0.9]), [0.1, 0.9])
+        self.assertEqual(prediction_cache.stats()['misses'], 1)
+
+    def test_result_pages(self):
+        with self.failing('fragments'):
+            fragment = ResultPages('fragments').get('fertilizer', 'NHigh')
+        self.assertIn(b'nitrogen', fragment.content)
+
+
+class PredictionCacheVersionTests(TestCase):
+
+    def setUp(self):
+        caches['predictions'].clear()
+
+    def test_new_model_version_misses_old_predictions(self):
+        version = [1]
+        predictions = []
+
+        def predict():
+            predictions.append(version[0])
+            return [0.2, 0.8]
+
+        prediction_cache = PredictionCache('predictions', version=lambda: version[0])
+        for _ in range(2):
+            self.assertEqual(prediction_cache.get_or_predict(b'leaf', predict), [0.2, 0.8])
+        version[0] = 2
+        prediction_cache.get_or_predict(b'leaf', predict)
+        self.assertEqual(predictions, [1, 2])
+        # Servers still on the old model keep their entries
+        self.assertEqual(PredictionCache('predictions', version=lambda: 1).get_or_predict(b'leaf', predict),
+                         [0.2, 0.8])
+        self.assertEqual(predictions, [1, 2])
+
+
+@skipUnless(importlib.util.find_spec('pymemcache'), 'pymemcache is not installed')
+class MemcachedTests(TestCase):
+
+    def memcached(self, location):
+        return override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }, 'weather': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': location,
+            'KEY_PREFIX': 'eagro-weather',
+            'OPTIONS': {'connect_timeout': 0.25, 'timeout': 0.25},
+        }})
+
+    def loader(self, city_name):
+        self.calls.append(city_name)
+        return 20.0, 50
+
+    def setUp(self):
+        self.calls = []
+
+    def test_weather_cache_is_shared(self):
+        with StubMemcachedServer() as server, self.memcached(server.location):
+            # Separate caches, as in two app servers, share entries
+            self.assertEqual(WeatherCache('weather').get('Pune', self.loader), (20.0, 50))
+            self.assertEqual(WeatherCache('weather').get(' pune', self.loader), (20.0, 50))
+        self.assertEqual(self.calls, ['Pune'])
+        self.assertGreater(server.commands, 0)
+
+    @mock.patch('builtins.print', mock.Mock())
+    def test_unreachable_server_is_a_miss(self):
+        with StubMemcachedServer() as server:
+            location = server.location
+        with self.memcached(location):
+            self.assertEqual(WeatherCache('weather').get('Pune', self.loader), (20.0, 50))
+            self.assertEqual(WeatherCache('weather').get('Pune', self.loader), (20.0, 50))
+        self.assertEqual(self.calls, ['Pune', 'Pune'])
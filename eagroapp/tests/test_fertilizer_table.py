@@ -0,0 +1,94 @@
+import os
+import tempfile
+import time
+
+from django.test import TestCase
+
+from .. import views
+from ..fertilizer_table import FertilizerTable, recommendation_key
+
+
+class FertilizerTableTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'fertilizer.csv')
+        self.write('Crop,N,P,K\nRice,100,50,50\n Wheat ,80,40.5,40\n')
+
+    def write(self, content, mtime=None):
+        with open(self.path, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_parses_rows_by_crop(self):
+        table = FertilizerTable(self.path)
+        self.assertTrue(table.available)
+        self.assertEqual(table.get('Rice'), (100, 50, 50))
+        self.assertEqual(table.get('Wheat'), (80, 40.5, 40))
+        self.assertIsNone(table.get('Cotton'))
+        self.assertEqual(table.crops(), ['Rice', 'Wheat'])
+
+    def test_reloads_when_the_file_changes(self):
+        table = FertilizerTable(self.path, check_interval=0)
+        self.assertEqual(table.get('Rice'), (100, 50, 50))
+        self.write('Crop,N,P,K\nRice,90,50,50\n', mtime=time.time() + 10)
+        self.assertEqual(table.get('Rice'), (90, 50, 50))
+        self.assertIsNone(table.get('Wheat'))
+
+    def test_checks_the_mtime_at_most_every_interval(self):
+        table = FertilizerTable(self.path, check_interval=60)
+        self.assertEqual(table.get('Rice'), (100, 50, 50))
+        self.write('Crop,N,P,K\nRice,90,50,50\n', mtime=time.time() + 10)
+        self.assertEqual(table.get('Rice'), (100, 50, 50))
+
+    def test_parses_the_file_once(self):
+        table = FertilizerTable(self.path, check_interval=0)
+        table.get('Rice')
+        load = table._load
+        table._load = lambda: self.fail('reloaded an unchanged file')
+        self.assertEqual(table.get('Wheat'), (80, 40.5, 40))
+        table._load = load
+
+    def test_missing_file_is_unavailable(self):
+        table = FertilizerTable(self.path + '.missing')
+        self.assertFalse(table.available)
+        self.assertIsNone(table.get('Rice'))
+
+    def test_shipped_table(self):
+        self.assertTrue(views.fertilizer_table.available)
+        self.assertIn('rice', [crop.lower() for crop in views.fertilizer_table.crops()])
+
+
+class RecommendationKeyTests(TestCase):
+
+    def test_largest_deviation_decides(self):
+        recommended = (100, 50, 50)
+        cases = {
+            (150, 50, 50): 'NHigh', (40, 50, 50): 'Nlow',
+            (100, 90, 50): 'PHigh', (100, 10, 50): 'Plow',
+            (100, 50, 95): 'KHigh', (100, 50, 0): 'Klow',
+        }
+        for (N, P, K), key in cases.items():
+            self.assertEqual(recommendation_key(recommended, N, P, K), key, (N, P, K))
+
+    def test_ties_go_to_the_later_nutrient(self):
+        # As in the original view: equal deviations share a dict key
+        self.assertEqual(recommendation_key((100, 50, 50), 110, 60, 40), 'Klow')
+        self.assertEqual(recommendation_key((100, 50, 50), 100, 50, 50), 'Klow')
+
+
+class FertilizerApiTests(TestCase):
+
+    def test_recommends_advice_for_a_crop(self):
+        crop = views.fertilizer_table.crops()[0]
+        N, P, K = views.fertilizer_table.get(crop)
+        response = self.client.post('/api/v1/fertilizer/', {'crop': crop, 'N': N + 100, 'P': P, 'K': K})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['key'], 'NHigh')
+        self.assertEqual(response.json()['advice'], '/api/v1/advice/fertilizer/NHigh/')
+
+    def test_unknown_crop_is_a_404(self):
+        response = self.client.post('/api/v1/fertilizer/', {'crop': 'Moonflower', 'N': 1, 'P': 1, 'K': 1})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,87 @@
+import numpy as np
+from django.test import TestCase
+from sklearn.ensemble import RandomForestClassifier
+
+from ..benchmarks import standin_crop_model
+from ..bulk import CROP_FEATURES
+from ..forest import FlatForest, flatten, sample_rows
+
+
+class FlatForestTests(TestCase):
+
+    def setUp(self):
+        self.forest = standin_crop_model()
+        self.flat = flatten(self.forest)
+        self.rows = np.random.default_rng(1).uniform(0, 300, size=(600, len(CROP_FEATURES)))
+
+    def test_matches_sklearn(self):
+        for count in (1, 3, 100, 600):
+            rows = self.rows[:count]
+            np.testing.assert_array_equal(self.flat.predict_proba(rows), self.forest.predict_proba(rows))
+            np.testing.assert_array_equal(self.flat.predict(rows), self.forest.predict(rows))
+
+    def test_single_rows_match_sklearn(self):
+        rows = np.vstack([self.rows[:100], sample_rows(self.forest, 100)])
+        expected = self.forest.predict_proba(rows)
+        for i in range(len(rows)):
+            np.testing.assert_array_equal(self.flat.predict_proba(rows[i:i + 1]), expected[i:i + 1])
+
+    def test_values_on_a_threshold(self):
+        # Equal to a threshold goes left, as in sklearn
+        tree = self.forest.estimators_[0].tree_
+        row = self.rows[:1].copy()
+        row[0, tree.feature[0]] = tree.threshold[0]
+        np.testing.assert_array_equal(self.flat.predict_proba(row), self.forest.predict_proba(row))
+
+    def test_nodes_are_grouped_by_feature_and_threshold(self):
+        runs = self.flat._runs
+        self.assertEqual(len(runs), len(CROP_FEATURES) + 1)
+        for j, thresholds in enumerate(self.flat._run_thresholds):
+            self.assertTrue((self.flat._node_feature[runs[j]:runs[j + 1]] == j).all())
+            self.assertTrue((np.diff(thresholds) >= 0).all())
+        # Only leaves follow the runs, and they point at themselves
+        leaves = np.arange(runs[-1], self.flat.n_nodes)
+        np.testing.assert_array_equal(self.flat._node_children.reshape(-1, 2)[leaves].T, [leaves, leaves])
+
+    def test_rejects_what_sklearn_rejects(self):
+        for value in (np.inf, -np.inf, 1e39):
+            row = self.rows[:1].copy()
+            row[0, 2] = value
+            with self.assertRaises(ValueError) as expected, np.errstate(over='ignore'):
+                self.forest.predict_proba(row)
+            with self.assertRaises(ValueError) as raised:
+                self.flat.predict_proba(row)
+            self.assertEqual(str(raised.exception).split('.')[0], str(expected.exception).split('.')[0])
+
+    def test_rejects_the_wrong_number_of_features(self):
+        with self.assertRaises(ValueError):
+            self.flat.predict_proba(self.rows[:1, :3])
+
+    def test_nan_is_handled_as_sklearn_does(self):
+        row = self.rows[:1].copy()
+        row[0, 2] = np.nan
+        if self.flat.allow_nan:
+            np.testing.assert_array_equal(self.flat.predict_proba(row), self.forest.predict_proba(row))
+        else:
+            with self.assertRaises(ValueError):
+                self.flat.predict_proba(row)
+
+    def test_missing_values_follow_sklearn(self):
+        rng = np.random.default_rng(2)
+        features = rng.uniform(0, 100, size=(400, 3))
+        features[rng.random(features.shape) < 0.1] = np.nan
+        labels = rng.integers(0, 3, len(features))
+        forest = RandomForestClassifier(n_estimators=5, max_depth=5, random_state=0).fit(features, labels)
+        flat = flatten(forest)
+        rows = rng.uniform(0, 100, size=(50, 3))
+        rows[rng.random(rows.shape) < 0.3] = np.nan
+        expected = forest.predict_proba(rows)
+        np.testing.assert_array_equal(flat.predict_proba(rows), expected)
+        for i in range(len(rows)):
+            np.testing.assert_array_equal(flat.predict_proba(rows[i:i + 1]), expected[i:i + 1])
+
+    def test_not_a_forest(self):
+        with self.assertRaises(ValueError):
+            flatten(object())
+        with self.assertRaises(ValueError):
+            FlatForest(RandomForestClassifier(n_estimators=2).fit([[0, 1], [1, 0]], [[0, 1], [1, 0]]))
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from .. import views
+from ..benchdata import synthetic_jpeg
+from ..benchmarks import standin_environment
+from ..disease import disease_dic
+from ..fragments import ResultPages
+
+
+class ResultPageTests(TestCase):
+
+    def test_html_result_revalidates_with_etag(self):
+        label = next(iter(disease_dic))
+        response = self.client.get(f'/Crop-disease-prediction/{label}/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age', response['Cache-Control'])
+        response = self.client.get(f'/Crop-disease-prediction/{label}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_fertilizer_result_revalidates_with_etag(self):
+        response = self.client.get('/fertilizer-recommendation/Nlow/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        response = self.client.get('/fertilizer-recommendation/Nlow/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_api_advice_revalidates_with_etag(self):
+        response = self.client.get('/api/v1/advice/fertilizer/NHigh/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['key'], 'NHigh')
+        response = self.client.get('/api/v1/advice/fertilizer/NHigh/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/v1/advice/fertilizer/NHigh/', HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_result_is_404(self):
+        self.assertEqual(self.client.get('/fertilizer-recommendation/Unknown/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/advice/disease/Unknown/').status_code, 404)
+
+
+class PostedResultTests(TestCase):
+    """The page answering a form or upload is not stored by shared caches"""
+
+    def setUp(self):
+        self.enterContext(standin_environment())
+
+    def assertPrivate(self, response):
+        self.assertEqual(response.status_code, 200)
+        cache_control = response['Cache-Control']
+        self.assertIn('private', cache_control)
+        self.assertIn('no-store', cache_control)
+        self.assertNotIn('public', cache_control)
+        self.assertNotIn('max-age', cache_control)
+
+    def test_disease_upload(self):
+        self.assertPrivate(self.client.post(
+            '/Crop-disease-prediction/', {'file': SimpleUploadedFile('leaf.jpg', synthetic_jpeg(256, 256))}))
+
+    def test_fertilizer_form(self):
+        self.assertPrivate(self.client.post('/fertilizer-recommendation/', {
+            'cropname': views.fertilizer_table.crops()[0], 'nitrogen': 500, 'phosphorous': 40, 'pottasium': 40}))
+
+
+class CacheVersioningTests(TestCase):
+
+    def setUp(self):
+        caches['fragments'].clear()
+
+    def test_result_pages_are_shared_and_versioned(self):
+        first = ResultPages('fragments').get('fertilizer', 'NHigh')
+        second = ResultPages('fragments')
+        with mock.patch.object(second, '_render', side_effect=AssertionError('rendered again')):
+            self.assertEqual(second.get('fertilizer', 'NHigh'), first)
+        third = ResultPages('fragments')
+        third._version = second.version() + 1
+        with mock.patch.object(third, '_render', wraps=third._render) as render:
+            self.assertEqual(third.get('fertilizer', 'NHigh'), first)
+        render.assert_called_once()
@@ -0,0 +1,78 @@
+import time
+from unittest import mock
+
+from django.test import TransactionTestCase
+
+from ..history import PredictionRecorder
+from ..models import Prediction
+
+
+class PredictionRecorderTests(TransactionTestCase):
+    """The recorder writes from its own thread, so rows are really committed"""
+
+    def recorder(self, **kwargs):
+        with mock.patch('eagroapp.history.atexit.register') as register:
+            recorder = PredictionRecorder(**kwargs)
+        register.assert_called_once_with(recorder.close)
+        self.addCleanup(recorder.close)
+        return recorder
+
+    def record(self, recorder, count, inputs=None):
+        return [recorder.record('crop', inputs or {'N': i}, 'rice', 1.5) for i in range(count)]
+
+    def wait_for_rows(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while Prediction.objects.count() < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return Prediction.objects.count()
+
+    def test_record_does_not_write(self):
+        recorder = self.recorder(batch_size=10, flush_interval=60)
+        self.record(recorder, 3)
+        self.assertEqual(Prediction.objects.count(), 0)
+        self.assertEqual(recorder.pending(), 3)
+
+    def test_flushes_a_full_batch(self):
+        recorder = self.recorder(batch_size=5, flush_interval=60)
+        self.record(recorder, 4)
+        time.sleep(0.1)
+        self.assertEqual(Prediction.objects.count(), 0)
+        self.record(recorder, 1)
+        self.assertEqual(self.wait_for_rows(5), 5)
+        self.assertEqual(recorder.stats()['batches'], 1)
+
+    def test_flushes_after_the_interval(self):
+        recorder = self.recorder(batch_size=100, flush_interval=0.1)
+        self.record(recorder, 2)
+        self.assertEqual(self.wait_for_rows(2), 2)
+        stats = recorder.stats()
+        self.assertEqual((stats['written'], stats['pending']), (2, 0))
+
+    @mock.patch('builtins.print', mock.Mock())
+    def test_rejected_row_does_not_lose_the_batch(self):
+        recorder = self.recorder(batch_size=10, flush_interval=60)
+        self.record(recorder, 2)
+        # NaN is not valid JSON, so the database refuses this row
+        recorder.record('crop', {'N': float('nan')}, 'rice', 1.5)
+        self.record(recorder, 2)
+        self.assertEqual(recorder.flush(), 4)
+        self.assertEqual(Prediction.objects.count(), 4)
+        stats = recorder.stats()
+        self.assertEqual((stats['written'], stats['failed']), (4, 1))
+
+    def test_full_buffer_drops_new_rows(self):
+        recorder = self.recorder(batch_size=100, flush_interval=60, max_pending=3)
+        self.assertEqual(self.record(recorder, 5), [True, True, True, False, False])
+        stats = recorder.stats()
+        self.assertEqual((stats['recorded'], stats['dropped'], stats['pending']), (3, 2, 3))
+        recorder.flush()
+        self.assertTrue(recorder.record('crop', {}, 'rice', 1.5))
+
+    def test_close_flushes_pending_rows(self):
+        recorder = self.recorder(batch_size=100, flush_interval=60)
+        self.record(recorder, 3)
+        thread = recorder._thread
+        recorder.close()
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(Prediction.objects.count(), 3)
+        self.assertEqual(recorder.pending(), 0)
@@ -0,0 +1,125 @@
+import asyncio
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from .. import config
+from ..benchmarks import standin_environment
+from ..metrics import BUCKETS, Metrics, _current_view, metrics, stage
+
+
+class HistogramTests(TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.describe('eagro_test_seconds', 'Test latencies')
+
+    def samples(self):
+        return dict(line.rsplit(' ', 1) for line in self.metrics.render().splitlines()
+                    if not line.startswith('#'))
+
+    def test_buckets_are_cumulative_and_inclusive(self):
+        labels = (('view', 'crop'),)
+        for value in (0.001, 0.003, 0.003, 0.2, 20.0):
+            self.metrics.observe('eagro_test_seconds', labels, value)
+        samples = self.samples()
+        bucket = 'eagro_test_seconds_bucket{{view="crop",le="{}"}}'.format
+        self.assertEqual(samples[bucket('0.001')], '1')
+        self.assertEqual(samples[bucket('0.0025')], '1')
+        self.assertEqual(samples[bucket('0.005')], '3')
+        self.assertEqual(samples[bucket('0.25')], '4')
+        self.assertEqual(samples[bucket('10.0')], '4')
+        self.assertEqual(samples[bucket('+Inf')], '5')
+        self.assertEqual(samples['eagro_test_seconds_count{view="crop"}'], '5')
+        self.assertAlmostEqual(float(samples['eagro_test_seconds_sum{view="crop"}']), 20.207)
+        self.assertEqual(sum(key.startswith('eagro_test_seconds_bucket') for key in samples), len(BUCKETS) + 1)
+
+    def test_help_and_type_once_per_metric(self):
+        self.metrics.observe('eagro_test_seconds', (('view', 'a'),), 0.1)
+        self.metrics.observe('eagro_test_seconds', (('view', 'b'),), 0.1)
+        text = self.metrics.render()
+        self.assertEqual(text.count('# HELP eagro_test_seconds Test latencies'), 1)
+        self.assertEqual(text.count('# TYPE eagro_test_seconds histogram'), 1)
+
+    def test_label_values_are_escaped(self):
+        self.metrics.observe('eagro_test_seconds', (('view', 'a"b\\c'),), 0.1)
+        self.assertIn('eagro_test_seconds_count{view="a\\"b\\\\c"} 1', self.metrics.render())
+
+    @mock.patch('builtins.print', mock.Mock())
+    def test_collectors(self):
+        self.metrics.add_collector(lambda: [('eagro_things_total', 'counter', 'Things', 3)])
+        self.metrics.add_collector(lambda: 1 / 0)
+        text = self.metrics.render()
+        self.assertIn('# TYPE eagro_things_total counter\neagro_things_total 3\n', text)
+
+
+class StageTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(config, 'METRICS', True))
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def count(self, view, name):
+        key = ('eagro_stage_duration_seconds', (('view', view), ('stage', name)))
+        histogram = metrics._histograms.get(key)
+        return histogram.count if histogram is not None else 0
+
+    def test_labelled_with_the_current_view(self):
+        token = _current_view.set('crop_prediction')
+        try:
+            with stage('weather'):
+                pass
+        finally:
+            _current_view.reset(token)
+        self.assertEqual(self.count('crop_prediction', 'weather'), 1)
+
+    def test_concurrent_tasks_keep_their_own_view(self):
+        async def view(name):
+            _current_view.set(name)
+            await asyncio.sleep(0.01)
+            with stage('weather'):
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            await asyncio.gather(view('crop_prediction'), view('api_crop'), view('api_crop'))
+
+        asyncio.run(scenario())
+        self.assertEqual(self.count('crop_prediction', 'weather'), 1)
+        self.assertEqual(self.count('api_crop', 'weather'), 2)
+
+    def test_disabled_stage_records_nothing(self):
+        with mock.patch.object(config, 'METRICS', False):
+            with stage('weather'):
+                pass
+        self.assertEqual(metrics._histograms, {})
+
+
+class MetricsEndpointTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(standin_environment())
+        self.enterContext(mock.patch.object(config, 'METRICS', True))
+        self.enterContext(override_settings(
+            MIDDLEWARE=['eagroapp.metrics.MetricsMiddleware'] + list(settings.MIDDLEWARE)))
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_requests_and_stages_by_view(self):
+        response = self.client.post('/api/v1/crop/', {
+            'N': 90, 'P': 42, 'K': 43, 'ph': 6.5, 'rainfall': 200, 'city': 'Pune'})
+        self.assertEqual(response.status_code, 200)
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('eagro_request_duration_seconds_count{view="api_crop",method="POST",status="200"} 1', text)
+        self.assertIn('eagro_stage_duration_seconds_count{view="api_crop",stage="weather"} 1', text)
+        self.assertIn('eagro_stage_duration_seconds_count{view="api_crop",stage="predict"} 1', text)
+        self.assertIn('eagro_weather_cache_misses_total', text)
+
+    def test_unmatched_requests(self):
+        self.client.get('/no-such-page/')
+        self.assertIn('view="unmatched",method="GET",status="404"', self.client.get('/metrics').content.decode())
+
+    def test_disabled(self):
+        with mock.patch.object(config, 'METRICS', False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
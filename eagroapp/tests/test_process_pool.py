@@ -0,0 +1,76 @@
+import os
+import tempfile
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from .. import config
+from ..benchdata import synthetic_jpeg
+from ..benchmarks import standin_environment
+from ..disease import disease_classes
+from ..registry import TORCH_AVAILABLE, registry
+
+
+@skipUnless(TORCH_AVAILABLE and os.path.exists(config.DISEASE_MODEL_PATH), 'the disease model is not available')
+class InferencePoolTests(TestCase):
+
+    def setUp(self):
+        from ..process_pool import InferencePool
+        self.pool = InferencePool(size=1, timeout=120)
+        self.addCleanup(self.pool.close)
+        self.image = synthetic_jpeg(256, 256)
+
+    def test_predicts_from_bytes_and_arrays(self):
+        from .. import inference
+        probabilities = self.pool.predict(self.image)
+        self.assertEqual(len(probabilities), len(disease_classes))
+        self.assertAlmostEqual(float(probabilities.sum()), 1.0, places=4)
+        array = np.asarray(inference.prepare(self.image, registry.get('disease')), dtype=np.float32)
+        np.testing.assert_allclose(self.pool.predict(array), probabilities, rtol=1e-4, atol=1e-6)
+
+    def test_dead_process_is_replaced(self):
+        first = self.pool.predict(self.image)
+        self.assertTrue(self.pool.model_loaded)
+        process = self.pool._slots[0].process
+        process.kill()
+        process.join(10)
+        second = self.pool.predict(self.image)
+        np.testing.assert_allclose(second, first, rtol=1e-5)
+        stats = self.pool.stats()
+        self.assertEqual((stats['respawns'], stats['alive']), (1, 1))
+
+    def test_bad_image_is_an_error_not_a_crash(self):
+        with self.assertRaises(RuntimeError):
+            self.pool.predict(b'\xff\xd8\xff not really a jpeg')
+        self.assertEqual(self.pool.stats()['respawns'], 0)
+
+
+@skipUnless(TORCH_AVAILABLE, 'PyTorch is not installed')
+@mock.patch('builtins.print', mock.Mock())
+class MissingModelPoolTests(TestCase):
+
+    def setUp(self):
+        from ..process_pool import InferencePool
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Spawned processes read the settings from the environment
+        self.enterContext(mock.patch.dict(os.environ, {
+            'EAGRO_DISEASE_MODEL_PATH': os.path.join(directory.name, 'missing.pth'),
+            'EAGRO_DISEASE_BACKEND': 'eager',
+            'EAGRO_DISEASE_PRECISION': 'fp32',
+        }))
+        self.pool = InferencePool(size=1, timeout=120)
+        self.addCleanup(self.pool.close)
+
+    def test_fails_fast_without_a_model(self):
+        self.assertIsNone(self.pool.model_loaded)
+        with self.assertRaisesRegex(RuntimeError, 'not available'):
+            self.pool.predict(synthetic_jpeg(64, 64))
+        self.assertIs(self.pool.model_loaded, False)
+        self.enterContext(standin_environment())
+        registry.set('disease_pool', self.pool)
+        response = self.client.post('/api/v1/disease/', {'file': SimpleUploadedFile('leaf.jpg', synthetic_jpeg(64, 64))})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.pool.stats()['requests'], 1)
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+from django.test import TestCase
+
+from .. import config
+from ..disease import disease_classes
+from ..registry import TORCH_AVAILABLE, ModelRegistry, load_fp32_disease_model
+
+
+class ModelRegistryTests(TestCase):
+
+    def setUp(self):
+        self.registry = ModelRegistry()
+        self.calls = []
+
+    def loader(self, value, delay=0.0):
+        def load():
+            self.calls.append(value)
+            time.sleep(delay)
+            return value
+        return load
+
+    def test_loads_on_first_get_only(self):
+        self.registry.register('crop', self.loader('forest'))
+        self.assertFalse(self.registry.loaded('crop'))
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.registry.get('crop'), 'forest')
+        self.assertEqual(self.registry.get('crop'), 'forest')
+        self.assertTrue(self.registry.loaded('crop'))
+        self.assertEqual(self.calls, ['forest'])
+
+    def test_concurrent_gets_load_once(self):
+        self.registry.register('crop', self.loader('forest', delay=0.1))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get('crop')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(results, ['forest'] * 8)
+        self.assertEqual(self.calls, ['forest'])
+
+    def test_models_load_independently(self):
+        # A slow load of one model does not hold up another
+        self.registry.register('disease', self.loader('resnet', delay=0.5))
+        self.registry.register('crop', self.loader('forest'))
+        thread = threading.Thread(target=self.registry.get, args=('disease',))
+        thread.start()
+        time.sleep(0.05)
+        started = time.perf_counter()
+        self.assertEqual(self.registry.get('crop'), 'forest')
+        self.assertLess(time.perf_counter() - started, 0.25)
+        thread.join(2)
+
+    def test_unavailable_model_is_not_reloaded(self):
+        self.registry.register('crop', self.loader(None))
+        self.assertIsNone(self.registry.get('crop'))
+        self.assertIsNone(self.registry.get('crop'))
+        self.assertEqual(self.calls, [None])
+
+    def test_set_and_unload(self):
+        self.registry.register('crop', self.loader('forest'))
+        self.registry.set('crop', 'stand-in')
+        self.assertEqual(self.registry.get('crop'), 'stand-in')
+        self.registry.unload('crop')
+        self.assertFalse(self.registry.loaded('crop'))
+        self.assertEqual(self.registry.get('crop'), 'forest')
+
+    def test_warm_up(self):
+        self.registry.register('crop', self.loader('forest'))
+        self.registry.register('disease', self.loader('resnet'))
+        self.assertEqual(list(self.registry.warm_up(['crop'])), ['crop'])
+        self.assertFalse(self.registry.loaded('disease'))
+        timings = self.registry.warm_up()
+        self.assertEqual(sorted(timings), ['crop', 'disease'])
+        self.assertEqual(self.calls, ['forest', 'resnet'])
+
+
+@skipUnless(TORCH_AVAILABLE, 'PyTorch is not installed')
+@mock.patch('builtins.print', mock.Mock())
+class DiseaseModelLoadingTests(TestCase):
+
+    def setUp(self):
+        import torch
+        from ..nets import ResNet9
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        torch.manual_seed(0)
+        self.model = ResNet9(3, len(disease_classes))
+        self.torch = torch
+
+    def load(self, mmap=True, **save_options):
+        path = os.path.join(self.directory, 'model.pth')
+        self.torch.save(self.model.state_dict(), path, **save_options)
+        with mock.patch.object(config, 'DISEASE_MODEL_PATH', path), \
+                mock.patch.object(config, 'DISEASE_MODEL_MMAP', mmap):
+            return load_fp32_disease_model()
+
+    def assertSameWeights(self, model):
+        self.assertFalse(model.training)
+        loaded = model.state_dict()
+        for name, tensor in self.model.state_dict().items():
+            self.assertFalse(loaded[name].is_meta, name)
+            self.assertTrue(self.torch.equal(loaded[name], tensor), name)
+
+    def test_memory_maps_the_checkpoint(self):
+        self.assertSameWeights(self.load())
+
+    def test_legacy_checkpoint_falls_back_to_loading(self):
+        with mock.patch('builtins.print') as warn:
+            self.assertSameWeights(self.load(_use_new_zipfile_serialization=False))
+        self.assertIn('Could not memory-map', warn.call_args.args[0])
+
+    def test_mmap_disabled(self):
+        self.assertSameWeights(self.load(mmap=False))
+
+    def test_missing_checkpoint(self):
+        with mock.patch.object(config, 'DISEASE_MODEL_PATH', os.path.join(self.directory, 'missing.pth')):
+            self.assertIsNone(load_fp32_disease_model())
@@ -0,0 +1,134 @@
+import json
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+
+from .. import views
+from ..benchmarks import standin_crop_model, standin_environment
+from ..bulk import CROP_FEATURES
+from ..sweep import SweepError, axis_values, build_grid, sweep
+
+BASE = {'N': 90.0, 'P': 42.0, 'K': 43.0, 'temperature': 21.0, 'humidity': 82.0, 'ph': 6.5, 'rainfall': 200.0}
+
+
+class AxisTests(TestCase):
+
+    def test_range(self):
+        feature, values = axis_values({'feature': 'N', 'start': 40, 'stop': 140, 'steps': 11}, BASE)
+        self.assertEqual(feature, 'N')
+        np.testing.assert_array_equal(values, np.arange(40, 141, 10))
+
+    def test_percent_of_the_base_value(self):
+        _, values = axis_values({'feature': 'rainfall', 'percent': [-30, 30], 'steps': 3}, BASE)
+        np.testing.assert_array_equal(values, [140.0, 200.0, 260.0])
+
+    def test_explicit_values(self):
+        _, values = axis_values({'feature': 'ph', 'values': [5.5, 6, 7.25]}, BASE)
+        np.testing.assert_array_equal(values, [5.5, 6.0, 7.25])
+
+    def test_invalid_axes(self):
+        cases = [
+            ('not an axis', 'must be an object'),
+            ({'feature': 'colour', 'values': [1]}, 'Unknown feature'),
+            ({'feature': 'ph', 'values': [[5.5, 6.5], [7.5]]}, 'flat list of numbers'),
+            ({'feature': 'ph', 'values': ['5.5']}, 'flat list of numbers'),
+            ({'feature': 'ph', 'values': [True, 6]}, 'flat list of numbers'),
+            ({'feature': 'ph', 'values': 6.5}, 'flat list of numbers'),
+            ({'feature': 'ph', 'values': []}, 'at least one finite value'),
+            ({'feature': 'ph', 'values': [6.5, float('nan')]}, 'at least one finite value'),
+            ({'feature': 'ph', 'values': list(range(12))}, 'at most 11 values'),
+            ({'feature': 'N', 'start': 0, 'stop': 10, 'steps': 0}, 'steps must be between'),
+            ({'feature': 'N', 'start': 0, 'steps': 3}, 'Invalid N axis'),
+            ({'feature': 'N', 'percent': [10], 'steps': 3}, 'Invalid N axis'),
+        ]
+        for axis, message in cases:
+            with self.assertRaisesRegex(SweepError, message, msg=axis):
+                axis_values(axis, BASE, max_steps=11)
+
+
+class GridTests(TestCase):
+
+    def test_one_axis(self):
+        grid = build_grid(BASE, [('ph', np.array([5.0, 6.0, 7.0]))])
+        self.assertEqual(grid.shape, (3, len(CROP_FEATURES)))
+        np.testing.assert_array_equal(grid[:, CROP_FEATURES.index('ph')], [5.0, 6.0, 7.0])
+        np.testing.assert_array_equal(grid[:, CROP_FEATURES.index('N')], [90.0] * 3)
+
+    def test_two_axes_are_row_major(self):
+        grid = build_grid(BASE, [('N', np.array([1.0, 2.0])), ('rainfall', np.array([10.0, 20.0, 30.0]))])
+        self.assertEqual(grid.shape, (6, len(CROP_FEATURES)))
+        cells = [(row[CROP_FEATURES.index('N')], row[CROP_FEATURES.index('rainfall')]) for row in grid]
+        self.assertEqual(cells, [(1, 10), (1, 20), (1, 30), (2, 10), (2, 20), (2, 30)])
+        np.testing.assert_array_equal(grid[:, CROP_FEATURES.index('ph')], [6.5] * 6)
+
+
+class SweepTests(TestCase):
+
+    def setUp(self):
+        self.model = standin_crop_model()
+
+    def test_matches_row_by_row_predictions(self):
+        axes = [{'feature': 'N', 'start': 0, 'stop': 140, 'steps': 5}, {'feature': 'ph', 'values': [5, 6, 7]}]
+        result = sweep(self.model, BASE, axes)
+        self.assertEqual(np.shape(result['top']), (5, 3))
+        self.assertEqual(np.shape(result['confidence']), (5, 3))
+        self.assertEqual([axis['feature'] for axis in result['axes']], ['N', 'ph'])
+        for i, N in enumerate(result['axes'][0]['values']):
+            for j, ph in enumerate(result['axes'][1]['values']):
+                row = dict(BASE, N=N, ph=ph)
+                expected = self.model.predict([[row[name] for name in CROP_FEATURES]])[0]
+                self.assertEqual(result['crops'][result['top'][i][j]], expected)
+
+    def test_limits(self):
+        with self.assertRaisesRegex(SweepError, 'one or two axes'):
+            sweep(self.model, BASE, [])
+        with self.assertRaisesRegex(SweepError, 'one or two axes'):
+            sweep(self.model, BASE, [{'feature': name, 'values': [1]} for name in ('N', 'P', 'K')])
+        with self.assertRaisesRegex(SweepError, 'different features'):
+            sweep(self.model, BASE, [{'feature': 'N', 'values': [1]}, {'feature': 'N', 'values': [2]}])
+        axes = [{'feature': 'N', 'start': 0, 'stop': 10, 'steps': 10}, {'feature': 'P', 'start': 0, 'stop': 10, 'steps': 10}]
+        with self.assertRaisesRegex(SweepError, 'the limit is 99'):
+            sweep(self.model, BASE, axes, max_cells=99)
+        self.assertEqual(np.shape(sweep(self.model, BASE, axes, max_cells=100)['top']), (10, 10))
+
+
+class SweepApiTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(standin_environment())
+
+    def post(self, body):
+        return self.client.post('/api/v1/crop/sweep/', json.dumps(body), content_type='application/json')
+
+    def test_sweep(self):
+        response = self.post(dict(BASE, axes=[{'feature': 'rainfall', 'percent': [-30, 30], 'steps': 7}]))
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(len(result['top']), 7)
+        self.assertEqual(result['weather_source'], 'request')
+
+    def test_form_encoded_axes(self):
+        fields = dict(BASE, axes=json.dumps([{'feature': 'P', 'values': [10, 20]}]))
+        response = self.client.post('/api/v1/crop/sweep/', fields)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['top']), 2)
+
+    def test_invalid_requests(self):
+        self.assertIn('flat list of numbers', self.post(dict(BASE, axes=[{'feature': 'ph', 'values': [[5, 6]]}])).json()['error'])
+        self.assertEqual(self.post(dict(BASE, N='nan', axes=[{'feature': 'P', 'values': [10]}])).status_code, 400)
+        self.assertEqual(self.post(dict(BASE, axes='not json')).status_code, 400)
+
+    def test_no_city_skips_the_weather_lookup(self):
+        base = {name: value for name, value in BASE.items() if name not in ('temperature', 'humidity')}
+        with mock.patch.object(views, 'weather_fetch') as weather_fetch:
+            for city in (None, '', '  '):
+                body = dict(base, axes=[{'feature': 'P', 'values': [10]}])
+                if city is not None:
+                    body['city'] = city
+                result = self.post(body).json()
+                self.assertEqual(result['weather_source'], 'default')
+                self.assertEqual((result['base']['temperature'], result['base']['humidity']), (25.0, 60.0))
+        weather_fetch.assert_not_called()
+        result = self.post(dict(base, city='Pune', axes=[{'feature': 'P', 'values': [10]}])).json()
+        self.assertEqual(result['weather_source'], 'weather_api')
@@ -0,0 +1,74 @@
+import io
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from PIL import Image
+
+from .. import config
+from ..benchdata import synthetic_jpeg
+from ..benchmarks import standin_environment
+from ..disease import disease_classes
+from ..uploads import header_size, sniff_format
+
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class HeaderTests(TestCase):
+
+    def test_sniffs_supported_formats(self):
+        self.assertEqual(sniff_format(synthetic_jpeg(32, 32)), 'JPEG')
+        self.assertEqual(sniff_format(png(8, 8)), 'PNG')
+        self.assertEqual(sniff_format(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'WEBP')
+        self.assertIsNone(sniff_format(b'RIFF\x00\x00\x00\x00WAVEfmt '))
+        self.assertIsNone(sniff_format(b'%PDF-1.4'))
+
+    def test_reads_the_size_from_a_partial_header(self):
+        image = synthetic_jpeg(640, 480)
+        self.assertEqual(header_size(image[:2048]), (640, 480))
+        self.assertIsNone(header_size(image[:4]))
+
+
+class UploadLimitTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(standin_environment())
+        self.image = synthetic_jpeg(640, 480)
+
+    def upload(self, content, name='leaf.jpg'):
+        return self.client.post('/api/v1/disease/', {'file': SimpleUploadedFile(name, content)})
+
+    def test_accepts_an_image(self):
+        response = self.upload(self.image)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.json()['label'], disease_classes)
+
+    def test_accepts_a_png(self):
+        self.assertEqual(self.upload(png(64, 64), 'leaf.png').status_code, 200)
+
+    def test_rejects_a_file_that_is_too_large(self):
+        with mock.patch.object(config, 'MAX_UPLOAD_BYTES', len(self.image) - 1):
+            response = self.upload(self.image)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('larger than', response.json()['error'])
+
+    def test_rejects_too_many_pixels(self):
+        with mock.patch.object(config, 'MAX_IMAGE_PIXELS', 640 * 480 - 1):
+            response = self.upload(self.image)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('640x480 pixels', response.json()['error'])
+
+    def test_rejects_a_non_image(self):
+        response = self.upload(b'%PDF-1.4 not an image' * 10, 'leaf.pdf')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not a JPEG', response.json()['error'])
+
+    def test_html_form_reports_the_error(self):
+        with mock.patch.object(config, 'MAX_UPLOAD_BYTES', len(self.image) - 1):
+            response = self.client.post('/Crop-disease-prediction/', {'file': SimpleUploadedFile('leaf.jpg', self.image)},
+                                        follow=True)
+        self.assertContains(response, 'larger than')
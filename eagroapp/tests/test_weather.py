@@ -0,0 +1,238 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import AsyncClient, TestCase
+
+from ..benchmarks import standin_environment
+from ..testing import StubWeatherServer
+from ..weather import AsyncWeatherClient, CircuitBreaker, WeatherCache, WeatherClient, normalize_city
+
+
+class WeatherCacheTests(TestCase):
+
+    def setUp(self):
+        self.weather_cache = WeatherCache('weather', ttl=60, stale_ttl=60)
+        self.weather_cache.clear()
+
+    def test_city_names_are_normalised(self):
+        self.assertEqual(normalize_city('  New   Delhi '), 'new delhi')
+        self.assertEqual(self.weather_cache.key('Pune'), self.weather_cache.key(' PUNE'))
+        self.assertNotEqual(self.weather_cache.key('Pune'), self.weather_cache.key('Puné'))
+        # memcached keys are ASCII without spaces
+        self.assertRegex(self.weather_cache.key('São Paulo'), r'^weather:[0-9a-f]{32}$')
+
+    def test_concurrent_misses_share_one_load(self):
+        calls = []
+
+        def loader(city_name):
+            calls.append(city_name)
+            time.sleep(0.2)
+            return 20.0, 50
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda city: self.weather_cache.get(city, loader), ['Pune', ' pune '] * 4))
+        self.assertEqual(results, [(20.0, 50)] * 8)
+        self.assertEqual(calls, ['Pune'])
+        stats = self.weather_cache.stats()
+        self.assertEqual((stats['misses'], stats['coalesced']), (1, 7))
+        self.assertEqual(self.weather_cache.get('PUNE', loader), (20.0, 50))
+        self.assertEqual(self.weather_cache.stats()['hits'], 1)
+
+    def test_async_misses_share_one_load(self):
+        calls = []
+
+        async def loader(city_name):
+            calls.append(city_name)
+            await asyncio.sleep(0.05)
+            return 20.0, 50
+
+        async def scenario():
+            return await asyncio.gather(*(self.weather_cache.aget('Pune', loader) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(scenario()), [(20.0, 50)] * 5)
+        self.assertEqual(calls, ['Pune'])
+
+    def test_entries_expire_after_ttl(self):
+        weather_cache = WeatherCache('weather', ttl=0.05, stale_ttl=60)
+        self.assertEqual(weather_cache.get('Pune', lambda city: (20.0, 50)), (20.0, 50))
+        time.sleep(0.1)
+        self.assertEqual(weather_cache.get('Pune', lambda city: (22.0, 45)), (22.0, 45))
+        self.assertEqual(weather_cache.stats()['misses'], 2)
+
+    def test_stale_entry_served_while_upstream_fails(self):
+        weather_cache = WeatherCache('weather', ttl=0.05, stale_ttl=60)
+        self.assertEqual(weather_cache.get('Pune', lambda city: (20.0, 50)), (20.0, 50))
+        time.sleep(0.1)
+        self.assertEqual(weather_cache.get('Pune', lambda city: None), (20.0, 50))
+        self.assertEqual(weather_cache.stats()['stale'], 1)
+        # A fresh value replaces the stale one once the upstream is back
+        self.assertEqual(weather_cache.get('Pune', lambda city: (22.0, 45)), (22.0, 45))
+
+    def test_failure_without_stale_entry(self):
+        def failing(city_name):
+            raise ConnectionError('upstream down')
+
+        self.assertIsNone(self.weather_cache.get('Nowhere', failing))
+        self.assertEqual(self.weather_cache.stats()['failures'], 1)
+        # Failures are not cached
+        self.assertEqual(self.weather_cache.get('Nowhere', lambda city: (20.0, 50)), (20.0, 50))
+
+    def test_cancelled_async_leader_does_not_strand_followers(self):
+        calls = []
+
+        async def loader(city_name):
+            calls.append(city_name)
+            await asyncio.sleep(0.2)
+            return 20.0, 50
+
+        async def scenario():
+            leader = asyncio.create_task(self.weather_cache.aget('Pune', loader))
+            await asyncio.sleep(0.05)
+            follower = asyncio.create_task(self.weather_cache.aget('Pune', loader))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await asyncio.wait_for(follower, 2)
+
+        self.assertEqual(asyncio.run(scenario()), (20.0, 50))
+        self.assertEqual(calls, ['Pune', 'Pune'])
+        self.assertEqual(self.weather_cache._ainflight, {})
+
+    def test_cancelled_follower_leaves_the_leader_running(self):
+        async def loader(city_name):
+            await asyncio.sleep(0.1)
+            return 20.0, 50
+
+        async def scenario():
+            leader = asyncio.create_task(self.weather_cache.aget('Pune', loader))
+            await asyncio.sleep(0.02)
+            follower = asyncio.create_task(self.weather_cache.aget('Pune', loader))
+            await asyncio.sleep(0.02)
+            follower.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await follower
+            return await asyncio.wait_for(leader, 2)
+
+        self.assertEqual(asyncio.run(scenario()), (20.0, 50))
+
+    def test_interrupted_leader_does_not_strand_followers(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def interrupted(city_name):
+            started.set()
+            release.wait(2)
+            raise KeyboardInterrupt
+
+        def leader():
+            with self.assertRaises(KeyboardInterrupt):
+                self.weather_cache.get('Pune', interrupted)
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        started.wait(2)
+        results = []
+        follower = threading.Thread(
+            target=lambda: results.append(self.weather_cache.get('Pune', lambda city: (21.0, 40))))
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        thread.join(2)
+        follower.join(2)
+        self.assertEqual(results, [(21.0, 40)])
+        self.assertEqual(self.weather_cache._inflight, {})
+
+
+class CircuitBreakerTests(TestCase):
+
+    def test_opens_and_lets_one_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        # A failed trial opens it again straight away
+        breaker.failure()
+        self.assertEqual(breaker.state, 'open')
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertTrue(breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        self.assertEqual(breaker.state, 'closed')
+
+
+class WeatherClientTests(TestCase):
+
+    def test_parses_weather(self):
+        with StubWeatherServer(temperature=30.0, humidity=55) as server:
+            client = WeatherClient(url=server.url, api_key='test')
+            self.assertEqual(client.fetch('Pune'), (30.0, 55))
+            self.assertEqual(client.fetch('Nashik'), (30.0, 55))
+        self.assertEqual(client.stats()['requests'], 2)
+
+    @mock.patch('builtins.print', mock.Mock())
+    def test_retries_then_gives_up(self):
+        with StubWeatherServer(fail=True) as server:
+            client = WeatherClient(url=server.url, api_key='test', retries=2, backoff=0.0)
+            self.assertIsNone(client.fetch('Pune'))
+            self.assertEqual(server.calls, 3)
+        stats = client.stats()
+        self.assertEqual((stats['retries'], stats['failures']), (2, 1))
+
+    @mock.patch('builtins.print', mock.Mock())
+    def test_stops_calling_a_failing_upstream(self):
+        with StubWeatherServer(fail=True) as server:
+            client = WeatherClient(url=server.url, api_key='test', retries=1, backoff=0.0,
+                                   failure_threshold=2, reset_timeout=60)
+            for _ in range(4):
+                self.assertIsNone(client.fetch('Pune'))
+            self.assertEqual(server.calls, 4)
+            stats = client.stats()
+        self.assertEqual(stats['short_circuited'], 2)
+        self.assertEqual(stats['circuit'], 'open')
+
+    @mock.patch('builtins.print', mock.Mock())
+    def test_async_client_shares_the_breaker(self):
+        with StubWeatherServer(fail=True) as server:
+            client = WeatherClient(url=server.url, api_key='test', retries=0, backoff=0.0,
+                                   failure_threshold=1, reset_timeout=60)
+            async_client = AsyncWeatherClient(client)
+            self.assertIsNone(asyncio.run(async_client.fetch('Pune')))
+            self.assertIsNone(client.fetch('Pune'))
+            self.assertEqual(server.calls, 1)
+        self.assertEqual(client.stats()['short_circuited'], 1)
+
+    def test_async_client_parses_weather(self):
+        with StubWeatherServer(temperature=30.0, humidity=55) as server:
+            async_client = AsyncWeatherClient(WeatherClient(url=server.url, api_key='test'))
+            self.assertEqual(asyncio.run(async_client.fetch('Pune')), (30.0, 55))
+
+
+class AsyncCropViewTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(standin_environment())
+
+    def test_matches_the_sync_view(self):
+        form = {'nitrogen': 90, 'phosphorous': 42, 'pottasium': 43, 'ph': 6.5,
+                'rainfall': 200, 'city': 'Pune'}
+        response = asyncio.run(AsyncClient().post('/crop-recommendation/async/', form))
+        self.assertEqual(response.status_code, 200)
+        expected = self.client.post('/crop-recommendation/', form)
+        self.assertEqual(response.context['prediction'], expected.context['prediction'])
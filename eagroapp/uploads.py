@@ -0,0 +1,146 @@
+"""
+Size-bounded streaming of image uploads.
+
+ImageUploadHandler sits in front of Django's memory and temporary-file
+upload handlers. It checks the magic bytes and the dimensions stored in
+the image header as the first chunks arrive. It also counts the bytes
+received, so an oversized file, a non-image or a decompression bomb is
+skipped before the rest of it is stored. Accepted files are kept in
+memory up to FILE_UPLOAD_MAX_MEMORY_SIZE and spooled to a temporary
+file above that. The decoder then reads them from the file.
+"""
+import io
+import warnings
+from functools import wraps
+
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+from . import config
+
+# Leading bytes of the formats the disease model accepts
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'BM', 'BMP'),
+    (b'RIFF', 'WEBP'),
+)
+
+# Bytes buffered while waiting for the header to reveal the image size
+HEADER_BYTES = 64 * 1024
+
+
+def sniff_format(head):
+    """
+    Image format from the first bytes of a file
+    :params: head (bytes)
+    :return: format name, or None when it is not a supported image
+    """
+    for signature, name in SIGNATURES:
+        if head.startswith(signature):
+            if name == 'WEBP' and head[8:12] != b'WEBP':
+                return None
+            return name
+    return None
+
+
+def header_size(head):
+    """
+    Image dimensions parsed from a (possibly partial) file header
+    :params: head (bytes)
+    :return: (width, height), or None when the header is incomplete
+    """
+    try:
+        with warnings.catch_warnings():
+            # MAX_IMAGE_PIXELS is enforced by the caller
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            return Image.open(io.BytesIO(head)).size
+    except Exception:
+        return None
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Rejects files over MAX_UPLOAD_BYTES or MAX_IMAGE_PIXELS, or that are not
+    images, while they stream in. The reason is left in
+    request.image_upload_error and the file is dropped from request.FILES.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.head = b''
+        self.checked = False
+        if self.content_length and self.content_length > config.MAX_UPLOAD_BYTES:
+            self.reject(too_large_message())
+
+    def reject(self, message):
+        self.request.image_upload_error = message
+        raise SkipFile(message)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > config.MAX_UPLOAD_BYTES:
+            self.reject(too_large_message())
+        if not self.checked:
+            self.head += raw_data[:HEADER_BYTES - len(self.head)]
+            self.check_header(final=len(self.head) >= HEADER_BYTES)
+        return raw_data
+
+    def check_header(self, final=False):
+        if len(self.head) < 12 and not final:
+            return
+        if sniff_format(self.head) is None:
+            self.reject('The uploaded file is not a JPEG, PNG, BMP or WebP image.')
+        size = header_size(self.head)
+        if size is None:
+            # The size is checked again when the image is decoded
+            self.checked = final
+            return
+        self.checked = True
+        self.head = b''
+        if size[0] * size[1] > config.MAX_IMAGE_PIXELS:
+            self.reject(f'The image is {size[0]}x{size[1]} pixels; the limit is '
+                        f'{config.MAX_IMAGE_PIXELS // 1000000} megapixels.')
+
+    def file_complete(self, file_size):
+        # Let the memory / temporary-file handlers build the uploaded file
+        return None
+
+
+def too_large_message():
+    return f'The uploaded file is larger than {config.MAX_UPLOAD_BYTES // (1024 * 1024)} MB.'
+
+
+def upload_error(request):
+    """
+    Why ImageUploadHandler dropped an uploaded file
+    :params: request
+    :return: message, or None when nothing was rejected
+    """
+    # Reading FILES parses the body, running the handler
+    request.FILES
+    return getattr(request, 'image_upload_error', None)
+
+
+def bounded_image_uploads(view=None, csrf=True):
+    """
+    Decorator streaming a view's file uploads through ImageUploadHandler.
+    The handler has to be installed before anything reads request.POST, so
+    the CSRF check (when enabled) runs inside the wrapper instead of in
+    CsrfViewMiddleware.
+    """
+    def decorator(view):
+        inner = csrf_protect(view) if csrf else view
+
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.upload_handlers.insert(0, ImageUploadHandler(request))
+            return inner(request, *args, **kwargs)
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
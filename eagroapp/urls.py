@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, config, views
 
 urlpatterns = [
 	path('', views.welcome, name='welcome'),  # Landing page
@@ -7,12 +7,25 @@ urlpatterns = [
     path('about/',views.about,name='about'),
     path('contact/',views.contact,name='contact'),
     path('crop',views.crop_recommend,name='crop'),
-    path('crop-recommendation/',views.crop_prediction,name='crop_prediction'),
+    path('crop-recommendation/',views.crop_prediction_async if config.ASYNC_VIEWS else views.crop_prediction,name='crop_prediction'),
+    path('crop-recommendation/async/',views.crop_prediction_async,name='crop_prediction_async'),
+    path('crop-recommendation/bulk/',views.crop_prediction_bulk,name='crop_prediction_bulk'),
     path('fertilizer',views.fertilizer_recommendation,name='fertilizer'),
     path('fertilizer-recommendation/',views.fert_recommend,name='fert_recommend'),
+    path('fertilizer-recommendation/<str:key>/',views.fertilizer_result,name='fertilizer_result'),
     path('Crop-disease/',views.disease,name='disease'),
     path('Crop-disease-prediction/',views.disease_prediction,name='disease_prediction'),
+    path('Crop-disease-prediction/<str:label>/',views.disease_result,name='disease_result'),
 	path('user-login/', views.userlogin, name='userlogin'),
     path('user-signup/', views.usersignup, name='usersignup'),
 	path('logout/', views.logout_view, name='logout'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
+    # JSON API for the mobile app
+    path('api/v1/crop/', api.crop, name='api_crop'),
+    path('api/v1/crop/sweep/', api.crop_sweep, name='api_crop_sweep'),
+    path('api/v1/disease/', api.disease, name='api_disease'),
+    path('api/v1/disease/classes/', api.disease_classes_list, name='api_disease_classes'),
+    path('api/v1/fertilizer/', api.fertilizer, name='api_fertilizer'),
+    path('api/v1/advice/disease/<str:label>/', api.disease_advice, name='api_disease_advice'),
+    path('api/v1/advice/fertilizer/<str:key>/', api.fertilizer_advice, name='api_fertilizer_advice'),
 ]
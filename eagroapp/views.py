@@ -1,13 +1,24 @@
 from django.shortcuts import redirect, render
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.views.decorators.http import etag, require_GET, require_POST
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from markupsafe import Markup
-import requests
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
-from .models import User, ResNet9
-from django.contrib.auth import authenticate, login
-from .disease import disease_dic
-from .fertilizer import fertilizer_dic
+from .models import User, TORCH_AVAILABLE
+from django.contrib.auth import SESSION_KEY, authenticate, login
+from django.db import IntegrityError
+from django.db.models import Q
+from .disease import disease_classes
+from .fertilizer_table import FertilizerTable, recommendation_key
+from .fragments import result_pages
+from .history import PredictionRecorder
+from .metrics import metrics, stage
+from .prediction_cache import PredictionCache, content_hash
+from .registry import disease_model_version, registry
+from .weather import AsyncWeatherClient, WeatherCache, WeatherClient
+from .uploads import bounded_image_uploads, upload_error
+from . import bulk, caching, config, inference
 
 # Welcome page view
 def welcome(request):
@@ -19,91 +30,116 @@ def home(request):
     """Main application home page"""
     return render(request, 'index.html')
 import numpy as np
-import pandas as pd
 from datetime import datetime
-import pickle
-import io
 import os
-
-# Optional PyTorch imports
-try:
-    import torch
-    from torchvision import transforms
-    TORCH_AVAILABLE = True
-except ImportError:
-    TORCH_AVAILABLE = False
-    torch = None
-    transforms = None
-
-from PIL import Image
+import time
 
 # Get the base directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-crop_recommendation_model_path = os.path.join(BASE_DIR, 'models', 'RandomForest.pkl')
-if os.path.exists(crop_recommendation_model_path):
-    crop_recommendation_model = pickle.load(
-        open(crop_recommendation_model_path, 'rb'))
-else:
-    crop_recommendation_model = None
-    print(f"Warning: Crop recommendation model not found at {crop_recommendation_model_path}")
-
-# Loading plant disease classification model
-
-disease_classes = ['Apple___Apple_scab',
-                   'Apple___Black_rot',
-                   'Apple___Cedar_apple_rust',
-                   'Apple___healthy',
-                   'Blueberry___healthy',
-                   'Cherry_(including_sour)___Powdery_mildew',
-                   'Cherry_(including_sour)___healthy',
-                   'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot',
-                   'Corn_(maize)___Common_rust_',
-                   'Corn_(maize)___Northern_Leaf_Blight',
-                   'Corn_(maize)___healthy',
-                   'Grape___Black_rot',
-                   'Grape___Esca_(Black_Measles)',
-                   'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)',
-                   'Grape___healthy',
-                   'Orange___Haunglongbing_(Citrus_greening)',
-                   'Peach___Bacterial_spot',
-                   'Peach___healthy',
-                   'Pepper,_bell___Bacterial_spot',
-                   'Pepper,_bell___healthy',
-                   'Potato___Early_blight',
-                   'Potato___Late_blight',
-                   'Potato___healthy',
-                   'Raspberry___healthy',
-                   'Soybean___healthy',
-                   'Squash___Powdery_mildew',
-                   'Strawberry___Leaf_scorch',
-                   'Strawberry___healthy',
-                   'Tomato___Bacterial_spot',
-                   'Tomato___Early_blight',
-                   'Tomato___Late_blight',
-                   'Tomato___Leaf_Mold',
-                   'Tomato___Septoria_leaf_spot',
-                   'Tomato___Spider_mites Two-spotted_spider_mite',
-                   'Tomato___Target_Spot',
-                   'Tomato___Tomato_Yellow_Leaf_Curl_Virus',
-                   'Tomato___Tomato_mosaic_virus',
-                   'Tomato___healthy']
-
-# disease prediction
-disease_model_path = os.path.join(BASE_DIR, 'models', 'plant_disease_model.pth')
-if TORCH_AVAILABLE and os.path.exists(disease_model_path):
-    disease_model = ResNet9(3, len(disease_classes))
-    disease_model.load_state_dict(torch.load(
-        disease_model_path, map_location=torch.device('cpu')))
-    disease_model.eval()
-else:
-    disease_model = None
-    if not TORCH_AVAILABLE:
-        print("Warning: PyTorch is not installed. Disease detection will not work.")
-    else:
-        print(f"Warning: Disease detection model not found at {disease_model_path}")
+# The crop and disease models are loaded on first use through
+# eagroapp.registry, so importing this module stays cheap.
+
+# Per-city weather shared by all crop predictions, through the weather cache
+weather_client = WeatherClient(
+    connect_timeout=config.WEATHER_CONNECT_TIMEOUT,
+    read_timeout=config.WEATHER_READ_TIMEOUT,
+    retries=config.WEATHER_RETRIES,
+    pool_size=config.WEATHER_POOL_SIZE,
+    failure_threshold=config.WEATHER_BREAKER_THRESHOLD,
+    reset_timeout=config.WEATHER_BREAKER_RESET)
+if not weather_client.api_key:
+    # No key ships with the code; say so once per process rather than
+    # letting every crop prediction fall back without a trace
+    print("Warning: OPENWEATHER_API_KEY is not set. Weather lookups will fail and crop "
+          "predictions will use the default temperature and humidity.")
+async_weather_client = AsyncWeatherClient(
+    weather_client, pool_size=config.WEATHER_ASYNC_POOL_SIZE)
+weather_cache = WeatherCache(
+    config.WEATHER_CACHE_ALIAS,
+    ttl=config.WEATHER_CACHE_TTL,
+    stale_ttl=config.WEATHER_CACHE_STALE_TTL)
+
+# Crop -> recommended N, P, K levels, parsed once and reloaded when the CSV changes
+fertilizer_table = FertilizerTable(os.path.join(BASE_DIR, 'Data', 'fertilizer.csv'))
+# Disease predictions keyed by image content and model version, so re-uploads skip the model
+prediction_cache = PredictionCache(
+    config.PREDICTION_CACHE_ALIAS,
+    perceptual=config.PREDICTION_CACHE_PERCEPTUAL,
+    version=disease_model_version)
+# Prediction history, written to the database in batches off the request path
+prediction_log = PredictionRecorder(
+    batch_size=config.PREDICTION_HISTORY_BATCH_SIZE,
+    flush_interval=config.PREDICTION_HISTORY_FLUSH_INTERVAL,
+    max_pending=config.PREDICTION_HISTORY_MAX_PENDING)
+
+
+def batcher_metrics():
+    """Counters of the disease micro-batcher, once it has been loaded"""
+    # registry.get() would load the model just to report on it
+    batcher = registry.get('disease_batcher') if registry.loaded('disease_batcher') else None
+    if batcher is None:
+        return []
+    batching = batcher.stats()
+    return [
+        ('eagro_disease_batch_requests_total', 'counter', 'Disease images predicted by the batcher',
+         batching['requests']),
+        ('eagro_disease_batches_total', 'counter', 'Batched disease forward passes', batching['batches']),
+        ('eagro_disease_batch_errors_total', 'counter', 'Batched disease images that failed', batching['errors']),
+        ('eagro_disease_batch_queue_depth', 'gauge', 'Disease images waiting for a batch', batching['queue_depth']),
+        ('eagro_disease_batch_size_avg', 'gauge', 'Average images per batched forward pass',
+         batching['avg_batch_size']),
+        ('eagro_disease_batch_latency_avg_seconds', 'gauge', 'Average wait plus forward pass per image',
+         batching['avg_latency_ms'] / 1000.0),
+        ('eagro_disease_batch_latency_max_seconds', 'gauge', 'Longest wait plus forward pass of an image',
+         batching['max_latency_ms'] / 1000.0),
+        ('eagro_disease_batch_throughput', 'gauge', 'Disease images predicted per second since start',
+         batching['throughput_per_s']),
+    ]
+
+
+def component_metrics():
+    """Counters kept by the caches, the batcher and the prediction log, for /metrics"""
+    cache = prediction_cache.stats()
+    weather = weather_cache.stats()
+    history = prediction_log.stats()
+    return batcher_metrics() + [
+        ('eagro_prediction_cache_hits_total', 'counter', 'Disease predictions answered from the cache',
+         cache['hits'] + cache['perceptual_hits']),
+        ('eagro_prediction_cache_misses_total', 'counter', 'Disease predictions that ran the model', cache['misses']),
+        ('eagro_weather_cache_hits_total', 'counter', 'Weather lookups answered from the cache', weather['hits']),
+        ('eagro_weather_cache_misses_total', 'counter', 'Weather lookups that called the API', weather['misses']),
+        ('eagro_weather_cache_stale_total', 'counter', 'Weather lookups answered with stale data', weather['stale']),
+        ('eagro_prediction_log_written_total', 'counter', 'Prediction log rows written', history['written']),
+        ('eagro_prediction_log_dropped_total', 'counter', 'Prediction log rows dropped', history['dropped']),
+        ('eagro_prediction_log_pending', 'gauge', 'Prediction log rows waiting to be written', history['pending']),
+        ('eagro_cache_errors_total', 'counter', 'Cache server calls that failed and counted as a miss',
+         sum(caching.failures().values())),
+    ]
+
+
+metrics.add_collector(component_metrics)
+
+
+def log_prediction(request, kind, inputs, output, started, user_id=None):
+    """
+    Queues a prediction for the history table
+    :params: request, kind, inputs (dict), output, started (perf_counter()
+             when the request began), user_id (read from the session when
+             not given; the user row itself is never loaded)
+    """
+    if not config.PREDICTION_HISTORY:
+        return
+    if user_id is None:
+        user_id = request.session.get(SESSION_KEY)
+    prediction_log.record(kind, inputs, output, (time.perf_counter() - started) * 1000.0, user_id)
 
 
+def image_inputs(img):
+    """History inputs of an uploaded image: its hash and size"""
+    size = len(img) if isinstance(img, (bytes, bytearray)) else img.size
+    return {'sha256': content_hash(img), 'bytes': size}
+
 def index(request):
     return render(request, 'index.html')
 
@@ -141,18 +177,19 @@ def usersignup(request):
             messages.error(request, 'Passwords do not match. Please try again.')
             return render(request, 'usersignup.html')
         
-        # Check if username already exists
-        if User.objects.filter(username=username).exists():
-            messages.error(request, f'Username "{username}" is already taken. Please choose a different username.')
-            return render(request, 'usersignup.html')
-        
-        # Check if email already exists
-        if User.objects.filter(email=email).exists():
-            messages.error(request, f'Email "{email}" is already registered. Please use a different email or try logging in.')
+        # Check username and email in one query
+        taken = User.objects.filter(Q(username=username) | Q(email=email)).values_list('username', flat=True)[:1]
+        if taken:
+            if taken[0] == username:
+                messages.error(request, f'Username "{username}" is already taken. Please choose a different username.')
+            else:
+                messages.error(request, f'Email "{email}" is already registered. Please use a different email or try logging in.')
             return render(request, 'usersignup.html')
 
         try:
-            user = User.objects.create_user(
+            # create_user saves the user; a concurrent signup with the same
+            # username surfaces as an IntegrityError on the unique index
+            User.objects.create_user(
                 username=username, 
                 last_name=last_name, 
                 first_name=first_name, 
@@ -160,9 +197,11 @@ def usersignup(request):
                 email=email, 
                 is_user=True
             )
-            user.save()
             messages.success(request, 'Account created successfully! You can now login.')
             return redirect('userlogin')
+        except IntegrityError:
+            messages.error(request, f'Username "{username}" is already taken. Please choose a different username.')
+            return render(request, 'usersignup.html')
         except Exception as e:
             messages.error(request, f'Error creating account: {str(e)}. Please try again.')
             return render(request, 'usersignup.html')
@@ -184,35 +223,32 @@ def fertilizer_recommendation(request):
 def disease(request):
     return render(request, 'disease.html')
 
+def crop_inputs(data, city):
+    """
+    History inputs of a crop prediction. NaN and infinities, which JSON
+    cannot hold, are stored as null.
+    """
+    names = ('N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall')
+    values = (float(value) if np.isfinite(value) else None for value in data[0])
+    return dict(zip(names, values), city=city)
+
+
 def weather_fetch(city_name):
     """
     Fetch and returns the temperature and humidity of a city
     :params: city_name
     :return: temperature, humidity
     """
-    try:
-        url = f'http://api.openweathermap.org/data/2.5/weather?q={city_name}&appid=9d7cde1f6d07ec55650544be1631307e'
-        response = requests.get(url, timeout=10)
-        x = response.json()
-
-        # Check if request was successful
-        if response.status_code == 200 and "main" in x:
-            y = x["main"]
-            temperature = round((y["temp"] - 273.15), 2)
-            humidity = y["humidity"]
-            return temperature, humidity
-        else:
-            # API returned an error (invalid key, city not found, etc.)
-            return None
-    except (requests.RequestException, KeyError, ValueError) as e:
-        # Handle network errors, missing keys, or JSON parsing errors
-        print(f"Weather API error: {e}")
-        return None
+    with stage('weather'):
+        return weather_cache.get(city_name, weather_client.fetch)
 
 
 def crop_prediction(request):
 
     if request.method == 'POST':
+        started = time.perf_counter()
+        with stage('model_lookup'):
+            crop_recommendation_model = registry.get('crop')
         if crop_recommendation_model is None:
             messages.error(request, 'Crop recommendation model is not available. Please add the model file.')
             return render(request, 'crop.html')
@@ -233,11 +269,13 @@ def crop_prediction(request):
             if weather_data != None:
                 temperature, humidity = weather_data
                 data = np.array([[N, P, K, temperature, humidity, ph, rainfall]])
-                my_prediction = crop_recommendation_model.predict(data)
-                print(my_prediction)
+                with stage('predict'):
+                    my_prediction = crop_recommendation_model.predict(data)
                 final_prediction = my_prediction[0]
+                log_prediction(request, 'crop', crop_inputs(data, city), final_prediction, started)
 
-                return render(request, 'crop-result.html', context={"prediction":final_prediction})
+                with stage('render'):
+                    return render(request, 'crop-result.html', context={"prediction":final_prediction})
             else:
                 # Weather API failed - use default values for temperature and humidity
                 # Default: 25°C temperature, 60% humidity (typical agricultural conditions)
@@ -246,58 +284,193 @@ def crop_prediction(request):
                 messages.warning(request, f'Could not fetch weather data for {city}. Using default values (Temperature: {temperature}°C, Humidity: {humidity}%).')
                 
                 data = np.array([[N, P, K, temperature, humidity, ph, rainfall]])
-                my_prediction = crop_recommendation_model.predict(data)
-                print(my_prediction)
+                with stage('predict'):
+                    my_prediction = crop_recommendation_model.predict(data)
                 final_prediction = my_prediction[0]
+                log_prediction(request, 'crop', crop_inputs(data, city), final_prediction, started)
 
-                return render(request, 'crop-result.html', context={"prediction":final_prediction})
+                with stage('render'):
+                    return render(request, 'crop-result.html', context={"prediction":final_prediction})
         except (ValueError, KeyError) as e:
             messages.error(request, f'Invalid input data. Please check your values and try again.')
             return render(request, 'crop.html')
 
 
+async def aweather_fetch(city_name):
+    """
+    Non-blocking weather_fetch sharing the same per-city cache
+    :params: city_name
+    :return: temperature, humidity
+    """
+    with stage('weather'):
+        return await weather_cache.aget(city_name, async_weather_client.fetch)
+
+
+async def crop_prediction_async(request):
+    """
+    ASGI version of crop_prediction: the weather lookup is awaited and the
+    RandomForest predict runs in a thread pool, so the event loop can hold
+    many in-flight lookups at once
+    """
+    # Template context processors may hit the session/user tables
+    arender = sync_to_async(render)
+
+    if request.method != 'POST':
+        return await arender(request, 'crop.html')
+    started = time.perf_counter()
+    if registry.loaded('crop'):
+        crop_recommendation_model = registry.get('crop')
+    else:
+        # First use: unpickle the forest off the event loop
+        crop_recommendation_model = await sync_to_async(registry.get, thread_sensitive=False)('crop')
+    if crop_recommendation_model is None:
+        messages.error(request, 'Crop recommendation model is not available. Please add the model file.')
+        return await arender(request, 'crop.html')
+
+    try:
+        N = int(request.POST['nitrogen'])
+        P = int(request.POST['phosphorous'])
+        K = int(request.POST['pottasium'])
+        ph = float(request.POST['ph'])
+        rainfall = float(request.POST['rainfall'])
+    except (ValueError, KeyError):
+        messages.error(request, f'Invalid input data. Please check your values and try again.')
+        return await arender(request, 'crop.html')
+
+    city = request.POST.get("city")
+    weather_data = await aweather_fetch(city)
+    if weather_data is not None:
+        temperature, humidity = weather_data
+    else:
+        # Weather API failed - use default values for temperature and humidity
+        temperature = 25.0
+        humidity = 60.0
+        messages.warning(request, f'Could not fetch weather data for {city}. Using default values (Temperature: {temperature}°C, Humidity: {humidity}%).')
+
+    data = np.array([[N, P, K, temperature, humidity, ph, rainfall]])
+    with stage('predict'):
+        my_prediction = await sync_to_async(
+            crop_recommendation_model.predict, thread_sensitive=False)(data)
+    final_prediction = my_prediction[0]
+    log_prediction(request, 'crop', crop_inputs(data, city), final_prediction, started,
+                   user_id=await request.session.aget(SESSION_KEY))
+    with stage('render'):
+        return await arender(request, 'crop-result.html', context={"prediction": final_prediction})
+
+
+@require_POST
+def crop_prediction_bulk(request):
+    """
+    Scores an uploaded soil-test CSV (N, P, K, temperature, humidity, ph,
+    rainfall columns) and streams the rows back with predictions
+    """
+    crop_recommendation_model = registry.get('crop')
+    if crop_recommendation_model is None:
+        return HttpResponseBadRequest('Crop recommendation model is not available.')
+    if 'file' not in request.FILES:
+        return HttpResponseBadRequest('No CSV file was uploaded.')
+
+    upload = request.FILES['file']
+    rows = bulk.iter_scored_csv(
+        crop_recommendation_model, upload,
+        chunk_size=config.CROP_BULK_CHUNK_SIZE,
+        n_jobs=config.CROP_BULK_N_JOBS,
+        proba=request.POST.get('proba') == '1')
+    try:
+        # Score the first chunk eagerly so bad input is reported as a 400
+        first = next(rows, '')
+    except (ValueError, KeyError) as e:
+        return HttpResponseBadRequest(f'Invalid CSV: {e}')
+
+    def stream():
+        yield first
+        yield from rows
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="crop-predictions.csv"'
+    return response
+
+
 def predict_image(img, model=None):
     """
     Transforms image to tensor and predicts disease label
-    :params: image
+    :params: image (bytes or uploaded file), model (default: the
+             registry's disease model, with cached predictions)
     :return: prediction (string)
     """
-    if not TORCH_AVAILABLE:
+    probabilities = disease_probabilities(img, model)
+    if probabilities is None:
         return None
-        
+    # Pick index with highest probability
+    return disease_classes[int(probabilities.argmax())]
+
+
+def disease_probabilities(img, model=None):
+    """
+    Softmax probabilities of every disease class
+    :params: image (bytes or uploaded file), model
+    :return: numpy array ordered like disease_classes, or None without a model
+    """
+    if model is None and config.PREDICTION_CACHE:
+        return prediction_cache.get_or_predict(img, lambda: run_disease_model(img))
+    return run_disease_model(img, model)
+
+
+def disease_model_available():
+    """
+    Whether a disease model can answer. The process pool loads its own
+    copy, which is only known to be missing once a pool process has started.
+    """
+    disease_pool = registry.get('disease_pool')
+    if disease_pool is not None:
+        return disease_pool.model_loaded is not False
+    return registry.get('disease') is not None
+
+
+def run_disease_model(img, model=None):
+    if model is None:
+        disease_pool = registry.get('disease_pool')
+        if disease_pool is not None:
+            # Decode and forward pass in a separate process
+            with stage('process_pool'):
+                return disease_pool.predict(img)
+    disease_model = registry.get('disease')
     if model is None:
         model = disease_model
     if model is None:
         return None
-        
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.ToTensor(),
-    ])
-    image = Image.open(io.BytesIO(img))
-    img_t = transform(image)
-    img_u = torch.unsqueeze(img_t, 0)
-
-    # Get predictions from model
-    yb = model(img_u)
-    # Pick index with highest probability
-    _, preds = torch.max(yb, dim=1)
-    prediction = disease_classes[preds[0].item()]
-    # Retrieve the class label
-    return prediction
 
+    # A tensor for torch models, an array for the ONNX Runtime backend
+    img_t = inference.prepare(img, model)
+
+    disease_batcher = registry.get('disease_batcher')
+    with stage('forward'):
+        if model is disease_model and disease_batcher is not None:
+            # Share a batched forward pass with concurrent requests
+            scores = disease_batcher.predict(img_t)
+        else:
+            # Get predictions from model
+            scores = inference.forward(model, inference.stack([img_t]))[0]
+    return inference.softmax(scores)
+
+@bounded_image_uploads
 def disease_prediction(request):
     if request.method == 'POST':
-        # Check if PyTorch is available
-        if not TORCH_AVAILABLE:
+        started = time.perf_counter()
+        # Check if PyTorch is available (the ONNX Runtime backend runs without it)
+        if not TORCH_AVAILABLE and config.DISEASE_BACKEND != 'onnx':
             messages.error(request, 'PyTorch is not installed. Disease detection requires PyTorch (needs Python 3.11 or 3.12). Please install PyTorch first.')
             return render(request, 'disease.html')
         
-        # Check if model is available
-        if disease_model is None:
+        # Check if model is available (the process pool loads its own copy)
+        if not disease_model_available():
             messages.error(request, 'Disease detection model is not available. Please add the model file (plant_disease_model.pth) to the models directory.')
             return render(request, 'disease.html')
             
+        if upload_error(request):
+            messages.error(request, upload_error(request))
+            return render(request, 'disease.html')
+
         if 'file' not in request.FILES:
             messages.error(request, 'No file was uploaded. Please select an image file.')
             return render(request, 'disease.html')
@@ -308,13 +481,14 @@ def disease_prediction(request):
             return render(request, 'disease.html')
             
         try:
-            img = file.read()
-            prediction = predict_image(img)
+            # Decoded straight from the upload (spooled to disk when large)
+            prediction = predict_image(file)
             if prediction is None:
                 messages.error(request, 'Model prediction failed. Please try a different image or check if the model is properly loaded.')
                 return render(request, 'disease.html')
-            prediction = Markup(str(disease_dic[prediction]))
-            return render(request, 'disease-result.html', context={"prediction": prediction})
+            log_prediction(request, 'disease', image_inputs(file), prediction, started)
+            # Pre-rendered page for this class
+            return result_pages.response('disease', prediction, public=False)
         except Exception as e:
             messages.error(request, f'Error processing image: {str(e)}. Please ensure you uploaded a valid image file.')
             return render(request, 'disease.html')
@@ -322,45 +496,47 @@ def disease_prediction(request):
 
 
 def fert_recommend(request):
-    title = '- Fertilizer Suggestion'
+    started = time.perf_counter()
     crop_name = str(request.POST['cropname'])
     N = int(request.POST['nitrogen'])
     P = int(request.POST['phosphorous'])
     K = int(request.POST['pottasium'])
     # ph = float(request.form['ph'])
 
-    fertilizer_csv_path = os.path.join(BASE_DIR, 'Data', 'fertilizer.csv')
-    if not os.path.exists(fertilizer_csv_path):
+    if not fertilizer_table.available:
         messages.error(request, 'Fertilizer data file is not available. Please add the fertilizer.csv file.')
         return render(request, 'fertilizer.html')
-    
-    df = pd.read_csv(fertilizer_csv_path)
-
-    nr = df[df['Crop'] == crop_name]['N'].iloc[0]
-    pr = df[df['Crop'] == crop_name]['P'].iloc[0]
-    kr = df[df['Crop'] == crop_name]['K'].iloc[0]
-
-    n = nr - N
-    p = pr - P
-    k = kr - K
-    temp = {abs(n): "N", abs(p): "P", abs(k): "K"}
-    max_value = temp[max(temp.keys())]
-    if max_value == "N":
-        if n < 0:
-            key = 'NHigh'
-        else:
-            key = "Nlow"
-    elif max_value == "P":
-        if p < 0:
-            key = 'PHigh'
-        else:
-            key = "Plow"
-    else:
-        if k < 0:
-            key = 'KHigh'
-        else:
-            key = "Klow"
 
-    response = Markup(str(fertilizer_dic[key]))
+    with stage('csv_lookup'):
+        recommended = fertilizer_table.get(crop_name)
+    if recommended is None:
+        messages.error(request, f'No fertilizer data for crop "{crop_name}".')
+        return render(request, 'fertilizer.html')
+
+    key = recommendation_key(recommended, N, P, K)
+    log_prediction(request, 'fertilizer', {'crop': crop_name, 'N': N, 'P': P, 'K': K}, key, started)
+
+    # Pre-rendered page for this recommendation
+    return result_pages.response('fertilizer', key, public=False)
+
+
+@require_GET
+@etag(lambda request, label: result_pages.etag('disease', label))
+def disease_result(request, label):
+    """Result page of a disease class; answers 304 to a matching If-None-Match"""
+    return result_pages.response('disease', label)
+
+
+@require_GET
+@etag(lambda request, key: result_pages.etag('fertilizer', key))
+def fertilizer_result(request, key):
+    """Result page of a fertilizer recommendation, with conditional GET"""
+    return result_pages.response('fertilizer', key)
+
 
-    return render(request, 'fertilizer-result.html', context = {"recommendation": response, "title":title})
\ No newline at end of file
+@require_GET
+def prometheus_metrics(request):
+    """Latency histograms and counters of this worker process, in Prometheus text format"""
+    if not config.METRICS:
+        raise Http404('Metrics are disabled')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
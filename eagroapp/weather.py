@@ -0,0 +1,386 @@
+"""
+OpenWeatherMap client and a TTL cache in front of it.
+
+Farmers in the same district submit the same city within minutes, so
+results are cached per normalised city name in a Django cache, which the
+app servers behind a load balancer can share. Concurrent misses for one
+city in a process share a single upstream call, and when the upstream
+fails a stale entry is served for up to ``stale_ttl`` seconds before
+giving up.
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+
+import requests
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+
+# Optional async HTTP client for the ASGI views
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
+from . import config
+from .caching import acache_call, cache_call
+
+
+def parse_weather(response):
+    """
+    Extracts temperature (Celsius) and humidity from an API response
+    :params: response (requests or httpx response)
+    :return: (temperature, humidity) or None
+    """
+    try:
+        x = response.json()
+        if response.status_code == 200 and "main" in x:
+            y = x["main"]
+            temperature = round((y["temp"] - 273.15), 2)
+            humidity = y["humidity"]
+            return temperature, humidity
+        # API returned an error (invalid key, city not found, etc.)
+        return None
+    except (KeyError, ValueError) as e:
+        print(f"Weather API error: {e}")
+        return None
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and lets a single
+    trial call through once reset_timeout seconds have passed
+    :params: failure_threshold, reset_timeout
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class WeatherClient:
+    """
+    OpenWeatherMap client with a pooled keep-alive session, split
+    connect/read timeouts, jittered retries and a circuit breaker
+    :params: url, api_key, connect_timeout, read_timeout, retries,
+             backoff (base seconds), pool_size, failure_threshold, reset_timeout
+    """
+
+    def __init__(self, url=None, api_key=None, connect_timeout=3.05, read_timeout=5,
+                 retries=2, backoff=0.2, pool_size=10, failure_threshold=5, reset_timeout=30):
+        self.url = url or config.WEATHER_API_URL
+        self.api_key = api_key or config.WEATHER_API_KEY
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _get(self, city_name):
+        self._count('requests')
+        response = self.session.get(
+            self.url, params={'q': city_name, 'appid': self.api_key}, timeout=self.timeout)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise requests.HTTPError(f'upstream returned {response.status_code}', response=response)
+        return response
+
+    def fetch(self, city_name):
+        """
+        Fetch and returns the temperature and humidity of a city
+        :params: city_name
+        :return: (temperature, humidity) or None
+        """
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            return None
+
+        for attempt in range(self.retries + 1):
+            try:
+                response = self._get(city_name)
+                break
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    self._count('failures')
+                    self.breaker.failure()
+                    print(f"Weather API error: {e}")
+                    return None
+                self._count('retries')
+                # Full jitter keeps retrying workers from synchronising
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+        # The upstream answered, so it counts as healthy even for an
+        # unknown city or a rejected key.
+        self.breaker.success()
+        return parse_weather(response)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, circuit=self.breaker.state)
+
+
+class AsyncWeatherClient:
+    """
+    Non-blocking counterpart of WeatherClient for async views. Uses an
+    httpx.AsyncClient per event loop, or runs the given sync client in a
+    worker thread when httpx is not installed.
+    :params: sync_client (WeatherClient supplying URL, key, timeouts,
+             retries and the shared circuit breaker), pool_size
+    """
+
+    def __init__(self, sync_client, pool_size=100):
+        self.sync_client = sync_client
+        self.pool_size = pool_size
+        self._clients = {}
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # Clients of loops that have since closed are dropped
+            self._clients = {l: c for l, c in self._clients.items() if not l.is_closed()}
+            timeout = self.sync_client.timeout
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size))
+            self._clients[loop] = client
+        return client
+
+    async def fetch(self, city_name):
+        """
+        Fetch and returns the temperature and humidity of a city
+        :params: city_name
+        :return: (temperature, humidity) or None
+        """
+        sync = self.sync_client
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(sync.fetch, city_name)
+        if not sync.breaker.allow():
+            sync._count('short_circuited')
+            return None
+
+        client = self._client()
+        params = {'q': city_name, 'appid': sync.api_key}
+        for attempt in range(sync.retries + 1):
+            try:
+                sync._count('requests')
+                response = await client.get(sync.url, params=params)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise httpx.HTTPStatusError(
+                        f'upstream returned {response.status_code}',
+                        request=response.request, response=response)
+                break
+            except httpx.HTTPError as e:
+                if attempt == sync.retries:
+                    sync._count('failures')
+                    sync.breaker.failure()
+                    print(f"Weather API error: {e}")
+                    return None
+                sync._count('retries')
+                await asyncio.sleep(random.uniform(0, sync.backoff * (2 ** attempt)))
+
+        sync.breaker.success()
+        return parse_weather(response)
+
+
+def normalize_city(city_name):
+    return ' '.join(str(city_name or '').split()).casefold()
+
+
+class WeatherCache:
+    """
+    TTL cache in a Django cache, with single-flight loading and
+    stale-on-error
+    :params: alias (Django cache; entries are stored for ttl + stale_ttl
+             seconds), ttl, stale_ttl (seconds an expired entry may still
+             be served while the upstream is failing)
+    """
+
+    def __init__(self, alias='weather', ttl=600, stale_ttl=3600):
+        self.alias = alias
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._inflight = {}
+        # Async misses are coalesced on the event loop thread only
+        self._ainflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'stale': 0, 'failures': 0}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, city_name):
+        # City names may hold spaces and any script, which memcached keys cannot
+        digest = hashlib.sha256(normalize_city(city_name).encode()).hexdigest()
+        return f'weather:{digest[:32]}'
+
+    def _fresh(self, entry):
+        # Entries are (value, time.time() when stored): the clocks of the
+        # app servers sharing the cache are compared, not their uptimes
+        return entry is not None and time.time() - entry[1] < self.ttl
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _settle(self, key, value, entry):
+        """
+        Stores a loaded value, or falls back to the stale entry
+        :params: key, value (None when loading failed), entry (cached
+                 entry, possibly expired, or None)
+        """
+        if value is not None:
+            cache_call(self.cache.set, key, (value, time.time()), self.ttl + self.stale_ttl)
+            return value
+        self._count('failures')
+        if entry is not None and time.time() - entry[1] < self.ttl + self.stale_ttl:
+            self._count('stale')
+            return entry[0]
+        return None
+
+    def get(self, city_name, loader):
+        """
+        Cached weather for a city, calling loader(city_name) on a miss
+        :params: city_name, loader
+        :return: (temperature, humidity) or None
+        """
+        key = self.key(city_name)
+        entry = cache_call(self.cache.get, key)
+        if self._fresh(entry):
+            self._count('hits')
+            return entry[0]
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            try:
+                return future.result()
+            except CancelledError:
+                # The leader was interrupted; load it here instead
+                return self.get(city_name, loader)
+
+        try:
+            try:
+                value = loader(city_name)
+            except Exception:
+                value = None
+            value = self._settle(key, value, entry)
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return value
+
+    async def aget(self, city_name, loader):
+        """
+        Async variant of get() for coroutine loaders
+        :params: city_name, loader (async callable)
+        :return: (temperature, humidity) or None
+        """
+        key = self.key(city_name)
+        entry = await acache_call(self.cache.aget, key)
+        if self._fresh(entry):
+            self._count('hits')
+            return entry[0]
+
+        loop = asyncio.get_running_loop()
+        future = self._ainflight.get(key)
+        if future is not None and future.get_loop() is loop:
+            self._count('coalesced')
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled, not this task; load it here instead
+                return await self.aget(city_name, loader)
+
+        future = self._ainflight[key] = loop.create_future()
+        self._count('misses')
+        try:
+            try:
+                value = await loader(city_name)
+            except Exception:
+                value = None
+            if value is not None:
+                await acache_call(self.cache.aset, key, (value, time.time()), self.ttl + self.stale_ttl)
+            else:
+                value = self._settle(key, value, entry)
+        except BaseException:
+            # Followers waiting on a cancelled leader must not hang
+            future.cancel()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            if self._ainflight.get(key) is future:
+                del self._ainflight[key]
+        return value
+
+    def clear(self):
+        """Empties the whole cache alias, including a shared server"""
+        self.cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
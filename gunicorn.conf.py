@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for E-Argo.
+
+    gunicorn -c gunicorn.conf.py eagro.wsgi
+
+With preloading (the default) the master process imports the application
+and loads the prediction models before forking, so the workers share the
+model memory copy-on-write instead of each holding a private copy.
+"""
+import gc
+import os
+
+bind = os.environ.get('EAGRO_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+preload_app = os.environ.get('EAGRO_PRELOAD', '1') == '1'
+
+# Split the cores between the workers (see eagroapp.inference.configure_threads)
+os.environ.setdefault('WEB_CONCURRENCY', str(workers))
+if preload_app:
+    # Load the models in the master, before the workers are forked
+    os.environ.setdefault('EAGRO_WARM_UP', '1')
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far into the permanent generation, so
+    # garbage collections in the workers do not write to (and un-share)
+    # the pages holding the preloaded models.
+    gc.freeze()